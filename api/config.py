@@ -4,8 +4,34 @@ DB_COLLECTION_NAME = "arxiv"
 DB_PORT = 6334
 CACHE_SIZE = 1000
 CACHE_TTL = 3600
+# How long the list of stored category masks is reused; short, so papers
+# with a new combination of categories show up in filtered searches quickly
+CATEGORY_MASK_TTL = 60
+# Also match the category strings of points stored before category_mask,
+# through a keyword index on them. Turn off once every point has been
+# re-stored with a mask: a full `main.py run` after deleting
+# process/data/checkpoint.json and process/data/ingested.sqlite
+CATEGORY_LEGACY_MATCH = True
+HEALTH_CHECK_INTERVAL = 5.0
+HEALTH_CHECK_TIMEOUT = 2.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 10.0
 VECTOR_SIZE = 384
 EMB_MODEL = "sentence-transformers/all-MiniLM-L12-v2"
+# "fp32" is light-embed's managed export of EMB_MODEL; quantized variants load
+# an ONNX file from the model repo and are only used once they have passed the
+# accuracy gate recorded in EMB_GATE_FILE (see `main.py gate-model`)
+EMB_MODEL_VARIANT = "fp32"
+EMB_MODEL_VARIANTS = {
+    "fp32": None,
+    "int8": {
+        "onnx_file": "onnx/model_quint8_avx2.onnx",
+        "pooling_config_path": "1_Pooling",
+        "normalize": True,
+    },
+}
+# Written by the processor; docker-compose.yml mounts its data directory here
+EMB_GATE_FILE = "data/embedding_gate.json"
 LOG_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -1,4 +1,5 @@
 import logging.config
+import asyncio
 import time
 from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,6 +9,7 @@ from typing import List, Optional
 
 from models import ArxivDomains, SearchResult
 from services.database import Database
+from services.embed import MODELS
 from config import HOST, LOG_CONFIG, XIVVY_PORT
 from services.utils import iso_date_to_unix
 
@@ -20,12 +22,21 @@ async def lifespan(app: FastAPI):
 
     app.state.logger.info("Initializing Database...")
     app.state.db = Database()
+    await app.state.db.start()
 
     await app.state.db.create_collection_if_not_exists()
     app.state.logger.info("Initialized Database.")
 
+    # Loaded here so the first queries don't wait on it within their timeout
+    try:
+        await asyncio.to_thread(MODELS.get, app.state.db.embedder.variant)
+    except Exception as e:
+        app.state.logger.error(f"Error loading the embedding model: {e}")
+
     yield
 
+    await app.state.db.close()
+
 
 app = FastAPI(
     lifespan=lifespan,
@@ -167,7 +178,8 @@ async def search_papers(
 async def health_check():
     """Health check endpoint to verify API is running"""
     try:
-        db_status = app.state.db.is_server_running()
+        db_health = app.state.db.health.status()
+        db_status = db_health["healthy"]
         collection_status = await app.state.db.create_collection_if_not_exists()
 
         status = "healthy"
@@ -181,7 +193,11 @@ async def health_check():
         return {
             "status": status,
             "database": "connected" if db_status else "disconnected",
+            "database_latency_ms": db_health["latency_ms"],
+            "database_circuit": db_health["circuit"],
             "collection": "ready" if collection_status else "not_ready",
+            # Empty until the first query loads the model
+            "embedding_models": MODELS.stats(),
             "version": "1.0.0",
             "timestamp": time.time(),
         }
@@ -1,8 +1,7 @@
 import logging.config
-import socket
 import asyncio
 from qdrant_client import AsyncQdrantClient, models
-from typing import List, Optional
+from typing import Awaitable, List, Optional, Union
 from cachetools import TTLCache
 
 from config import (
@@ -11,15 +10,63 @@ from config import (
     LOG_CONFIG,
     CACHE_SIZE,
     CACHE_TTL,
+    CATEGORY_MASK_TTL,
+    CATEGORY_LEGACY_MATCH,
     VECTOR_SIZE,
     HOST,
+    HEALTH_CHECK_INTERVAL,
+    HEALTH_CHECK_TIMEOUT,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
 )
 from models import ArxivDomains, SearchResult, PaperMetadata
 from services.embed import Embedder
-from services.utils import iso_date_to_unix, unix_to_iso
+from services.health import CircuitBreaker, HealthMonitor
+from services.utils import (
+    iso_date_to_unix,
+    unix_to_iso,
+    categories_to_mask,
+    mask_to_categories,
+)
 
 logging.config.dictConfig(LOG_CONFIG)
 
+# Payload fields used in filters; without these every filter scans payloads
+PAYLOAD_INDEXES = {
+    "id": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD),
+    "category_mask": models.IntegerIndexParams(
+        type=models.IntegerIndexType.INTEGER, lookup=True, range=False
+    ),
+    "date_updated": models.IntegerIndexParams(
+        type=models.IntegerIndexType.INTEGER, lookup=False, range=True
+    ),
+}
+# Points stored before category_mask only have category strings
+if CATEGORY_LEGACY_MATCH:
+    PAYLOAD_INDEXES["categories"] = models.KeywordIndexParams(
+        type=models.KeywordIndexType.KEYWORD
+    )
+
+
+def _schema_type(value) -> str:
+    return str(getattr(value, "value", value))
+
+
+def _index_mismatch(current: models.PayloadIndexInfo, params) -> Optional[str]:
+    """How an existing payload index differs from params, or None if it doesn't"""
+    expected = _schema_type(params.type)
+    if _schema_type(current.data_type) != expected:
+        return f"is {_schema_type(current.data_type)}, expected {expected}"
+    # Only the options set in PAYLOAD_INDEXES; the rest are server defaults
+    wanted = params.model_dump(exclude_unset=True, exclude={"type"})
+    actual = current.params.model_dump() if current.params else {}
+    changed = [
+        f"{option}={actual.get(option)}, expected {value}"
+        for option, value in wanted.items()
+        if actual.get(option) != value
+    ]
+    return "; ".join(changed) or None
+
 
 class Database:
     def __init__(self) -> None:
@@ -34,62 +81,134 @@ class Database:
 
         self.id_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
         self.query_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+        self.mask_cache = TTLCache(maxsize=1, ttl=CATEGORY_MASK_TTL)
 
         self.semaphore = asyncio.Semaphore(20)
+        self.payload_indexes_ready = False
+
+        self.breaker = CircuitBreaker(
+            failure_threshold=BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=BREAKER_RESET_TIMEOUT,
+        )
+        self.health = HealthMonitor(
+            self.client,
+            self.breaker,
+            interval=HEALTH_CHECK_INTERVAL,
+            timeout=HEALTH_CHECK_TIMEOUT,
+        )
+
+    async def start(self) -> None:
+        """Start background health monitoring of Qdrant"""
+        await self.health.start()
+
+    async def close(self) -> None:
+        await self.health.stop()
 
     def is_server_running(self) -> bool:
-        host = HOST
-        port = DB_PORT
+        """Last known Qdrant reachability, without any network I/O"""
+        return self.health.is_healthy
 
+    async def _qdrant(self, request: Awaitable, timeout: Optional[float] = None):
+        """Await one Qdrant client call, recording its outcome on the breaker"""
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(1)
-                try:
-                    sock.connect((host, port))
-                    self.logger.info(f"Qdrant server is running on {HOST}:{DB_PORT}")
-                    return True
-                except (ConnectionRefusedError, socket.timeout):
+            result = await asyncio.wait_for(request, timeout=timeout)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def ensure_payload_indexes(self) -> bool:
+        """Create any missing payload indexes on the collection and verify them"""
+        if self.payload_indexes_ready:
+            return True
+
+        try:
+            info = await self.client.get_collection(self.collection_name)
+            existing = info.payload_schema or {}
+
+            for field, params in PAYLOAD_INDEXES.items():
+                expected = _schema_type(params.type)
+                current = existing.get(field)
+                mismatch = current is not None and _index_mismatch(current, params)
+                if current is not None and not mismatch:
+                    continue
+
+                if current is not None:
                     self.logger.warning(
-                        f"Qdrant server not accessible at {HOST}:{DB_PORT}"
+                        f"Payload index on '{field}' {mismatch}; rebuilding"
                     )
-                    return False
+                    await self.client.delete_payload_index(
+                        collection_name=self.collection_name,
+                        field_name=field,
+                        wait=True,
+                    )
+
+                self.logger.info(f"Creating {expected} payload index on '{field}'...")
+                await self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=params,
+                    wait=True,
+                )
+
+            info = await self.client.get_collection(self.collection_name)
+            schema = info.payload_schema or {}
+            missing = [
+                field
+                for field, params in PAYLOAD_INDEXES.items()
+                if field not in schema or _index_mismatch(schema[field], params)
+            ]
+            if missing:
+                self.logger.warning(f"Payload indexes still missing: {missing}")
+                return False
+
+            self.payload_indexes_ready = True
+            self.logger.info(
+                f"Payload indexes verified on {', '.join(PAYLOAD_INDEXES)}"
+            )
+            return True
         except Exception as e:
-            self.logger.error(f"Unexpected error checking server status: {str(e)}")
+            self.logger.error(f"Error ensuring payload indexes: {e}")
             return False
 
     async def create_collection_if_not_exists(self) -> bool:
-        if not self.is_server_running():
-            self.logger.error("Cannot create collection: Qdrant server is not running")
+        if not self.breaker.allow():
+            self.logger.error("Cannot create collection: Qdrant circuit is open")
             return False
 
         try:
-            collection_exists = await asyncio.wait_for(
+            collection_exists = await self._qdrant(
                 self.client.collection_exists(self.collection_name), timeout=5.0
             )
 
             if collection_exists:
                 self.logger.info(f"Collection '{self.collection_name}' found.")
+                await self.ensure_payload_indexes()
                 return True
             else:
                 self.logger.info(
                     f"Collection '{self.collection_name}' not found. Creating..."
                 )
                 try:
-                    await self.client.create_collection(
-                        collection_name=self.collection_name,
-                        vectors_config=models.VectorParams(
-                            size=VECTOR_SIZE,
-                            distance=models.Distance.COSINE,
-                            on_disk=True,
-                        ),
-                        quantization_config=models.ScalarQuantization(
-                            scalar=models.ScalarQuantizationConfig(
-                                type=models.ScalarType.INT8,
-                                always_ram=True,
+                    await self._qdrant(
+                        self.client.create_collection(
+                            collection_name=self.collection_name,
+                            vectors_config=models.VectorParams(
+                                size=VECTOR_SIZE,
+                                distance=models.Distance.COSINE,
+                                on_disk=True,
                             ),
-                        ),
+                            quantization_config=models.ScalarQuantization(
+                                scalar=models.ScalarQuantizationConfig(
+                                    type=models.ScalarType.INT8,
+                                    always_ram=True,
+                                ),
+                            ),
+                        )
                     )
                     self.logger.info(f"Created collection '{self.collection_name}'.")
+                    await self.ensure_payload_indexes()
                     return True
                 except asyncio.TimeoutError:
                     self.logger.error("Timeout while creating collection")
@@ -110,10 +229,8 @@ class Database:
             self.logger.info(f"Cache hit for paper ID: {paper_id}")
             return self.id_cache[paper_id]
 
-        if not self.is_server_running():
-            self.logger.error(
-                f"Cannot search for ID {paper_id}: Qdrant server is not running"
-            )
+        if not self.breaker.allow():
+            self.logger.error(f"Cannot search for ID {paper_id}: Qdrant circuit is open")
             return None
 
         try:
@@ -127,7 +244,7 @@ class Database:
 
             try:
                 async with self.semaphore:
-                    results = await asyncio.wait_for(
+                    results = await self._qdrant(
                         self.client.scroll(
                             collection_name=self.collection_name,
                             limit=1,
@@ -140,9 +257,7 @@ class Database:
 
                 if results and results[0]:
                     point = results[0][0]
-                    if not point.payload or not all(
-                        k in point.payload for k in ["id", "categories", "date_updated"]
-                    ):
+                    if not self._has_required_fields(point.payload):
                         self.logger.warning(
                             f"Incomplete payload for paper ID {paper_id}"
                         )
@@ -150,7 +265,7 @@ class Database:
 
                     try:
                         paper_id = point.payload.get("id")
-                        categories = point.payload.get("categories", [])
+                        categories = self._payload_categories(point.payload)
                         date_updated = unix_to_iso(point.payload.get("date_updated"))
 
                         authors = point.payload.get("authors", ["Unknown"])
@@ -201,6 +316,91 @@ class Database:
             self.logger.error(f"Error retrieving paper by ID: {str(e)}")
             return None
 
+    def _has_required_fields(self, payload: Optional[dict]) -> bool:
+        if not payload or not all(k in payload for k in ["id", "date_updated"]):
+            return False
+        return "category_mask" in payload or "categories" in payload
+
+    def _payload_categories(self, payload: dict) -> List[str]:
+        """Decode the category bitmask; older points store the strings directly"""
+        if "category_mask" in payload:
+            return [
+                domain.value for domain in mask_to_categories(payload["category_mask"])
+            ]
+        return payload.get("categories", [])
+
+    async def _observed_masks(self) -> List[int]:
+        """Distinct category masks present in the collection"""
+        if "masks" not in self.mask_cache:
+            response = await self._qdrant(
+                self.client.facet(
+                    collection_name=self.collection_name,
+                    key="category_mask",
+                    limit=1 << len(ArxivDomains),
+                    exact=True,
+                )
+            )
+            masks = [hit.value for hit in response.hits]
+            if not masks:
+                # Nothing ingested with masks yet; look again next time
+                return masks
+            self.mask_cache["masks"] = masks
+        return self.mask_cache["masks"]
+
+    async def _category_conditions(
+        self, category_values: List[str], match_all: bool
+    ) -> Optional[List[Union[models.FieldCondition, models.Filter]]]:
+        """Category filter as one MatchAny over the stored masks that satisfy it.
+
+        Qdrant has no bitwise match, so the few hundred distinct masks in the
+        collection are listed every CATEGORY_MASK_TTL seconds and tested here.
+        While CATEGORY_LEGACY_MATCH is set, points stored before masks match on
+        their category strings too. Returns None when nothing can match.
+        """
+        try:
+            observed = await self._observed_masks()
+        except Exception as e:
+            self.logger.warning(f"Cannot list category masks: {e}")
+            observed = []
+
+        wanted = categories_to_mask(category_values)
+        if match_all:
+            masks = [mask for mask in observed if mask & wanted == wanted]
+        else:
+            masks = [mask for mask in observed if mask & wanted]
+
+        conditions = []
+        if masks:
+            conditions.append(
+                models.FieldCondition(
+                    key="category_mask", match=models.MatchAny(any=masks)
+                )
+            )
+        if CATEGORY_LEGACY_MATCH:
+            if match_all:
+                conditions.append(
+                    models.Filter(
+                        must=[
+                            models.FieldCondition(
+                                key="categories", match=models.MatchValue(value=value)
+                            )
+                            for value in category_values
+                        ]
+                    )
+                )
+            else:
+                conditions.append(
+                    models.FieldCondition(
+                        key="categories", match=models.MatchAny(any=category_values)
+                    )
+                )
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions
+        return [models.Filter(should=conditions)]
+
     def _create_cache_key(
         self,
         query: Optional[str],
@@ -247,10 +447,8 @@ class Database:
         except Exception as e:
             self.logger.error(f"Error creating cache key: {str(e)}")
 
-        if not self.is_server_running():
-            self.logger.error(
-                "Cannot perform search query: Qdrant server is not running"
-            )
+        if not self.breaker.allow():
+            self.logger.error("Cannot perform search query: Qdrant circuit is open")
             return []
 
         try:
@@ -265,21 +463,15 @@ class Database:
                     ]
 
                     if category_values:
-                        if categories_match_all:
-                            for cat_value in category_values:
-                                filter_conditions.append(
-                                    models.FieldCondition(
-                                        key="categories",
-                                        match=models.MatchValue(value=cat_value),
-                                    )
-                                )
-                        else:
-                            filter_conditions.append(
-                                models.FieldCondition(
-                                    key="categories",
-                                    match=models.MatchAny(any=category_values),
-                                )
-                            )
+                        conditions = await self._category_conditions(
+                            category_values, categories_match_all
+                        )
+                        if conditions is None:
+                            # Not cached: papers with these categories may
+                            # arrive before the masks are listed again
+                            self.logger.info("No papers carry the requested categories")
+                            return []
+                        filter_conditions.extend(conditions)
                 except Exception as e:
                     self.logger.error(f"Error processing categories: {str(e)}")
 
@@ -306,28 +498,27 @@ class Database:
 
             async with self.semaphore:
                 if not query:
-                    points, next_cursor = await self.client.scroll(
-                        collection_name=self.collection_name,
-                        limit=limit,
-                        scroll_filter=search_filter,
-                        with_payload=True,
-                        with_vectors=False,
+                    points, next_cursor = await self._qdrant(
+                        self.client.scroll(
+                            collection_name=self.collection_name,
+                            limit=limit,
+                            scroll_filter=search_filter,
+                            with_payload=True,
+                            with_vectors=False,
+                        )
                     )
 
                     search_results = []
                     for point in points:
                         try:
-                            if not point.payload or not all(
-                                k in point.payload
-                                for k in ["id", "categories", "date_updated"]
-                            ):
+                            if not self._has_required_fields(point.payload):
                                 self.logger.warning(
                                     f"Incomplete payload for paper ID {point.payload.get('id', 'unknown')}"
                                 )
                                 continue
 
                             paper_id = point.payload.get("id")
-                            categories = point.payload.get("categories", [])
+                            categories = self._payload_categories(point.payload)
                             date_updated = unix_to_iso(
                                 point.payload.get("date_updated")
                             )
@@ -359,28 +550,27 @@ class Database:
                         )
                         return []
 
-                    search_results = await self.client.search(
-                        collection_name=self.collection_name,
-                        query_vector=query_vector,
-                        limit=limit,
-                        query_filter=search_filter,
-                        with_payload=True,
+                    search_results = await self._qdrant(
+                        self.client.search(
+                            collection_name=self.collection_name,
+                            query_vector=query_vector,
+                            limit=limit,
+                            query_filter=search_filter,
+                            with_payload=True,
+                        )
                     )
 
                     results = []
                     for point in search_results:
                         try:
-                            if not point.payload or not all(
-                                k in point.payload
-                                for k in ["id", "categories", "date_updated"]
-                            ):
+                            if not self._has_required_fields(point.payload):
                                 self.logger.warning(
                                     f"Incomplete payload for paper ID {point.payload.get('id', 'unknown')}"
                                 )
                                 continue
 
                             paper_id = point.payload.get("id")
-                            categories = point.payload.get("categories", [])
+                            categories = self._payload_categories(point.payload)
                             date_updated = unix_to_iso(
                                 point.payload.get("date_updated")
                             )
@@ -1,21 +1,124 @@
+import json
+import time
+import threading
 import logging.config
 import asyncio
-from typing import List
+from typing import Dict, List, Optional
 from light_embed import TextEmbedding
 from cachetools import LRUCache
 
-from config import LOG_CONFIG, CACHE_SIZE, EMB_MODEL
+from config import (
+    LOG_CONFIG,
+    CACHE_SIZE,
+    EMB_MODEL,
+    EMB_MODEL_VARIANT,
+    EMB_MODEL_VARIANTS,
+    EMB_GATE_FILE,
+)
+from services.utils import current_rss_bytes
 
 logging.config.dictConfig(LOG_CONFIG)
+logger = logging.getLogger(__name__)
 
 
-class Embedder:
+def read_gate(gate_file: str = EMB_GATE_FILE) -> Optional[dict]:
+    try:
+        with open(gate_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def gate_passed(variant: str) -> bool:
+    """True if the accuracy gate passed for exactly this model and variant"""
+    gate = read_gate()
+    return bool(
+        gate
+        and gate.get("passed")
+        and gate.get("model") == EMB_MODEL
+        and gate.get("variant") == variant
+        and gate.get("model_config") == EMB_MODEL_VARIANTS.get(variant)
+    )
+
+
+def resolve_variant(variant: str = EMB_MODEL_VARIANT) -> str:
+    """The variant to load: fp32 unless a quantized one has passed the gate"""
+    if variant == "fp32":
+        return variant
+    if variant not in EMB_MODEL_VARIANTS:
+        logger.error(f"Unknown embedding model variant '{variant}'; using fp32")
+        return "fp32"
+    if not gate_passed(variant):
+        logger.error(
+            f"Embedding model variant '{variant}' has not passed the accuracy "
+            f"gate ({EMB_GATE_FILE}); using fp32"
+        )
+        return "fp32"
+    return variant
+
+
+def load_text_embedding(variant: str) -> TextEmbedding:
+    model_config = EMB_MODEL_VARIANTS[variant]
+    if model_config is None:
+        return TextEmbedding(EMB_MODEL)
+    # TextEmbedding writes into the config it is given
+    return TextEmbedding(EMB_MODEL, model_config=dict(model_config))
+
+
+class ModelRegistry:
+    """Loads each embedding model variant once per process, on first use.
+
+    Every service asks the registry instead of loading its own copy. Loading
+    is serialized by a lock, so concurrent first callers (e.g. executor
+    threads) wait for one load. Load time and RSS growth are logged and kept.
+    """
+
     def __init__(self):
-        self.embedder = TextEmbedding(EMB_MODEL)
         self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.models: Dict[str, TextEmbedding] = {}
+        self.load_stats: Dict[str, dict] = {}
+
+    def get(self, variant: str) -> TextEmbedding:
+        model = self.models.get(variant)
+        if model is not None:
+            return model
+
+        with self.lock:
+            if variant not in self.models:
+                rss_before = current_rss_bytes()
+                start = time.perf_counter()
+                self.models[variant] = load_text_embedding(variant)
+                stats = {
+                    "load_seconds": round(time.perf_counter() - start, 3),
+                    "rss_delta_bytes": current_rss_bytes() - rss_before,
+                }
+                self.load_stats[variant] = stats
+                self.logger.info(
+                    f"Loaded {EMB_MODEL} ({variant}) in {stats['load_seconds']:.2f}s, "
+                    f"RSS +{stats['rss_delta_bytes'] / 1024**2:.0f} MiB"
+                )
+        return self.models[variant]
+
+    def stats(self) -> Dict[str, dict]:
+        return dict(self.load_stats)
+
+
+MODELS = ModelRegistry()
+
+
+class Embedder:
+    def __init__(self, variant: str = EMB_MODEL_VARIANT):
+        self.logger = logging.getLogger(__name__)
+        self.variant = resolve_variant(variant)
         self.query_cache = LRUCache(maxsize=CACHE_SIZE)
         self.semaphore = asyncio.Semaphore(5)
 
+    @property
+    def embedder(self) -> TextEmbedding:
+        """The shared model; the API loads it at startup, else the first query does"""
+        return MODELS.get(self.variant)
+
     async def embed_query(self, query: str) -> List[float] | None:
         if not query or not query.strip():
             self.logger.warning("Cannot embed empty query")
@@ -38,9 +141,11 @@ class Embedder:
             async with self.semaphore:
                 loop = asyncio.get_event_loop()
                 try:
+                    # Not timed: a cold load can take longer than the query timeout
+                    model = await loop.run_in_executor(None, lambda: self.embedder)
                     embedding_future = loop.run_in_executor(
                         None,
-                        lambda: self.embedder.encode([query])[0],
+                        lambda: model.encode([query])[0],
                     )
 
                     embedding = await asyncio.wait_for(embedding_future, timeout=10.0)
@@ -1,4 +1,19 @@
+import os
+import resource
 from datetime import datetime, timezone
+from typing import List
+
+from models import ArxivDomains
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Peak rather than current, but the best we have off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
 
 
 def iso_date_to_unix(iso_date_str: str):
@@ -7,3 +22,19 @@ def iso_date_to_unix(iso_date_str: str):
 
 def unix_to_iso(unix_timestamp: int) -> str:
     return datetime.fromtimestamp(unix_timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+# One bit per domain, in ArxivDomains declaration order. Append new domains
+# at the end so existing masks keep their meaning.
+CATEGORY_BITS = {domain: 1 << bit for bit, domain in enumerate(ArxivDomains)}
+
+
+def categories_to_mask(categories) -> int:
+    mask = 0
+    for category in categories:
+        mask |= CATEGORY_BITS[ArxivDomains(category)]
+    return mask
+
+
+def mask_to_categories(mask: int) -> List[ArxivDomains]:
+    return [domain for domain, bit in CATEGORY_BITS.items() if mask & bit]
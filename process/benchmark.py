@@ -0,0 +1,264 @@
+"""End-to-end ingestion benchmark on a synthetic arXiv snapshot.
+
+Generates a LaTeX-heavy JSONL snapshot, runs it through Parser -> Embedder ->
+Database against Qdrant's in-process local mode and prints a JSON report of
+per-stage throughput, peak RSS and wall time. Everything is written under a
+scratch working directory, so real data/ is never touched.
+
+    python benchmark.py --papers 20000 --stub-embedder --output bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import logging
+import resource
+import tempfile
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+
+from config import DATASET_PATH, EMB_MODEL, VECTOR_SIZE
+
+CATEGORIES = [
+    "cs.LG",
+    "cs.CL",
+    "cs.CV",
+    "math.AP",
+    "math.PR",
+    "stat.ML",
+    "hep-th",
+    "hep-ph",
+    "astro-ph.CO",
+    "cond-mat.str-el",
+    "quant-ph",
+    "gr-qc",
+    "physics.optics",
+    "q-bio.NC",
+    "econ.EM",
+    "eess.SP",
+    "nlin.CD",
+]
+LEGACY_CATEGORIES = ["cmp-lg", "solv-int", "alg-geom", "chao-dyn", "supr-con", "q-alg"]
+
+WORDS = (
+    "we study the model propose novel method show that bound energy spectrum "
+    "network learning convergence prove theorem estimate field quantum "
+    "symmetry operator manifold algorithm data experimental results optimal "
+    "stochastic regime phase transition scattering amplitude gradient"
+).split()
+
+LATEX = [
+    "$\\mathcal{{O}}(n^{{{n}}})$",
+    "$\\alpha_{{{n}}} \\to \\infty$",
+    "\\cite{{ref{n}}}",
+    "\\textbf{{result {n}}}",
+    "\\emph{{claim}}",
+    "\\[ E = mc^{{{n}}} \\]",
+    "\\(\\sum_{{i=1}}^{{{n}}} x_i\\)",
+    "Fig. {n}",
+    "Eq. ({n})",
+    "Section {n}",
+    "Table {n}",
+]
+
+
+def _sentence(rng: random.Random, latex_ratio: float) -> str:
+    words = []
+    for _ in range(rng.randint(8, 24)):
+        if rng.random() < latex_ratio:
+            words.append(rng.choice(LATEX).format(n=rng.randint(1, 12)))
+        else:
+            words.append(rng.choice(WORDS))
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_record(index: int, rng: random.Random) -> dict:
+    """One snapshot line shaped like the Kaggle arXiv metadata"""
+    year = rng.randint(7, 24)
+    paper_id = f"{year:02d}{rng.randint(1, 12):02d}.{index:05d}"
+
+    legacy = rng.random() < 0.1
+    pool = LEGACY_CATEGORIES if legacy else CATEGORIES
+    categories = rng.sample(pool, rng.randint(1, 3))
+
+    authors = [
+        (f"Surname{rng.randint(1, 5000)}", f"F{rng.randint(1, 99)}.", "")
+        for _ in range(rng.randint(1, 8))
+    ]
+    abstract = "  ".join(
+        _sentence(rng, latex_ratio=0.15) for _ in range(rng.randint(4, 10))
+    )
+
+    return {
+        "id": paper_id,
+        "submitter": f"{authors[0][1]} {authors[0][0]}",
+        "authors": ", ".join(f"{first} {last}" for last, first, _ in authors),
+        "title": _sentence(rng, latex_ratio=0.1).rstrip("."),
+        "comments": f"{rng.randint(5, 40)} pages, {rng.randint(1, 12)} figures",
+        "journal-ref": None,
+        "doi": None,
+        "report-no": None,
+        "categories": " ".join(categories),
+        "license": None,
+        "abstract": f"  {abstract}\n",
+        "versions": [
+            {"version": f"v{v + 1}", "created": "Mon, 2 Apr 2007 19:18:42 GMT"}
+            for v in range(rng.randint(1, 3))
+        ],
+        "update_date": f"20{year:02d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "authors_parsed": [list(author) for author in authors],
+    }
+
+
+def generate_snapshot(path: str, papers: int, seed: int) -> int:
+    """Write a synthetic snapshot and return its size in bytes"""
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        for index in range(papers):
+            f.write(json.dumps(synthetic_record(index, rng)) + "\n")
+    return os.path.getsize(path)
+
+
+class StubModel:
+    """Deterministic stand-in for the embedding model, to isolate the pipeline"""
+
+    def encode(self, texts):
+        repeats = -(-VECTOR_SIZE // 64)
+        raw = b"".join(
+            hashlib.blake2b(text.encode(), digest_size=64).digest() * repeats
+            for text in texts
+        )
+        vectors = np.frombuffer(raw, dtype=np.uint8).reshape(len(texts), -1)
+        vectors = vectors[:, :VECTOR_SIZE].astype(np.float32) - 127.5
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _peak_rss_bytes() -> dict:
+    # ru_maxrss is in KiB on Linux; children covers the parse worker processes
+    return {
+        "main": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+    }
+
+
+def _stage_report(wall_seconds: float) -> dict:
+    from services.metrics import STAGE_ERRORS, STAGE_PAPERS, STAGE_SECONDS
+
+    stages = {}
+    for (stage,), busy_seconds in STAGE_SECONDS.sums.items():
+        # Sanitizing happens inside parse and has no paper count of its own
+        papers = STAGE_PAPERS.get(stage="parse" if stage == "sanitize" else stage)
+        stages[stage] = {
+            "papers": papers,
+            "calls": sum(STAGE_SECONDS.counts[(stage,)]),
+            "busy_seconds": round(busy_seconds, 4),
+            "papers_per_busy_second": (
+                round(papers / busy_seconds, 2) if busy_seconds > 0 else None
+            ),
+            "papers_per_wall_second": round(papers / wall_seconds, 2),
+            "errors": STAGE_ERRORS.get(stage=stage),
+        }
+    return stages
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict:
+    # Imported after chdir so every relative data/ path lands in the workdir
+    from services.database import Database
+    from services.embed import Embedder
+    from services.pipeline import Pipeline
+
+    if not args.verbose:
+        # The services log every batch to stdout, which would bury the report
+        logging.getLogger().setLevel(logging.WARNING)
+
+    generate_start = time.perf_counter()
+    snapshot_bytes = generate_snapshot(DATASET_PATH, args.papers, args.seed)
+    generate_seconds = time.perf_counter() - generate_start
+
+    client = AsyncQdrantClient(location=args.qdrant_path or ":memory:")
+    embedder = Embedder(model=StubModel() if args.stub_embedder else None)
+    pipeline = Pipeline(
+        asyncio.Event(),
+        source="json",
+        bulk=args.bulk,
+        database=Database(client=client),
+        embedder=embedder,
+    )
+
+    start = time.perf_counter()
+    await pipeline.run()
+    wall_seconds = time.perf_counter() - start
+
+    return {
+        "papers": args.papers,
+        "snapshot_bytes": snapshot_bytes,
+        "generate_seconds": round(generate_seconds, 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "papers_per_second": round(pipeline.stats["papers_stored"] / wall_seconds, 2),
+        "papers_stored": pipeline.stats["papers_stored"],
+        "errors": pipeline.stats["errors"],
+        "stages": _stage_report(wall_seconds),
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "embedder": "stub" if args.stub_embedder else EMB_MODEL,
+        "qdrant": args.qdrant_path or ":memory:",
+        "bulk": args.bulk,
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Xivvy ingestion benchmark")
+    arg_parser.add_argument("--papers", type=int, default=10_000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument(
+        "--stub-embedder",
+        action="store_true",
+        help="Replace the model with a deterministic hash-based stub",
+    )
+    arg_parser.add_argument(
+        "--bulk", action="store_true", help="Benchmark the bulk-load path"
+    )
+    arg_parser.add_argument(
+        "--qdrant-path",
+        help="Use Qdrant local mode persisted at this path instead of in-memory",
+    )
+    arg_parser.add_argument(
+        "--workdir", help="Scratch directory (default: a fresh temporary directory)"
+    )
+    arg_parser.add_argument("--output", help="Write the JSON report here")
+    arg_parser.add_argument(
+        "--verbose", action="store_true", help="Keep the pipeline's INFO logs"
+    )
+    args = arg_parser.parse_args()
+
+    if args.qdrant_path:
+        args.qdrant_path = os.path.abspath(args.qdrant_path)
+    output = os.path.abspath(args.output) if args.output else None
+
+    # The services import their packages relative to this directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    workdir = args.workdir or tempfile.mkdtemp(prefix="xivvy-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    report = asyncio.run(run_benchmark(args))
+    report["workdir"] = workdir
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
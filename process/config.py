@@ -1,3 +1,5 @@
+import os
+
 LOG_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -24,16 +26,123 @@ DB_PORT = 6334
 HOST = "0.0.0.0"
 CACHE_SIZE = 1000
 CACHE_TTL = 3600
+HEALTH_CHECK_INTERVAL = 5.0
+HEALTH_CHECK_TIMEOUT = 2.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 10.0
 VECTOR_SIZE = 384
 KAGGLE_DATASET_NAME = "Cornell-University/arxiv"
 KAGGLE_CONFIG_DIR = "kaggle/"
+KAGGLE_DOWNLOAD_URL = (
+    f"https://www.kaggle.com/api/v1/datasets/download/{KAGGLE_DATASET_NAME}"
+)
 EMB_MODEL = "sentence-transformers/all-MiniLM-L12-v2"
+# "fp32" is light-embed's managed export of EMB_MODEL; quantized variants load
+# an ONNX file from the model repo and are only used once they have passed the
+# accuracy gate recorded in EMB_GATE_FILE (see `main.py gate-model`)
+EMB_MODEL_VARIANT = "fp32"
+EMB_MODEL_VARIANTS = {
+    "fp32": None,
+    "int8": {
+        "onnx_file": "onnx/model_quint8_avx2.onnx",
+        "pooling_config_path": "1_Pooling",
+        "normalize": True,
+    },
+}
+EMB_GATE_FILE = "data/embedding_gate.json"
+EMB_GATE_SAMPLE_SIZE = 1000
+EMB_GATE_QUERIES = 200
+EMB_GATE_TOP_K = 10
+EMB_GATE_MIN_COSINE = 0.98
+EMB_GATE_MIN_OVERLAP = 0.8
 BATCH_SIZE = 128
+BULK_LOAD_WORKERS = 8
+BULK_LOAD_BATCH_SIZE = 512
+# Restored after a bulk load into a new collection (Qdrant's default)
+BULK_LOAD_INDEXING_THRESHOLD = 20000
+BULK_LOAD_GREEN_TIMEOUT = 3600.0
+EMB_INFERENCE_BATCH_SIZE = 64
+# Token limit the model was trained with (sentence-transformers max_seq_length);
+# texts are cut here and batched with others of similar token length
+EMB_MAX_SEQ_LENGTH = 128
+UPSERT_BATCH_SIZE = 128
+# Runtime tuning of the parse, inference and upsert batch sizes; the fixed
+# sizes above become starting points
+ADAPTIVE_BATCHING = True
+TUNING_INTERVAL = 15.0
+# RSS ceiling in bytes; None means TUNING_MEMORY_FRACTION of physical memory
+TUNING_MEMORY_LIMIT = None
+TUNING_MEMORY_FRACTION = 0.6
+TUNING_UPSERT_LATENCY_TARGET = 1.0
+TUNING_BATCH_LIMITS = {
+    "parse": (16, 4096),
+    "inference": (8, 512),
+    "upsert": (16, 2048),
+}
+EMB_WORKERS = 2
+EMB_TIMEOUT = 60.0
+# Opt-in: reuses embeddings of unchanged texts across runs, up to
+# EMB_CACHE_MAX_BYTES on disk
+EMB_CACHE_ENABLED = False
+EMB_CACHE_DIR = "data/embedding_cache"
+EMB_CACHE_MAX_BYTES = 4 * 1024**3
+EMB_CACHE_DTYPE = "float16"
+# Opt-in: keeps a copy of every stored embedding for `main.py load-shards`
+EMB_SHARDS_ENABLED = False
+EMB_SHARDS_DIR = "data/embeddings"
+EMB_SHARDS_DTYPE = "float16"
+EMB_SHARD_ROWS = 100_000
+PIPELINE_EMBED_WORKERS = 2
+PIPELINE_STORE_WORKERS = 4
+PIPELINE_QUEUE_SIZE = 8
+PARSE_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+PARSE_CHUNK_BYTES = 8 * 1024 * 1024
+DELTA_MODE = True
+DELTA_INDEX_FILE = "data/ingested.sqlite"
+# Skip records whose id and update_date match the delta index before decoding them
+DELTA_SKIP_UNCHANGED_DATES = True
 CHECKPOINT_FILE = "data/checkpoint.json"
+# "json" parses the snapshot, "columnar" streams PARSED_DIR, "auto" picks
+# columnar when it was built from the current snapshot
+INGEST_SOURCE = "auto"
+PARSED_DIR = "data/parsed"
+PARSED_ROWS_PER_PART = 200_000
+PARSED_CHECKPOINT_FILE = "data/parsed_checkpoint.json"
 LAST_DOWNLOAD_FILE = "data/last_download.json"
+METRICS_FILE = "data/metrics.prom"
+METRICS_INTERVAL = 10.0
+# Set to a port number to also serve the metrics over HTTP
+METRICS_PORT = None
+# Coordinator/worker ingestion: snapshot bytes per work unit, how long a
+# lease survives without a heartbeat, and how often idle workers re-check
+DIST_UNIT_BYTES = 64 * 1024 * 1024
+DIST_LEASE_TTL = 120.0
+DIST_HEARTBEAT_INTERVAL = 20.0
+DIST_POLL_INTERVAL = 10.0
+# Batches that failed to embed or store, for `main.py retry`
+DEADLETTER_FILE = "data/deadletter.jsonl"
+DEADLETTER_RETRY_ATTEMPTS = 5
+DEADLETTER_RETRY_BACKOFF = 1.0
+DEADLETTER_RETRY_MAX_BACKOFF = 30.0
 
 
 DATASET_PATH = "data/arxiv-metadata-oai-snapshot.json"
+# "json" extracts the Kaggle download to DATASET_PATH; "zip" keeps the archive
+# and the parser decompresses the snapshot out of it as it goes
+DATASET_FORMAT = "json"
+DATASET_ARCHIVE_PATH = "data/arxiv.zip"
+DATASET_SOURCE = DATASET_ARCHIVE_PATH if DATASET_FORMAT == "zip" else DATASET_PATH
+# The archive is fetched in parallel HTTP range requests, each chunk retried
+# with backoff and recorded in <archive>.manifest.json so an interrupted
+# download resumes. None resolves Kaggle's download link for the dataset;
+# any URL that serves byte ranges (a mirror, a local stand-in) works too.
+DATASET_URL = None
+DOWNLOAD_CHUNK_BYTES = 32 * 1024 * 1024
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_BACKOFF = 1.0
+DOWNLOAD_MAX_BACKOFF = 30.0
+DOWNLOAD_TIMEOUT = 60.0
 VALID_CATEGORIES = {
     "cs",
     "econ",
@@ -1,9 +1,43 @@
+import os
+import socket
+import argparse
 import asyncio
 import signal
 import logging
 
+from config import (
+    BATCH_SIZE,
+    DATASET_FORMAT,
+    DATASET_PATH,
+    DATASET_SOURCE,
+    DATASET_URL,
+    DEADLETTER_FILE,
+    DEADLETTER_RETRY_ATTEMPTS,
+    DELTA_INDEX_FILE,
+    DELTA_MODE,
+    DIST_POLL_INTERVAL,
+    DIST_UNIT_BYTES,
+    EMB_GATE_QUERIES,
+    EMB_GATE_SAMPLE_SIZE,
+    EMB_SHARDS_DIR,
+    INGEST_SOURCE,
+    PARSED_DIR,
+    PARSED_ROWS_PER_PART,
+)
+from services.batch import PaperBatch
+from services.columnar import ColumnarWriter
+from services.database import Database
 from services.dataset import DatasetDownloader
+from services.deadletter import DeadLetterRetry, DeadLetterStore
+from services.delta import DeltaIndex
+from services.embed import Embedder
+from services.gate import AccuracyGate
+from services.lease import LeaseQueue
+from services.parse import Parser
 from services.pipeline import Pipeline
+from services.shards import ShardReader
+from services.utils import dataset_fingerprint
+from services.worker import IngestWorker
 
 logger = logging.getLogger(__name__)
 
@@ -14,17 +48,293 @@ def setup_signal_handlers(shutdown_event: asyncio.Event):
         loop.add_signal_handler(sig, shutdown_event.set)
 
 
-async def main():
+async def run(args: argparse.Namespace):
     downloader = DatasetDownloader()
     downloader.run()
 
     shutdown_event = asyncio.Event()
     setup_signal_handlers(shutdown_event)
 
-    pipeline = Pipeline(shutdown_event)
+    pipeline = Pipeline(shutdown_event, source=args.source, bulk=args.bulk)
     await pipeline.run()
 
 
+async def download(args: argparse.Namespace):
+    """Download the dataset now, resuming an interrupted chunked download"""
+    downloader = DatasetDownloader(url=args.url)
+    downloader.run(force=True)
+
+
+async def parse(args: argparse.Namespace):
+    """Parse the JSON snapshot once into the columnar store"""
+    downloader = DatasetDownloader()
+    downloader.run()
+
+    parser = Parser(load_checkpoint=False, skip_unchanged=False)
+    writer = ColumnarWriter(PARSED_DIR, DATASET_SOURCE, PARSED_ROWS_PER_PART)
+    async for batch, _ in parser.parse_yield_batches():
+        writer.write(batch)
+    writer.close()
+
+
+async def load_shards(args: argparse.Namespace):
+    """Push persisted embedding shards into Qdrant without running the model"""
+    database = Database()
+    await database.start()
+    try:
+        await _load_shards_into(database, args.dir, bulk=args.bulk)
+    finally:
+        await database.close()
+
+
+async def _load_shards_into(database: Database, shards_dir: str, bulk: bool):
+    batches = ShardReader(shards_dir).iter_batches(BATCH_SIZE)
+
+    if bulk:
+        if not await database.start_bulk_load():
+            logger.error("Cannot access DB collection; aborting.")
+            return
+        try:
+            loaded = await database.bulk_load(batches)
+        finally:
+            await database.finish_bulk_load()
+    else:
+        if not await database.create_collection_if_not_exists():
+            logger.error("Cannot access DB collection; aborting.")
+            return
+        loaded = 0
+        for batch in batches:
+            if await database.insert_batch(batch):
+                loaded += len(batch)
+            else:
+                logger.warning(f"Insert failed for {len(batch)} papers")
+
+    logger.info(f"Loaded {loaded} papers from {shards_dir}")
+    logger.info(f"Number of points: {await database.count_points()}")
+
+
+async def retry(args: argparse.Namespace):
+    """Re-process only the dead-lettered batches, backing off between attempts"""
+    store = DeadLetterStore(args.file)
+    entries = store.take()
+    if not entries:
+        logger.info(f"No dead letters in {args.file}")
+        return
+
+    embedder = Embedder()
+    database = Database()
+    delta_index = DeltaIndex(DELTA_INDEX_FILE) if DELTA_MODE else None
+    await database.start()
+    try:
+        if not await database.create_collection_if_not_exists():
+            logger.error("Cannot access DB collection; dead letters are kept.")
+            return
+        await DeadLetterRetry(
+            store, database, embedder, delta_index, attempts=args.attempts
+        ).run()
+    finally:
+        await database.close()
+        embedder.close()
+        if delta_index:
+            delta_index.close()
+
+
+async def ensure_indexes(args: argparse.Namespace):
+    """Add any missing payload indexes to the existing collection"""
+    database = Database()
+    await database.start()
+    try:
+        if not await database.client.collection_exists(database.collection_name):
+            logger.error(f"Collection '{database.collection_name}' does not exist")
+            return
+        if not await database.ensure_payload_indexes():
+            logger.error("Payload indexes could not be verified")
+    finally:
+        await database.close()
+
+
+async def coordinate(args: argparse.Namespace):
+    """Split the snapshot into units for workers to claim from a shared directory"""
+    if DATASET_FORMAT != "json":
+        logger.error("Distributed ingestion needs DATASET_FORMAT = 'json'")
+        return
+
+    downloader = DatasetDownloader()
+    downloader.run()
+
+    parser = Parser(load_checkpoint=False, skip_unchanged=False)
+    ranges = parser.split_byte_ranges(0, None, args.unit_bytes)
+    queue = LeaseQueue(args.dir, "coordinator")
+    queue.plan(ranges, dataset_fingerprint(DATASET_PATH))
+
+    database = Database()
+    await database.start()
+    try:
+        if not await database.create_collection_if_not_exists():
+            logger.error("Cannot access DB collection; workers will fail too.")
+            return
+    finally:
+        await database.close()
+
+    if not args.watch:
+        return
+    shutdown_event = asyncio.Event()
+    setup_signal_handlers(shutdown_event)
+    while not shutdown_event.is_set():
+        progress = queue.progress()
+        logger.info(
+            f"Units: {progress['done']}/{progress['total']} done, "
+            f"{progress['leased']} leased, {progress['pending']} pending"
+        )
+        if progress["done"] == progress["total"]:
+            break
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), timeout=DIST_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def worker(args: argparse.Namespace):
+    """Claim and ingest units planned by `coordinate` until none are left"""
+    if DATASET_FORMAT != "json":
+        logger.error("Distributed ingestion needs DATASET_FORMAT = 'json'")
+        return
+
+    downloader = DatasetDownloader()
+    downloader.run()
+
+    shutdown_event = asyncio.Event()
+    setup_signal_handlers(shutdown_event)
+
+    worker_id = args.id or f"{socket.gethostname()}-{os.getpid()}"
+    await IngestWorker(args.dir, worker_id, shutdown_event).run()
+
+
+async def gate_model(args: argparse.Namespace):
+    """Compare a quantized model variant with fp32 and record whether it passes"""
+    parser = Parser(load_checkpoint=False, skip_unchanged=False)
+    sample = PaperBatch()
+    async for batch, _ in parser.parse_yield_batches():
+        sample.extend(batch)
+        if len(sample) >= args.sample_size:
+            break
+    if not sample:
+        logger.error("No papers to sample for the accuracy gate")
+        return
+
+    gate = AccuracyGate(args.variant)
+    await asyncio.to_thread(gate.run, sample.slice(0, args.sample_size), args.queries)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(description="Xivvy ingestion")
+    commands = arg_parser.add_subparsers(dest="command")
+
+    run_parser = commands.add_parser("run", help="Ingest papers into Qdrant")
+    run_parser.add_argument(
+        "--source",
+        choices=["auto", "json", "columnar"],
+        default=INGEST_SOURCE,
+        help="Where parsed papers come from",
+    )
+    run_parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="First-time population: defer indexing and don't wait on writes",
+    )
+    run_parser.set_defaults(handler=run)
+
+    download_parser = commands.add_parser(
+        "download", help="Download the dataset, resuming a partial download"
+    )
+    download_parser.add_argument(
+        "--url",
+        default=DATASET_URL,
+        help="Archive URL serving byte ranges (default: Kaggle's download link)",
+    )
+    download_parser.set_defaults(handler=download)
+
+    parse_parser = commands.add_parser(
+        "parse", help="Parse the snapshot into the columnar store"
+    )
+    parse_parser.set_defaults(handler=parse)
+
+    load_parser = commands.add_parser(
+        "load-shards",
+        help="Load embedding shards (written with EMB_SHARDS_ENABLED) into Qdrant",
+    )
+    load_parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Defer indexing and stream points through parallel upload workers",
+    )
+    load_parser.add_argument(
+        "--dir",
+        default=EMB_SHARDS_DIR,
+        help="Shard directory, e.g. one worker's data/embeddings/worker-<id>",
+    )
+    load_parser.set_defaults(handler=load_shards)
+
+    retry_parser = commands.add_parser(
+        "retry", help="Re-process batches that failed to embed or store"
+    )
+    retry_parser.add_argument(
+        "--file",
+        default=DEADLETTER_FILE,
+        help="Dead-letter file, e.g. one worker's data/deadletter-<id>.jsonl",
+    )
+    retry_parser.add_argument(
+        "--attempts", type=int, default=DEADLETTER_RETRY_ATTEMPTS
+    )
+    retry_parser.set_defaults(handler=retry)
+
+    index_parser = commands.add_parser(
+        "ensure-indexes", help="Add missing payload indexes to the collection"
+    )
+    index_parser.set_defaults(handler=ensure_indexes)
+
+    coordinate_parser = commands.add_parser(
+        "coordinate", help="Plan snapshot units for distributed workers"
+    )
+    coordinate_parser.add_argument(
+        "--dir", required=True, help="Directory shared by coordinator and workers"
+    )
+    coordinate_parser.add_argument(
+        "--unit-bytes", type=int, default=DIST_UNIT_BYTES, help="Snapshot bytes per unit"
+    )
+    coordinate_parser.add_argument(
+        "--watch", action="store_true", help="Report progress until all units are done"
+    )
+    coordinate_parser.set_defaults(handler=coordinate)
+
+    worker_parser = commands.add_parser(
+        "worker", help="Ingest units planned by the coordinator"
+    )
+    worker_parser.add_argument(
+        "--dir", required=True, help="Directory shared by coordinator and workers"
+    )
+    worker_parser.add_argument("--id", help="Worker id (default: hostname-pid)")
+    worker_parser.set_defaults(handler=worker)
+
+    gate_parser = commands.add_parser(
+        "gate-model",
+        help="Check a quantized embedding model against fp32 before it can be used",
+    )
+    gate_parser.add_argument("--variant", default="int8")
+    gate_parser.add_argument("--sample-size", type=int, default=EMB_GATE_SAMPLE_SIZE)
+    gate_parser.add_argument("--queries", type=int, default=EMB_GATE_QUERIES)
+    gate_parser.set_defaults(handler=gate_model)
+
+    return arg_parser
+
+
+async def main():
+    args = build_arg_parser().parse_args()
+    if args.command is None:
+        args = build_arg_parser().parse_args(["run"])
+    await args.handler(args)
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     try:
@@ -0,0 +1,167 @@
+import logging.config
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import LOG_CONFIG, VECTOR_SIZE
+from services.utils import CATEGORY_BITS, categories_to_mask, is_iso_date
+
+logging.config.dictConfig(LOG_CONFIG)
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def mask_categories(mask: int) -> Tuple[str, ...]:
+    """Category values set in a mask, sorted the way the parser sorts them"""
+    return tuple(
+        sorted(domain.value for domain, bit in CATEGORY_BITS.items() if mask & bit)
+    )
+
+
+@dataclass
+class PaperBatch:
+    """A batch of papers as parallel columns, from the Parser through to Qdrant.
+
+    Row i of every column is the same paper. Categories are kept as the
+    bitmask stored in Qdrant and embeddings, once computed, as a single
+    (rows, VECTOR_SIZE) float32 array. Rows are checked once, in bulk, by
+    validated() when the batch is built; later stages trust them.
+    """
+
+    ids: List[str] = field(default_factory=list)
+    titles: List[str] = field(default_factory=list)
+    abstracts: List[str] = field(default_factory=list)
+    authors: List[List[str]] = field(default_factory=list)
+    category_masks: List[int] = field(default_factory=list)
+    dates: List[str] = field(default_factory=list)
+    embeddings: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _columns(self) -> List[list]:
+        return [
+            getattr(self, f.name) for f in fields(self) if f.name != "embeddings"
+        ]
+
+    def append(
+        self,
+        paper_id: str,
+        title: str,
+        abstract: str,
+        authors: List[str],
+        category_mask: int,
+        date: str,
+    ) -> None:
+        self.ids.append(paper_id)
+        self.titles.append(title)
+        self.abstracts.append(abstract)
+        self.authors.append(authors)
+        self.category_masks.append(category_mask)
+        self.dates.append(date)
+
+    def extend(self, other: "PaperBatch") -> None:
+        if not len(self):
+            self.embeddings = (
+                None if other.embeddings is None else other.embeddings.copy()
+            )
+        elif (self.embeddings is None) != (other.embeddings is None):
+            raise ValueError("Cannot mix embedded and unembedded papers in a batch")
+        elif other.embeddings is not None:
+            self.embeddings = np.concatenate([self.embeddings, other.embeddings])
+        for column, values in zip(self._columns(), other._columns()):
+            column.extend(values)
+
+    def slice(self, start: int, stop: Optional[int] = None) -> "PaperBatch":
+        return PaperBatch(
+            *(column[start:stop] for column in self._columns()),
+            embeddings=None if self.embeddings is None else self.embeddings[start:stop],
+        )
+
+    def take(self, rows: Sequence[int]) -> "PaperBatch":
+        rows = list(rows)
+        return PaperBatch(
+            *([column[i] for i in rows] for column in self._columns()),
+            embeddings=None if self.embeddings is None else self.embeddings[rows],
+        )
+
+    def with_embeddings(self, embeddings: np.ndarray) -> "PaperBatch":
+        return PaperBatch(*self._columns(), embeddings=embeddings)
+
+    def categories(self, row: int) -> Tuple[str, ...]:
+        return mask_categories(self.category_masks[row])
+
+    def texts(self) -> List[str]:
+        """What gets embedded for each paper"""
+        return [
+            f"{title} {abstract}".strip()
+            for title, abstract in zip(self.titles, self.abstracts)
+        ]
+
+    def valid_rows(self) -> np.ndarray:
+        """Boolean mask of rows with an id, title, ISO date and usable embedding"""
+        if len({len(column) for column in self._columns()}) > 1:
+            raise ValueError("PaperBatch columns have different lengths")
+
+        valid = np.fromiter(map(bool, self.ids), dtype=bool, count=len(self))
+        valid &= np.fromiter(map(bool, self.titles), dtype=bool, count=len(self))
+        # An unconvertible date would fail the whole batch's upsert
+        valid &= np.fromiter(map(is_iso_date, self.dates), dtype=bool, count=len(self))
+        if self.embeddings is not None:
+            if self.embeddings.shape != (len(self), VECTOR_SIZE):
+                raise ValueError(
+                    f"Expected ({len(self)}, {VECTOR_SIZE}) embeddings, "
+                    f"got {self.embeddings.shape}"
+                )
+            valid &= np.isfinite(self.embeddings).all(axis=1)
+            valid &= np.any(self.embeddings, axis=1)
+        return valid
+
+    def validated(self) -> "PaperBatch":
+        """The batch without the rows valid_rows() rejects"""
+        valid = self.valid_rows()
+        if valid.all():
+            return self
+        logger.warning(f"Dropping {len(self) - int(valid.sum())} invalid papers")
+        return self.take(np.flatnonzero(valid))
+
+    def to_records(self) -> List[dict]:
+        """One JSON-friendly dict per paper, e.g. for the dead-letter file"""
+        records = [
+            {
+                "id": paper_id,
+                "title": title,
+                "abstract": abstract,
+                "authors": authors,
+                "categories": list(mask_categories(mask)),
+                "date_updated": date,
+            }
+            for paper_id, title, abstract, authors, mask, date in zip(*self._columns())
+        ]
+        if self.embeddings is not None:
+            for record, embedding in zip(records, self.embeddings.tolist()):
+                record["embedding"] = embedding
+        return records
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "PaperBatch":
+        """Inverse of to_records; also reads older records keyed by paper_id"""
+        batch = cls()
+        embeddings = []
+        for record in records:
+            batch.append(
+                record.get("id") or record.get("paper_id", ""),
+                record.get("title", ""),
+                record.get("abstract", ""),
+                record.get("authors", []),
+                categories_to_mask(record.get("categories", [])),
+                record.get("date_updated", ""),
+            )
+            if "embedding" in record:
+                embeddings.append(record["embedding"])
+        if embeddings and len(embeddings) == len(batch):
+            batch.embeddings = np.asarray(embeddings, dtype=np.float32)
+        return batch.validated()
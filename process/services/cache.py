@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import hashlib
+import logging.config
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import LOG_CONFIG
+
+logging.config.dictConfig(LOG_CONFIG)
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk embedding cache.
+
+    Vectors live in fixed-size memory-mapped blocks of `block_rows` rows; an
+    SQLite index maps hash(model name + text) to (block, row). When the blocks
+    exceed `max_bytes`, the oldest block and its index entries are dropped.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str,
+        dim: int,
+        max_bytes: int,
+        dtype: str = "float16",
+        block_rows: int = 65536,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.block_rows = block_rows
+        self.block_bytes = block_rows * dim * self.dtype.itemsize
+        self.max_blocks = max(1, max_bytes // self.block_bytes)
+        self.blocks: Dict[int, np.memmap] = {}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, block INTEGER, row INTEGER"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS blocks (block INTEGER PRIMARY KEY, rows INTEGER)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_block ON entries(block)")
+        self.conn.commit()
+
+        row = self.conn.execute(
+            "SELECT block, rows FROM blocks ORDER BY block DESC LIMIT 1"
+        ).fetchone()
+        self.active_block, self.active_rows = row if row else (-1, self.block_rows)
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.blake2b(
+            f"{self.model_name}\0{text}".encode("utf-8"), digest_size=16
+        ).digest()
+
+    def _block_path(self, block: int) -> str:
+        return os.path.join(self.cache_dir, f"block-{block:06d}.bin")
+
+    def _open_block(self, block: int, mode: str = "r+") -> np.memmap:
+        if block not in self.blocks:
+            self.blocks[block] = np.memmap(
+                self._block_path(block),
+                dtype=self.dtype,
+                mode=mode,
+                shape=(self.block_rows, self.dim),
+            )
+        return self.blocks[block]
+
+    def _start_block(self) -> None:
+        if self.active_block >= 0:
+            self._open_block(self.active_block).flush()
+
+        self.active_block += 1
+        self.active_rows = 0
+        self._open_block(self.active_block, mode="w+")
+        self.conn.execute(
+            "INSERT OR REPLACE INTO blocks (block, rows) VALUES (?, 0)",
+            (self.active_block,),
+        )
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop the oldest blocks until the cache fits in max_bytes"""
+        stale = [
+            block
+            for (block,) in self.conn.execute(
+                "SELECT block FROM blocks ORDER BY block DESC LIMIT -1 OFFSET ?",
+                (self.max_blocks,),
+            )
+        ]
+        for block in stale:
+            self.conn.execute("DELETE FROM entries WHERE block = ?", (block,))
+            self.conn.execute("DELETE FROM blocks WHERE block = ?", (block,))
+            self.blocks.pop(block, None)
+            try:
+                os.remove(self._block_path(block))
+            except FileNotFoundError:
+                pass
+            self.logger.info(f"Evicted embedding cache block {block}")
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up cached vectors; misses come back as None"""
+        if not texts:
+            return []
+
+        keys = [self._key(text) for text in texts]
+        placeholders = ",".join("?" * len(keys))
+        locations = {
+            key: (block, row)
+            for key, block, row in self.conn.execute(
+                f"SELECT key, block, row FROM entries WHERE key IN ({placeholders})",
+                keys,
+            )
+        }
+
+        vectors = []
+        for key in keys:
+            location = locations.get(key)
+            if location is None:
+                vectors.append(None)
+                continue
+            block, row = location
+            try:
+                vectors.append(
+                    np.asarray(self._open_block(block)[row], dtype=np.float32)
+                )
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Unreadable embedding cache block {block}: {e}")
+                vectors.append(None)
+        return vectors
+
+    def put_many(self, texts: List[str], vectors) -> None:
+        """Append vectors to the active block and index them"""
+        if not texts:
+            return
+
+        try:
+            entries = []
+            for text, vector in zip(texts, vectors):
+                if self.active_rows >= self.block_rows:
+                    self._start_block()
+                block = self._open_block(self.active_block)
+                block[self.active_rows] = vector
+                entries.append((self._key(text), self.active_block, self.active_rows))
+                self.active_rows += 1
+
+            block.flush()
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, block, row) VALUES (?, ?, ?)",
+                entries,
+            )
+            self.conn.execute(
+                "UPDATE blocks SET rows = ? WHERE block = ?",
+                (self.active_rows, self.active_block),
+            )
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"Error writing to embedding cache: {e}")
+
+    def close(self) -> None:
+        for block in self.blocks.values():
+            block.flush()
+        self.blocks.clear()
+        self.conn.close()
@@ -0,0 +1,205 @@
+import os
+import glob
+import json
+import asyncio
+import logging.config
+from datetime import timezone
+from typing import AsyncIterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import LOG_CONFIG
+from models import ArxivDomains
+from services.batch import PaperBatch
+from services.checkpoint import Checkpoint
+from services.utils import dataset_fingerprint, iso_date_to_unix, unix_to_iso
+
+logging.config.dictConfig(LOG_CONFIG)
+
+# Category codes are ArxivDomains positions, i.e. bit numbers in the category mask
+DOMAIN_COUNT = len(ArxivDomains)
+
+SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("title", pa.string()),
+        ("abstract", pa.string()),
+        ("authors", pa.list_(pa.string())),
+        ("categories", pa.list_(pa.uint8())),
+        ("date_updated", pa.int64()),
+    ]
+)
+
+MANIFEST_FILE = "manifest.json"
+
+
+class ColumnarWriter:
+    """Writes parsed papers into chunked Parquet files plus a manifest.
+
+    The manifest is only marked complete once every part is written, so an
+    interrupted parse is never mistaken for a usable store.
+    """
+
+    def __init__(self, directory: str, dataset_path: str, rows_per_part: int):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.dataset_path = dataset_path
+        self.rows_per_part = rows_per_part
+        self.parts: List[dict] = []
+        self.buffer = PaperBatch()
+
+        os.makedirs(directory, exist_ok=True)
+        for stale in glob.glob(os.path.join(directory, "part-*.parquet")) + [
+            os.path.join(directory, MANIFEST_FILE)
+        ]:
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    def write(self, papers: PaperBatch) -> None:
+        self.buffer.extend(papers)
+        while len(self.buffer) >= self.rows_per_part:
+            self._flush(self.buffer.slice(0, self.rows_per_part))
+            self.buffer = self.buffer.slice(self.rows_per_part)
+
+    def _flush(self, papers: PaperBatch) -> None:
+        if not papers:
+            return
+
+        table = pa.table(
+            {
+                "id": papers.ids,
+                "title": papers.titles,
+                "abstract": papers.abstracts,
+                "authors": papers.authors,
+                "categories": [
+                    [code for code in range(DOMAIN_COUNT) if mask >> code & 1]
+                    for mask in papers.category_masks
+                ],
+                "date_updated": [
+                    iso_date_to_unix(date, tz=timezone.utc) if date else None
+                    for date in papers.dates
+                ],
+            },
+            schema=SCHEMA,
+        )
+
+        name = f"part-{len(self.parts):05d}.parquet"
+        pq.write_table(table, os.path.join(self.directory, name), compression="zstd")
+        self.parts.append({"file": name, "rows": len(papers)})
+        self.logger.info(f"Wrote {len(papers)} papers to {name}")
+
+    def close(self) -> None:
+        """Flush the remaining papers and mark the store complete"""
+        self._flush(self.buffer)
+        self.buffer = PaperBatch()
+
+        manifest = {
+            "complete": True,
+            "parts": self.parts,
+            "rows": sum(part["rows"] for part in self.parts),
+            **dataset_fingerprint(self.dataset_path),
+        }
+        tmp_file = os.path.join(self.directory, f"{MANIFEST_FILE}.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_file, os.path.join(self.directory, MANIFEST_FILE))
+        self.logger.info(
+            f"Columnar store complete: {manifest['rows']} papers in {len(self.parts)} parts"
+        )
+
+
+class ColumnarReader:
+    """Streams PaperBatches back out of a ColumnarWriter store.
+
+    Offers the same parse_yield_batches/acknowledge interface as Parser, with
+    row indices in place of byte offsets.
+    """
+
+    def __init__(
+        self, directory: str, batch_size: int, checkpoint_file: Optional[str] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.checkpoint: Optional[Checkpoint] = None
+        if checkpoint_file:
+            self.checkpoint = Checkpoint(checkpoint_file, self.manifest_path)
+
+    def load_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_current(self, dataset_path: str) -> bool:
+        """True if the store is complete and was built from this exact dataset file"""
+        manifest = self.load_manifest()
+        if not manifest or not manifest.get("complete"):
+            return False
+        try:
+            fingerprint = dataset_fingerprint(dataset_path)
+        except OSError:
+            # The JSON may already be gone; the store is all we have
+            return True
+        return all(manifest.get(k) == v for k, v in fingerprint.items())
+
+    def acknowledge(self, end_row: int) -> None:
+        if self.checkpoint:
+            self.checkpoint.acknowledge(end_row)
+
+    def _to_papers(self, record_batch: pa.RecordBatch) -> PaperBatch:
+        # Rows were validated when they were parsed, skip re-validation
+        columns = record_batch.to_pydict()
+        return PaperBatch(
+            ids=columns["id"],
+            titles=columns["title"],
+            abstracts=columns["abstract"],
+            authors=columns["authors"],
+            category_masks=[
+                sum(1 << code for code in codes) for codes in columns["categories"]
+            ],
+            dates=[
+                unix_to_iso(date, tz=timezone.utc) if date is not None else ""
+                for date in columns["date_updated"]
+            ],
+        )
+
+    async def parse_yield_batches(
+        self,
+    ) -> AsyncIterator[Tuple[PaperBatch, int]]:
+        """Yield (batch, end row) pairs, resuming after the last acknowledged row"""
+        manifest = self.load_manifest()
+        if not manifest or not manifest.get("complete"):
+            self.logger.error(f"No complete columnar store in {self.directory}")
+            return
+
+        start_row = self.checkpoint.offset if self.checkpoint else 0
+        self.logger.info(f"Streaming columnar store from row {start_row}")
+
+        part_start = 0
+        for part in manifest["parts"]:
+            part_end = part_start + part["rows"]
+            if part_end <= start_row:
+                part_start = part_end
+                continue
+
+            row = part_start
+            parquet_file = pq.ParquetFile(os.path.join(self.directory, part["file"]))
+            for record_batch in parquet_file.iter_batches(batch_size=self.batch_size):
+                batch_end = row + record_batch.num_rows
+                if batch_end <= start_row:
+                    row = batch_end
+                    continue
+                if row < start_row:
+                    record_batch = record_batch.slice(start_row - row)
+
+                if self.checkpoint:
+                    self.checkpoint.register(batch_end)
+                yield self._to_papers(record_batch), batch_end
+                row = batch_end
+                await asyncio.sleep(0)
+
+            part_start = part_end
@@ -1,8 +1,8 @@
 import logging.config
-import socket
 import asyncio
+import time
 from qdrant_client import AsyncQdrantClient, models
-from typing import List
+from typing import AsyncIterator, Iterable, List, Optional, Union
 from cachetools import TTLCache
 
 from config import (
@@ -13,53 +13,181 @@ from config import (
     CACHE_TTL,
     VECTOR_SIZE,
     HOST,
+    BULK_LOAD_WORKERS,
+    BULK_LOAD_BATCH_SIZE,
+    UPSERT_BATCH_SIZE,
+    BULK_LOAD_INDEXING_THRESHOLD,
+    BULK_LOAD_GREEN_TIMEOUT,
+    HEALTH_CHECK_INTERVAL,
+    HEALTH_CHECK_TIMEOUT,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+)
+from services.batch import PaperBatch
+from services.health import CircuitBreaker, HealthMonitor
+from services.metrics import (
+    BATCH_SIZES,
+    STAGE_ERRORS,
+    STAGE_IN_FLIGHT,
+    STAGE_PAPERS,
+    STAGE_SECONDS,
 )
-from models import StoredPaper
-from services.embed import Embedder
 from services.utils import string_to_uuid, iso_date_to_unix
 
 logging.config.dictConfig(LOG_CONFIG)
 
+# Payload fields used in filters; without these every filter scans payloads
+PAYLOAD_INDEXES = {
+    "id": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD),
+    "category_mask": models.IntegerIndexParams(
+        type=models.IntegerIndexType.INTEGER, lookup=True, range=False
+    ),
+    "date_updated": models.IntegerIndexParams(
+        type=models.IntegerIndexType.INTEGER, lookup=False, range=True
+    ),
+    # Matched by the API on points stored before category_mask, while its
+    # CATEGORY_LEGACY_MATCH is on
+    "categories": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD),
+}
+
+
+def _schema_type(value) -> str:
+    return str(getattr(value, "value", value))
+
+
+def _index_mismatch(current: models.PayloadIndexInfo, params) -> Optional[str]:
+    """How an existing payload index differs from params, or None if it doesn't"""
+    expected = _schema_type(params.type)
+    if _schema_type(current.data_type) != expected:
+        return f"is {_schema_type(current.data_type)}, expected {expected}"
+    # Only the options set in PAYLOAD_INDEXES; the rest are server defaults
+    wanted = params.model_dump(exclude_unset=True, exclude={"type"})
+    actual = current.params.model_dump() if current.params else {}
+    changed = [
+        f"{option}={actual.get(option)}, expected {value}"
+        for option, value in wanted.items()
+        if actual.get(option) != value
+    ]
+    return "; ".join(changed) or None
+
 
 class Database:
-    def __init__(self) -> None:
+    def __init__(self, client: Optional[AsyncQdrantClient] = None) -> None:
         self.logger = logging.getLogger(__name__)
-        self.client = AsyncQdrantClient(
+        self.client = client or AsyncQdrantClient(
             url=f"http://{HOST}:{DB_PORT}",
             prefer_grpc=True,
             timeout=10.0,
         )
         self.collection_name = DB_COLLECTION_NAME
-        self.embedder = Embedder()
 
         self.id_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
         self.query_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
 
         self.semaphore = asyncio.Semaphore(20)
+        self.payload_indexes_ready = False
+        # Set by start_bulk_load and restored by finish_bulk_load
+        self.indexing_threshold = BULK_LOAD_INDEXING_THRESHOLD
+        self.upsert_batch_size = UPSERT_BATCH_SIZE
+
+        self.breaker = CircuitBreaker(
+            failure_threshold=BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=BREAKER_RESET_TIMEOUT,
+        )
+        self.health = HealthMonitor(
+            self.client,
+            self.breaker,
+            interval=HEALTH_CHECK_INTERVAL,
+            timeout=HEALTH_CHECK_TIMEOUT,
+        )
+
+    async def start(self) -> None:
+        """Start background health monitoring of Qdrant"""
+        await self.health.start()
+
+    async def close(self) -> None:
+        await self.health.stop()
 
     def is_server_running(self) -> bool:
-        host = HOST
-        port = DB_PORT
+        """Last known Qdrant reachability, without any network I/O"""
+        return self.health.is_healthy
+
+    async def _create_collection(
+        self, optimizers_config: Optional[models.OptimizersConfigDiff] = None
+    ) -> None:
+        await self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=models.VectorParams(
+                size=VECTOR_SIZE,
+                distance=models.Distance.COSINE,
+                on_disk=True,
+            ),
+            quantization_config=models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    always_ram=True,
+                ),
+            ),
+            optimizers_config=optimizers_config,
+        )
+
+    async def ensure_payload_indexes(self) -> bool:
+        """Create any missing payload indexes on the collection and verify them"""
+        if self.payload_indexes_ready:
+            return True
 
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(1)
-                try:
-                    sock.connect((host, port))
-                    self.logger.info(f"Qdrant server is running on {host}:{port}")
-                    return True
-                except (ConnectionRefusedError, socket.timeout):
+            info = await self.client.get_collection(self.collection_name)
+            existing = info.payload_schema or {}
+
+            for field, params in PAYLOAD_INDEXES.items():
+                expected = _schema_type(params.type)
+                current = existing.get(field)
+                mismatch = current is not None and _index_mismatch(current, params)
+                if current is not None and not mismatch:
+                    continue
+
+                if current is not None:
                     self.logger.warning(
-                        f"Qdrant server not accessible at {host}:{port}"
+                        f"Payload index on '{field}' {mismatch}; rebuilding"
                     )
-                    return False
+                    await self.client.delete_payload_index(
+                        collection_name=self.collection_name,
+                        field_name=field,
+                        wait=True,
+                    )
+
+                self.logger.info(f"Creating {expected} payload index on '{field}'...")
+                await self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=params,
+                    wait=True,
+                )
+
+            info = await self.client.get_collection(self.collection_name)
+            schema = info.payload_schema or {}
+            missing = [
+                field
+                for field, params in PAYLOAD_INDEXES.items()
+                if field not in schema or _index_mismatch(schema[field], params)
+            ]
+            if missing:
+                self.logger.warning(f"Payload indexes still missing: {missing}")
+                return False
+
+            self.payload_indexes_ready = True
+            self.logger.info(
+                f"Payload indexes verified on {', '.join(PAYLOAD_INDEXES)}"
+            )
+            return True
         except Exception as e:
-            self.logger.error(f"Unexpected error checking server status: {str(e)}")
+            self.logger.error(f"Error ensuring payload indexes: {e}")
             return False
 
     async def create_collection_if_not_exists(self) -> bool:
-        if not self.is_server_running():
-            self.logger.error("Cannot create collection: Qdrant server is not running")
+        if not self.breaker.allow():
+            self.logger.error("Cannot create collection: Qdrant circuit is open")
             return False
 
         try:
@@ -67,74 +195,98 @@ class Database:
                 self.client.collection_exists(self.collection_name), timeout=5.0
             )
 
+            self.breaker.record_success()
+
             if collection_exists:
                 self.logger.info(f"Collection '{self.collection_name}' found.")
+                await self.ensure_payload_indexes()
                 return True
             else:
                 self.logger.info(
                     f"Collection '{self.collection_name}' not found. Creating..."
                 )
                 try:
-                    await self.client.create_collection(
-                        collection_name=self.collection_name,
-                        vectors_config=models.VectorParams(
-                            size=VECTOR_SIZE,
-                            distance=models.Distance.COSINE,
-                            on_disk=True,
-                        ),
-                        quantization_config=models.ScalarQuantization(
-                            scalar=models.ScalarQuantizationConfig(
-                                type=models.ScalarType.INT8,
-                                always_ram=True,
-                            ),
-                        ),
-                    )
+                    await self._create_collection()
                     self.logger.info(f"Created collection '{self.collection_name}'.")
+                    await self.ensure_payload_indexes()
                     return True
                 except asyncio.TimeoutError:
                     self.logger.error("Timeout while creating collection")
                     return False
         except asyncio.TimeoutError:
+            self.breaker.record_failure()
             self.logger.error("Timeout while checking if collection exists")
             return False
         except Exception as e:
+            self.breaker.record_failure()
             self.logger.error(f"Error creating collection: {str(e)}")
             return False
 
-    async def insert_batch(self, batch: List[StoredPaper]) -> bool:
-        if not self.is_server_running():
-            self.logger.error("Cannot insert batch: Qdrant server is not running")
+    def _build_points(self, batch: PaperBatch) -> List[models.PointStruct]:
+        # One conversion of the whole embedding array instead of one per row
+        vectors = batch.embeddings.tolist()
+        return [
+            models.PointStruct(
+                id=str(string_to_uuid(paper_id)),
+                payload={
+                    "id": paper_id,
+                    "category_mask": category_mask,
+                    "authors": authors,
+                    "title": title,
+                    "date_updated": iso_date_to_unix(date),
+                },
+                vector=vector,
+            )
+            for paper_id, title, authors, category_mask, date, vector in zip(
+                batch.ids,
+                batch.titles,
+                batch.authors,
+                batch.category_masks,
+                batch.dates,
+                vectors,
+            )
+        ]
+
+    async def _upsert(self, points: List[models.PointStruct], wait: bool) -> None:
+        """One instrumented upsert call; raises on failure"""
+        BATCH_SIZES.observe(len(points), stage="upsert")
+        STAGE_IN_FLIGHT.inc(stage="upsert")
+        try:
+            with STAGE_SECONDS.time(stage="upsert"):
+                await self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=points,
+                    wait=wait,
+                )
+            self.breaker.record_success()
+            STAGE_PAPERS.inc(len(points), stage="upsert")
+        except Exception:
+            self.breaker.record_failure()
+            STAGE_ERRORS.inc(stage="upsert")
+            raise
+        finally:
+            STAGE_IN_FLIGHT.dec(stage="upsert")
+
+    async def insert_batch(self, batch: PaperBatch, wait: bool = True) -> bool:
+        if not self.breaker.allow():
+            self.logger.error("Cannot insert batch: Qdrant circuit is open")
             return False
 
         if not batch:
             self.logger.warning("No papers to insert in batch")
             return False
 
-        points = [
-            models.PointStruct(
-                id=str(string_to_uuid(paper.paper_id)),
-                payload={
-                    "id": paper.paper_id,
-                    "categories": [cat.value for cat in paper.categories],
-                    "authors": paper.authors,
-                    "title": paper.title,
-                    "date_updated": iso_date_to_unix(paper.date_updated),
-                },
-                vector=paper.embedding,
-            )
-            for paper in batch
-        ]
+        points = self._build_points(batch)
 
         try:
             async with self.semaphore:
                 self.logger.info(
                     f"Inserting batch of {len(points)} papers into collection"
                 )
-                await self.client.upsert(
-                    collection_name=self.collection_name,
-                    points=points,
-                    wait=True,
-                )
+                for i in range(0, len(points), self.upsert_batch_size):
+                    await self._upsert(
+                        points[i : i + self.upsert_batch_size], wait=wait
+                    )
 
                 self.id_cache.clear()
                 self.query_cache.clear()
@@ -152,18 +304,135 @@ class Database:
         Returns:
             int: Number of points in the collection. Returns -1 if error occurs.
         """
-        if not self.is_server_running():
-            self.logger.error("Cannot count points: Qdrant server is not running")
+        if not self.breaker.allow():
+            self.logger.error("Cannot count points: Qdrant circuit is open")
             return -1
 
         try:
             async with self.semaphore:
                 collection_info = await self.client.get_collection(self.collection_name)
+                self.breaker.record_success()
                 point_count = collection_info.points_count
                 self.logger.info(
                     f"Collection '{self.collection_name}' contains {point_count} points."
                 )
                 return point_count
         except Exception as e:
+            self.breaker.record_failure()
             self.logger.error(f"Error retrieving collection info: {str(e)}")
             return -1
+
+    async def start_bulk_load(self) -> bool:
+        """Create the collection (or reuse it) with HNSW indexing deferred"""
+        if not self.breaker.allow():
+            self.logger.error("Cannot start bulk load: Qdrant circuit is open")
+            return False
+
+        deferred = models.OptimizersConfigDiff(indexing_threshold=0)
+        try:
+            if await self.client.collection_exists(self.collection_name):
+                info = await self.client.get_collection(self.collection_name)
+                # 0 means an earlier bulk load never finished; don't keep that
+                self.indexing_threshold = (
+                    info.config.optimizer_config.indexing_threshold
+                    or BULK_LOAD_INDEXING_THRESHOLD
+                )
+                await self.client.update_collection(
+                    collection_name=self.collection_name,
+                    optimizers_config=deferred,
+                )
+                self.logger.info(
+                    f"Deferred indexing on existing collection '{self.collection_name}'."
+                )
+            else:
+                self.indexing_threshold = BULK_LOAD_INDEXING_THRESHOLD
+                await self._create_collection(optimizers_config=deferred)
+                self.logger.info(
+                    f"Created collection '{self.collection_name}' with indexing deferred."
+                )
+            # Index payloads before points arrive so HNSW builds filter-aware links
+            await self.ensure_payload_indexes()
+            return True
+        except Exception as e:
+            self.logger.error(f"Error preparing collection for bulk load: {e}")
+            return False
+
+    async def bulk_load(
+        self,
+        batches: Union[Iterable[PaperBatch], AsyncIterator[PaperBatch]],
+        workers: int = BULK_LOAD_WORKERS,
+    ) -> int:
+        """Stream points through parallel upsert workers without waiting on each write.
+
+        Call start_bulk_load first and finish_bulk_load afterwards. Returns the
+        number of points accepted by Qdrant.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        stats = {"loaded": 0, "failed": 0}
+
+        async def upload_worker() -> None:
+            while (points := await queue.get()) is not None:
+                try:
+                    await self._upsert(points, wait=False)
+                    stats["loaded"] += len(points)
+                except Exception as e:
+                    stats["failed"] += len(points)
+                    self.logger.error(f"Error uploading {len(points)} points: {e}")
+
+        tasks = [asyncio.create_task(upload_worker()) for _ in range(workers)]
+        pending: List[models.PointStruct] = []
+
+        async def feed(batch: PaperBatch) -> None:
+            pending.extend(self._build_points(batch))
+            while len(pending) >= BULK_LOAD_BATCH_SIZE:
+                await queue.put(pending[:BULK_LOAD_BATCH_SIZE])
+                del pending[:BULK_LOAD_BATCH_SIZE]
+
+        try:
+            if hasattr(batches, "__aiter__"):
+                async for batch in batches:
+                    await feed(batch)
+            else:
+                for batch in batches:
+                    await feed(batch)
+            if pending:
+                await queue.put(list(pending))
+        finally:
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+
+        self.id_cache.clear()
+        self.query_cache.clear()
+        self.logger.info(
+            f"Bulk load sent {stats['loaded']} points ({stats['failed']} failed)"
+        )
+        return stats["loaded"]
+
+    async def finish_bulk_load(self, timeout: float = BULK_LOAD_GREEN_TIMEOUT) -> bool:
+        """Restore the indexing threshold start_bulk_load saved and wait for green"""
+        try:
+            await self.client.update_collection(
+                collection_name=self.collection_name,
+                optimizers_config=models.OptimizersConfigDiff(
+                    indexing_threshold=self.indexing_threshold
+                ),
+            )
+            self.logger.info("Re-enabled indexing; waiting for the optimizer...")
+
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                collection_info = await self.client.get_collection(self.collection_name)
+                if collection_info.status == models.CollectionStatus.GREEN:
+                    self.logger.info(
+                        f"Collection '{self.collection_name}' is green "
+                        f"({collection_info.points_count} points)."
+                    )
+                    return True
+                await asyncio.sleep(5)
+
+            self.logger.error("Timed out waiting for the collection to turn green")
+            return False
+        except Exception as e:
+            self.logger.error(f"Error finishing bulk load: {e}")
+            return False
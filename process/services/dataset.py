@@ -1,21 +1,33 @@
 import os
 import time
+import shutil
+import zipfile
 import logging.config
 import json
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 import requests.exceptions
 
 from config import (
     KAGGLE_DATASET_NAME,
+    KAGGLE_DOWNLOAD_URL,
     LOG_CONFIG,
     KAGGLE_CONFIG_DIR,
     LAST_DOWNLOAD_FILE,
+    DATASET_PATH,
+    DATASET_FORMAT,
+    DATASET_SOURCE,
+    DATASET_ARCHIVE_PATH,
+    DATASET_URL,
+    DOWNLOAD_TIMEOUT,
 )
 
 os.environ["KAGGLE_CONFIG_DIR"] = KAGGLE_CONFIG_DIR
 
 from kaggle.api.kaggle_api_extended import KaggleApi
 
+from services.download import ChunkedDownloader
+
 logging.config.dictConfig(LOG_CONFIG)
 
 
@@ -26,9 +38,10 @@ logging.config.dictConfig(LOG_CONFIG)
 
 
 class DatasetDownloader:
-    def __init__(self):
+    def __init__(self, url: Optional[str] = DATASET_URL):
         self.api = KaggleApi()
         self.dataset_name = KAGGLE_DATASET_NAME
+        self.url = url
         self.logger = logging.getLogger(__name__)
         self.timestamp_file = LAST_DOWNLOAD_FILE
         try:
@@ -71,6 +84,62 @@ class DatasetDownloader:
             self.logger.info("Dataset is up-to-date. No download needed.")
             return False
 
+    def _kaggle_auth(self) -> Optional[Tuple[str, str]]:
+        config = getattr(self.api, "config_values", None) or {}
+        if config.get("username") and config.get("key"):
+            return config["username"], config["key"]
+        return None
+
+    def _download_url(self) -> Optional[str]:
+        """The configured URL, or the signed link Kaggle redirects its download to"""
+        if self.url:
+            return self.url
+
+        try:
+            response = requests.get(
+                KAGGLE_DOWNLOAD_URL,
+                auth=self._kaggle_auth(),
+                allow_redirects=False,
+                stream=True,
+                timeout=DOWNLOAD_TIMEOUT,
+            )
+            response.close()
+        except requests.exceptions.RequestException as e:
+            self.logger.warning(f"Could not resolve the Kaggle download link: {e}")
+            return None
+
+        location = response.headers.get("Location")
+        if response.is_redirect and location:
+            return location
+        self.logger.warning(
+            f"Kaggle answered {response.status_code} instead of a download link"
+        )
+        return None
+
+    def _extract(self) -> None:
+        """Unpack the snapshot and drop the archive, as the Kaggle API's unzip does"""
+        member = os.path.basename(DATASET_PATH)
+        self.logger.info(f"Extracting {member} from {DATASET_ARCHIVE_PATH}...")
+        with zipfile.ZipFile(DATASET_ARCHIVE_PATH) as archive:
+            with archive.open(member) as src, open(DATASET_PATH, "wb") as dst:
+                shutil.copyfileobj(src, dst, 16 * 1024 * 1024)
+        os.remove(DATASET_ARCHIVE_PATH)
+
+    def _download_chunked(self, downloader: ChunkedDownloader, remote: dict) -> bool:
+        if not downloader.run(remote):
+            self.logger.error("Dataset download incomplete; the next run resumes it.")
+            return False
+        if DATASET_FORMAT != "zip":
+            self._extract()
+        return True
+
+    def _download_with_api(self) -> bool:
+        # In zip mode the archive is kept as is and parsed without extracting
+        self.api.dataset_download_files(
+            self.dataset_name, path="data", unzip=DATASET_FORMAT != "zip"
+        )
+        return True
+
     def download(self):
         start = time.perf_counter()
         self.logger.info("Starting dataset download...")
@@ -81,30 +150,46 @@ class DatasetDownloader:
             self.logger.info("Data directory created successfully.")
 
         try:
-            self.api.dataset_download_files(self.dataset_name, path="data", unzip=True)
-            elapsed = time.perf_counter() - start
-            self.logger.info(f"Dataset download complete. Time taken: {elapsed:.2f}s")
-            self._save_download_time()
+            url = self._download_url()
+            downloader = ChunkedDownloader(url, DATASET_ARCHIVE_PATH) if url else None
+            remote = downloader.probe() if downloader else None
+            if remote is not None:
+                completed = self._download_chunked(downloader, remote)
+            else:
+                self.logger.warning(
+                    "Chunked download unavailable; downloading through the Kaggle API"
+                )
+                completed = self._download_with_api()
+
+            if completed:
+                elapsed = time.perf_counter() - start
+                self.logger.info(
+                    f"Dataset download complete. Time taken: {elapsed:.2f}s"
+                )
+                self._save_download_time()
         except requests.exceptions.RequestException as e:
             self.logger.exception(f"Network/API error occurred: {e}")
         except PermissionError as e:
             self.logger.exception(f"Permission denied for directory access: {e}")
         except FileNotFoundError as e:
             self.logger.exception(f"Directory path not found: {e}")
+        except zipfile.BadZipFile as e:
+            self.logger.exception(f"Downloaded archive is not a valid zip: {e}")
         except Exception as e:
             self.logger.exception(f"Unexpected error during download: {e}")
 
-    def run(self):
+    def run(self, force: bool = False):
         total_start_time = time.perf_counter()
 
-        if self._is_download_needed():
-            json_file_path = os.path.join("data", "arxiv-metadata-oai-snapshot.json")
-            if os.path.exists(json_file_path):
-                self.logger.info(f"Removing previous {json_file_path}...")
-                os.remove(json_file_path)
-                self.logger.info(f"Previous {json_file_path} removed successfully.")
-            else:
-                self.logger.info(f"No previous {json_file_path} found.")
+        if force or self._is_download_needed():
+            # An extracted snapshot left from json mode is stale in zip mode too
+            for file_path in dict.fromkeys([DATASET_SOURCE, DATASET_PATH]):
+                if os.path.exists(file_path):
+                    self.logger.info(f"Removing previous {file_path}...")
+                    os.remove(file_path)
+                    self.logger.info(f"Previous {file_path} removed successfully.")
+                else:
+                    self.logger.info(f"No previous {file_path} found.")
 
             self.download()
         else:
@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import fcntl
+import asyncio
+import logging.config
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    LOG_CONFIG,
+    DEADLETTER_RETRY_ATTEMPTS,
+    DEADLETTER_RETRY_BACKOFF,
+    DEADLETTER_RETRY_MAX_BACKOFF,
+)
+from services.batch import PaperBatch
+from services.delta import DeltaIndex
+
+logging.config.dictConfig(LOG_CONFIG)
+
+# Which stage failed decides what is kept: papers to embed, or embedded papers
+# ready to upsert without running the model again
+EMBED = "embed"
+STORE = "store"
+
+
+class DeadLetterStore:
+    """Append-only JSONL of batches the pipeline failed to embed or store.
+
+    One line per failed batch with the stage, the reason, the number of
+    attempts so far, the papers and their delta index entries. Appends and
+    take() hold an exclusive lock on the file, so a retry can drain it while
+    a pipeline is still adding to it.
+    """
+
+    def __init__(self, path: str):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        # Entries being retried; left behind if a retry dies and picked up next time
+        self.retrying_path = f"{path}.retrying"
+
+    def add(
+        self,
+        stage: str,
+        reason: str,
+        papers: PaperBatch,
+        delta_entries: Optional[Dict[str, Tuple[str, int]]] = None,
+        attempts: int = 0,
+    ) -> bool:
+        if not papers:
+            return True
+
+        entry = {
+            "stage": stage,
+            "reason": reason,
+            "attempts": attempts,
+            "failed_at": time.time(),
+            "papers": papers.to_records(),
+            "delta": {
+                paper_id: list(value)
+                for paper_id, value in (delta_entries or {}).items()
+            },
+        }
+        line = json.dumps(entry) + "\n"
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.logger.warning(
+                f"Dead-lettered {len(papers)} papers at the {stage} stage: {reason}"
+            )
+            return True
+        except Exception as e:
+            self.logger.error(f"Error writing dead letter: {e}")
+            return False
+
+    def take(self) -> List[dict]:
+        """Move every entry into the retrying file and return them"""
+        if os.path.exists(self.path):
+            with open(self.path, "r+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                pending = f.read()
+                with open(self.retrying_path, "a") as retrying:
+                    retrying.write(pending)
+                    retrying.flush()
+                    os.fsync(retrying.fileno())
+                f.seek(0)
+                f.truncate()
+
+        if not os.path.exists(self.retrying_path):
+            return []
+
+        entries = []
+        with open(self.retrying_path, "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write
+                    self.logger.error(f"Skipping unreadable dead letter: {line[:100]}")
+        return entries
+
+    def settle(self) -> None:
+        """Drop the retrying file once every taken entry is stored or re-added"""
+        try:
+            os.remove(self.retrying_path)
+        except FileNotFoundError:
+            pass
+
+    def count(self) -> int:
+        try:
+            with open(self.path, "r") as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+
+class DeadLetterRetry:
+    """Re-processes dead-lettered batches with exponential backoff.
+
+    Embed failures go through the model again and then to Qdrant; store
+    failures go straight to Qdrant. A batch that embeds but fails to store
+    is kept as a store failure so the model isn't run twice. Whatever still
+    fails after the last attempt goes back into the store.
+    """
+
+    def __init__(
+        self,
+        store: DeadLetterStore,
+        database,
+        embedder=None,
+        delta_index: Optional[DeltaIndex] = None,
+        attempts: int = DEADLETTER_RETRY_ATTEMPTS,
+        backoff: float = DEADLETTER_RETRY_BACKOFF,
+        max_backoff: float = DEADLETTER_RETRY_MAX_BACKOFF,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.store = store
+        self.database = database
+        self.embedder = embedder
+        self.delta_index = delta_index
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    async def _attempt(self, entry: dict) -> Optional[str]:
+        """One try at an entry; None on success, else the failure reason"""
+        papers = PaperBatch.from_records(entry["papers"])
+        delta = entry["delta"]
+        if entry["stage"] == EMBED:
+            if self.embedder is None:
+                return "no embedder available"
+            embedded = await self.embedder.embed_batch(papers)
+            if not embedded:
+                # Left whole, so it is retried and re-added once by _retry_entry
+                return "embedding failed on retry"
+            embedded_ids = set(embedded.ids)
+            missing = papers.take(
+                [
+                    row
+                    for row, paper_id in enumerate(papers.ids)
+                    if paper_id not in embedded_ids
+                ]
+            )
+            if missing:
+                self.store.add(
+                    EMBED,
+                    "embedding failed on retry",
+                    missing,
+                    {k: tuple(delta[k]) for k in missing.ids if k in delta},
+                    attempts=entry["attempts"] + 1,
+                )
+            entry["stage"] = STORE
+            entry["papers"] = embedded.to_records()
+            papers = embedded
+
+        if not await self.database.insert_batch(papers):
+            return "insert failed"
+        if self.delta_index:
+            self.delta_index.record(
+                {k: tuple(delta[k]) for k in papers.ids if k in delta}
+            )
+        return None
+
+    async def _retry_entry(self, entry: dict) -> bool:
+        for attempt in range(self.attempts):
+            if attempt:
+                delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+                await asyncio.sleep(delay)
+            try:
+                reason = await self._attempt(entry)
+            except Exception as e:
+                reason = str(e)
+            if reason is None:
+                return True
+            entry["attempts"] += 1
+            entry["reason"] = reason
+            self.logger.warning(
+                f"Retry {attempt + 1}/{self.attempts} of {len(entry['papers'])} "
+                f"papers failed at the {entry['stage']} stage: {reason}"
+            )
+
+        self.store.add(
+            entry["stage"],
+            entry["reason"],
+            PaperBatch.from_records(entry["papers"]),
+            {k: tuple(v) for k, v in entry["delta"].items()},
+            attempts=entry["attempts"],
+        )
+        return False
+
+    async def run(self) -> Dict[str, int]:
+        entries = self.store.take()
+        stats = {"batches": len(entries), "recovered": 0, "failed": 0}
+        if not entries:
+            self.logger.info("No dead letters to retry")
+            return stats
+
+        self.logger.info(f"Retrying {len(entries)} dead-lettered batches")
+        for entry in entries:
+            papers = len(entry["papers"])
+            if await self._retry_entry(entry):
+                # Papers the model still couldn't embed were put back on their own
+                stats["recovered"] += len(entry["papers"])
+                stats["failed"] += papers - len(entry["papers"])
+            else:
+                stats["failed"] += papers
+        self.store.settle()
+
+        self.logger.info(
+            f"Recovered {stats['recovered']} papers; "
+            f"{stats['failed']} papers remain dead-lettered"
+        )
+        return stats
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import hashlib
+import logging.config
+from typing import Dict, List, Tuple
+
+from config import LOG_CONFIG
+from services.batch import PaperBatch
+
+logging.config.dictConfig(LOG_CONFIG)
+
+# Ids per IN (...) query; older SQLite builds allow only 999 parameters
+LOOKUP_CHUNK = 500
+
+
+def content_hash(batch: PaperBatch, row: int) -> int:
+    """64-bit hash of everything that ends up in a stored point"""
+    digest = hashlib.blake2b(digest_size=8)
+    for part in (
+        batch.titles[row],
+        batch.abstracts[row],
+        "\x1f".join(batch.authors[row]),
+        "\x1f".join(batch.categories(row)),
+        batch.dates[row],
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x1e")
+    return int.from_bytes(digest.digest(), "big", signed=True)
+
+
+class DeltaIndex:
+    """Local (id, update_date, content hash) index of every ingested paper.
+
+    Used to send only new or changed papers of a fresh snapshot through
+    embedding and upsert.
+    """
+
+    def __init__(self, index_file: str, read_only: bool = False):
+        self.logger = logging.getLogger(__name__)
+        self.index_file = index_file
+
+        if read_only:
+            self.conn = sqlite3.connect(
+                f"file:{index_file}?mode=ro", uri=True, check_same_thread=False
+            )
+            return
+
+        os.makedirs(os.path.dirname(index_file) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(index_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS papers ("
+            "id TEXT PRIMARY KEY, update_date TEXT, content_hash INTEGER"
+            ") WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def _lookup(self, column: str, ids: List[str]) -> dict:
+        """Map the ids that are in the index to one of their stored columns"""
+        known = {}
+        for i in range(0, len(ids), LOOKUP_CHUNK):
+            chunk = ids[i : i + LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            known.update(
+                self.conn.execute(
+                    f"SELECT id, {column} FROM papers WHERE id IN ({placeholders})",
+                    chunk,
+                )
+            )
+        return known
+
+    def known_dates(self, ids: List[str]) -> Dict[str, str]:
+        """Map already-ingested ids to the update_date they were stored with"""
+        return self._lookup("update_date", ids)
+
+    def filter_changed(
+        self, batch: PaperBatch
+    ) -> Tuple[PaperBatch, Dict[str, Tuple[str, int]]]:
+        """Return the papers that are new or changed, plus their index entries"""
+        if not batch:
+            return batch, {}
+
+        hashes = {
+            paper_id: content_hash(batch, row) for row, paper_id in enumerate(batch.ids)
+        }
+        known = self._lookup("content_hash", list(hashes))
+
+        rows = [
+            row
+            for row, paper_id in enumerate(batch.ids)
+            if known.get(paper_id) != hashes[paper_id]
+        ]
+        changed = batch.take(rows) if len(rows) < len(batch) else batch
+        entries = {
+            paper_id: (date, hashes[paper_id])
+            for paper_id, date in zip(changed.ids, changed.dates)
+        }
+        return changed, entries
+
+    def record(self, entries: Dict[str, Tuple[str, int]]) -> None:
+        """Mark papers as ingested once they are stored"""
+        if not entries:
+            return
+
+        try:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO papers (id, update_date, content_hash) "
+                "VALUES (?, ?, ?)",
+                [(paper_id, date, h) for paper_id, (date, h) in entries.items()],
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error updating delta index: {e}")
@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+import logging.config
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from config import (
+    LOG_CONFIG,
+    DOWNLOAD_CHUNK_BYTES,
+    DOWNLOAD_WORKERS,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_BACKOFF,
+    DOWNLOAD_MAX_BACKOFF,
+    DOWNLOAD_TIMEOUT,
+)
+
+logging.config.dictConfig(LOG_CONFIG)
+
+
+def _object_md5(headers) -> Optional[str]:
+    """Hex MD5 of the whole remote object, if the server reports one.
+
+    Only x-goog-hash (Google Cloud Storage, where Kaggle downloads are served
+    from) describes the whole object on a range response; Content-MD5 would
+    describe just the returned range.
+    """
+    for part in headers.get("x-goog-hash", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "md5" and value:
+            return base64.b64decode(value).hex()
+    return None
+
+
+class ChunkedDownloader:
+    """Downloads one file in parallel HTTP range requests, resumably.
+
+    The file is written into <dest>.part, chunk_bytes at a time. A chunk
+    counts as downloaded once the server answered with exactly the range
+    asked for and all of its bytes are on disk; its blake2b then goes into
+    <dest>.manifest.json. A later run against the same remote file (same
+    size, ETag and Last-Modified) re-hashes the chunks the manifest lists
+    and only fetches the rest. If the server reports the object's MD5, the
+    finished file is checked against it before it replaces dest.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        dest: str,
+        chunk_bytes: int = DOWNLOAD_CHUNK_BYTES,
+        workers: int = DOWNLOAD_WORKERS,
+        retries: int = DOWNLOAD_RETRIES,
+        backoff: float = DOWNLOAD_BACKOFF,
+        max_backoff: float = DOWNLOAD_MAX_BACKOFF,
+        timeout: float = DOWNLOAD_TIMEOUT,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.url = url
+        self.dest = dest
+        self.part_path = f"{dest}.part"
+        self.manifest_path = f"{dest}.manifest.json"
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.manifest: dict = {}
+        self.lock = threading.Lock()
+        # requests sessions aren't thread-safe; one per download thread
+        self.local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def probe(self) -> Optional[dict]:
+        """Size and validators of the remote file; None without range support"""
+        try:
+            with self._session().get(
+                self.url,
+                headers={"Range": "bytes=0-0"},
+                stream=True,
+                timeout=self.timeout,
+            ) as response:
+                response.raise_for_status()
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                if response.status_code != 206 or not total.isdigit():
+                    self.logger.warning(
+                        f"Range request answered with {response.status_code}; "
+                        "the server does not serve byte ranges"
+                    )
+                    return None
+                return {
+                    "size": int(total),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "md5": _object_md5(response.headers),
+                }
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Error probing {self.dest} download: {e}")
+            return None
+
+    def _hash_range(self, start: int, end: int) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(self.part_path, "rb") as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                block = f.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+        return digest.hexdigest()
+
+    def _save_manifest(self) -> None:
+        tmp_file = f"{self.manifest_path}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_file, self.manifest_path)
+
+    def _resume(
+        self, remote: dict, chunks: List[Tuple[int, int, int]]
+    ) -> Dict[str, str]:
+        """Chunks of an earlier attempt that are still good, by index"""
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        same_file = all(
+            manifest.get(k) == remote[k] for k in ("size", "etag", "last_modified")
+        )
+        if (
+            not same_file
+            or manifest.get("chunk_bytes") != self.chunk_bytes
+            or not os.path.exists(self.part_path)
+            or os.path.getsize(self.part_path) != remote["size"]
+        ):
+            self.logger.info("No usable partial download; starting from scratch")
+            return {}
+
+        done = {}
+        for index, start, end in chunks:
+            expected = manifest["chunks"].get(str(index))
+            if expected is None:
+                continue
+            if self._hash_range(start, end) == expected:
+                done[str(index)] = expected
+            else:
+                self.logger.warning(f"Chunk {index} on disk is corrupt; fetching again")
+        return done
+
+    def _fetch_chunk(self, index: int, start: int, end: int) -> str:
+        """Download [start, end) into the part file and return its hash"""
+        headers = {"Range": f"bytes={start}-{end - 1}"}
+        # A changed remote file then comes back whole (200) instead of mixing in;
+        # If-Range only takes a strong ETag
+        validator = self.manifest["etag"]
+        if not validator or validator.startswith("W/"):
+            validator = self.manifest["last_modified"]
+        if validator:
+            headers["If-Range"] = validator
+
+        with self._session().get(
+            self.url, headers=headers, stream=True, timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            content_range = response.headers.get("Content-Range", "")
+            if response.status_code != 206 or not content_range.startswith(
+                f"bytes {start}-{end - 1}/"
+            ):
+                raise ValueError(
+                    f"expected bytes {start}-{end - 1}, got status "
+                    f"{response.status_code} ({content_range or 'no Content-Range'})"
+                )
+
+            digest = hashlib.blake2b(digest_size=16)
+            offset = start
+            fd = os.open(self.part_path, os.O_WRONLY)
+            try:
+                for block in response.iter_content(chunk_size=1 << 20):
+                    if offset + len(block) > end:
+                        raise ValueError(f"server sent more than {end - start} bytes")
+                    os.pwrite(fd, block, offset)
+                    digest.update(block)
+                    offset += len(block)
+                if offset != end:
+                    raise ValueError(
+                        f"connection closed after {offset - start} "
+                        f"of {end - start} bytes"
+                    )
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        return digest.hexdigest()
+
+    def _download_chunk(self, index: int, start: int, end: int) -> str:
+        for attempt in range(self.retries):
+            if attempt:
+                delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+                time.sleep(delay)
+            try:
+                return self._fetch_chunk(index, start, end)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.logger.warning(
+                    f"Chunk {index} attempt {attempt + 1}/{self.retries} failed: {e}"
+                )
+        raise RuntimeError(f"gave up after {self.retries} attempts")
+
+    def _file_md5(self) -> str:
+        digest = hashlib.md5()
+        with open(self.part_path, "rb") as f:
+            while block := f.read(1 << 24):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def run(self, remote: Optional[dict] = None) -> bool:
+        """Download (or finish downloading) the file; True once dest is complete"""
+        start_time = time.perf_counter()
+        remote = remote or self.probe()
+        if remote is None:
+            return False
+
+        size = remote["size"]
+        chunks = [
+            (index, start, min(start + self.chunk_bytes, size))
+            for index, start in enumerate(range(0, size, self.chunk_bytes))
+        ]
+        done = self._resume(remote, chunks)
+        if done:
+            self.logger.info(
+                f"Resuming download: {len(done)} of {len(chunks)} chunks on disk"
+            )
+        else:
+            os.makedirs(os.path.dirname(self.dest) or ".", exist_ok=True)
+            with open(self.part_path, "wb") as f:
+                f.truncate(size)
+
+        self.manifest = {
+            "size": size,
+            "etag": remote["etag"],
+            "last_modified": remote["last_modified"],
+            "chunk_bytes": self.chunk_bytes,
+            "chunks": done,
+        }
+        self._save_manifest()
+
+        pending = [chunk for chunk in chunks if str(chunk[0]) not in done]
+        self.logger.info(
+            f"Downloading {len(pending)} chunks ({size / 1e6:.1f} MB total) "
+            f"with {self.workers} workers"
+        )
+        failed = 0
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="download"
+        ) as pool:
+            futures = {
+                pool.submit(self._download_chunk, *chunk): chunk for chunk in pending
+            }
+            for future in as_completed(futures):
+                index = futures[future][0]
+                try:
+                    digest = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.logger.error(f"Error downloading chunk {index}: {e}")
+                    continue
+                with self.lock:
+                    self.manifest["chunks"][str(index)] = digest
+                    self._save_manifest()
+                    completed = len(self.manifest["chunks"])
+                self.logger.info(f"Chunk {index} done ({completed}/{len(chunks)})")
+
+        if failed:
+            self.logger.error(
+                f"{failed} chunks failed; the next run resumes from "
+                f"{len(chunks) - failed} of {len(chunks)}"
+            )
+            return False
+
+        if remote["md5"] and self._file_md5() != remote["md5"]:
+            self.logger.error(
+                "Downloaded file does not match the server's MD5; discarding it"
+            )
+            os.remove(self.part_path)
+            os.remove(self.manifest_path)
+            return False
+
+        os.replace(self.part_path, self.dest)
+        os.remove(self.manifest_path)
+        elapsed = time.perf_counter() - start_time
+        self.logger.info(
+            f"Downloaded {self.dest} in {elapsed:.2f}s "
+            f"({size / 1e6 / max(elapsed, 1e-9):.1f} MB/s)"
+        )
+        return True
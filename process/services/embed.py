@@ -1,159 +1,389 @@
+import json
+import time
+import threading
 import logging.config
 import asyncio
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 from light_embed import TextEmbedding
+from tokenizers import Tokenizer
 
-from models import ExtractedPaper, StoredPaper
-from config import LOG_CONFIG, EMB_MODEL
+from config import (
+    LOG_CONFIG,
+    EMB_MODEL,
+    EMB_MODEL_VARIANT,
+    EMB_MODEL_VARIANTS,
+    EMB_GATE_FILE,
+    EMB_INFERENCE_BATCH_SIZE,
+    EMB_MAX_SEQ_LENGTH,
+    EMB_WORKERS,
+    EMB_TIMEOUT,
+    EMB_CACHE_ENABLED,
+    EMB_CACHE_DIR,
+    EMB_CACHE_MAX_BYTES,
+    EMB_CACHE_DTYPE,
+    VECTOR_SIZE,
+)
+from services.batch import PaperBatch
+from services.cache import EmbeddingCache
+from services.metrics import (
+    BATCH_SIZES,
+    CACHE_LOOKUPS,
+    INFERENCE_TOKENS,
+    STAGE_ERRORS,
+    STAGE_IN_FLIGHT,
+    STAGE_PAPERS,
+    STAGE_SECONDS,
+)
+from services.tuning import current_rss_bytes
 
 logging.config.dictConfig(LOG_CONFIG)
+logger = logging.getLogger(__name__)
 
 
-class Embedder:
+def read_gate(gate_file: str = EMB_GATE_FILE) -> Optional[dict]:
+    try:
+        with open(gate_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def gate_passed(variant: str) -> bool:
+    """True if the accuracy gate passed for exactly this model and variant"""
+    gate = read_gate()
+    return bool(
+        gate
+        and gate.get("passed")
+        and gate.get("model") == EMB_MODEL
+        and gate.get("variant") == variant
+        and gate.get("model_config") == EMB_MODEL_VARIANTS.get(variant)
+    )
+
+
+def resolve_variant(variant: str = EMB_MODEL_VARIANT) -> str:
+    """The variant to load: fp32 unless a quantized one has passed the gate"""
+    if variant == "fp32":
+        return variant
+    if variant not in EMB_MODEL_VARIANTS:
+        logger.error(f"Unknown embedding model variant '{variant}'; using fp32")
+        return "fp32"
+    if not gate_passed(variant):
+        logger.error(
+            f"Embedding model variant '{variant}' has not passed the accuracy "
+            f"gate ({EMB_GATE_FILE}); using fp32"
+        )
+        return "fp32"
+    return variant
+
+
+def load_text_embedding(variant: str) -> TextEmbedding:
+    model_config = EMB_MODEL_VARIANTS[variant]
+    if model_config is None:
+        return TextEmbedding(EMB_MODEL)
+    # TextEmbedding writes into the config it is given
+    return TextEmbedding(EMB_MODEL, model_config=dict(model_config))
+
+
+class ModelRegistry:
+    """Loads each embedding model variant once per process, on first use.
+
+    Every service asks the registry instead of loading its own copy. Loading
+    is serialized by a lock, so concurrent first callers (e.g. executor
+    threads) wait for one load. Load time and RSS growth are logged and kept.
+    """
+
     def __init__(self):
-        self.embedder = TextEmbedding(EMB_MODEL)
         self.logger = logging.getLogger(__name__)
-        self.semaphore = asyncio.Semaphore(5)
+        self.lock = threading.Lock()
+        self.models: Dict[str, TextEmbedding] = {}
+        self.load_stats: Dict[str, dict] = {}
+
+    def get(self, variant: str) -> TextEmbedding:
+        model = self.models.get(variant)
+        if model is not None:
+            return model
+
+        with self.lock:
+            if variant not in self.models:
+                rss_before = current_rss_bytes()
+                start = time.perf_counter()
+                self.models[variant] = load_text_embedding(variant)
+                stats = {
+                    "load_seconds": round(time.perf_counter() - start, 3),
+                    "rss_delta_bytes": current_rss_bytes() - rss_before,
+                }
+                self.load_stats[variant] = stats
+                self.logger.info(
+                    f"Loaded {EMB_MODEL} ({variant}) in {stats['load_seconds']:.2f}s, "
+                    f"RSS +{stats['rss_delta_bytes'] / 1024**2:.0f} MiB"
+                )
+        return self.models[variant]
+
+    def stats(self) -> Dict[str, dict]:
+        return dict(self.load_stats)
+
+
+MODELS = ModelRegistry()
+
+
+def model_key(variant: str) -> str:
+    """Identifies the vectors a variant produces, for caches and shard manifests"""
+    return EMB_MODEL if variant == "fp32" else f"{EMB_MODEL}@{variant}"
+
+
+class TokenTruncator:
+    """Cuts texts to the tokens the model actually sees and counts them.
+
+    Uses a copy of the model's own tokenizer without padding. Models without
+    a tokenizer (e.g. a benchmark stub) fall back to a character cut, with
+    characters standing in for tokens.
+    """
+
+    def __init__(self, model, max_length: int = EMB_MAX_SEQ_LENGTH):
+        model_max_length = getattr(model, "max_seq_length", None)
+        self.max_length = min(max_length, model_max_length or max_length)
+        self.tokenizer = None
+
+        tokenizer = getattr(getattr(model, "tokenizer", None), "tokenizer", None)
+        if isinstance(tokenizer, Tokenizer):
+            self.tokenizer = Tokenizer.from_str(tokenizer.to_str())
+            self.tokenizer.no_padding()
+            self.tokenizer.enable_truncation(self.max_length)
+
+    def __call__(self, texts: List[str]) -> Tuple[List[str], List[int]]:
+        if self.tokenizer is None:
+            texts = [text[:1500] for text in texts]
+            return texts, [len(text) for text in texts]
+
+        truncated = []
+        encodings = self.tokenizer.encode_batch(texts)
+        for text, encoding in zip(texts, encodings):
+            if encoding.overflowing:
+                # Special tokens have empty (0, 0) offsets
+                text = text[: max(end for _, end in encoding.offsets)]
+            truncated.append(text)
+        return truncated, [len(encoding.ids) for encoding in encodings]
+
+
+class Embedder:
+    def __init__(
+        self,
+        model=None,
+        variant: str = EMB_MODEL_VARIANT,
+        cache_dir: str = EMB_CACHE_DIR,
+    ):
+        self.logger = logging.getLogger(__name__)
+        # Anything with an encode(texts) method, e.g. a stub for benchmarks;
+        # otherwise the registry loads the model when it is first needed
+        self.model = model
+        self.variant = "fp32" if model is not None else resolve_variant(variant)
+        self.model_key = model_key(self.variant)
+        self._truncator: Optional[TokenTruncator] = None
+        self.inference_batch_size = EMB_INFERENCE_BATCH_SIZE
+        self.executor = ThreadPoolExecutor(
+            max_workers=EMB_WORKERS, thread_name_prefix="embed"
+        )
+        self.semaphore = asyncio.Semaphore(EMB_WORKERS)
+        self.cache = None
+        if EMB_CACHE_ENABLED:
+            self.cache = EmbeddingCache(
+                cache_dir,
+                model_name=self.model_key,
+                dim=VECTOR_SIZE,
+                max_bytes=EMB_CACHE_MAX_BYTES,
+                dtype=EMB_CACHE_DTYPE,
+            )
+
+    @property
+    def embedder(self):
+        if self.model is None:
+            self.model = MODELS.get(self.variant)
+        return self.model
+
+    @property
+    def truncator(self) -> TokenTruncator:
+        if self._truncator is None:
+            self._truncator = TokenTruncator(self.embedder)
+        return self._truncator
+
+    def _truncate(self, batch: PaperBatch) -> Tuple[List[str], List[int]]:
+        # Runs on the executor: the first call also loads the model
+        return self.truncator(batch.texts())
+
+    def close(self) -> None:
+        """Shut down the inference executor and flush the embedding cache"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.cache:
+            self.cache.close()
+
+    async def _encode(self, texts: List[str]):
+        """Run one model call for a list of texts on the inference executor"""
+        loop = asyncio.get_running_loop()
+        BATCH_SIZES.observe(len(texts), stage="inference")
+        STAGE_IN_FLIGHT.inc(stage="inference")
+        try:
+            with STAGE_SECONDS.time(stage="inference"):
+                embedding_future = loop.run_in_executor(
+                    self.executor, self.embedder.encode, texts
+                )
+                embeddings = await asyncio.wait_for(
+                    embedding_future, timeout=EMB_TIMEOUT
+                )
+            STAGE_PAPERS.inc(len(texts), stage="inference")
+            return embeddings
+        except Exception:
+            STAGE_ERRORS.inc(stage="inference")
+            raise
+        finally:
+            STAGE_IN_FLIGHT.dec(stage="inference")
+
+    async def _encode_texts(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Embed texts in one model call, falling back to one call per text on failure"""
+        async with self.semaphore:
+            try:
+                embeddings = await self._encode(texts)
+                if embeddings is None or len(embeddings) != len(texts):
+                    raise ValueError(
+                        f"expected {len(texts)} embeddings, "
+                        f"got {0 if embeddings is None else len(embeddings)}"
+                    )
+                return list(embeddings)
+            except Exception as batch_error:
+                self.logger.warning(
+                    f"Batched inference failed for {len(texts)} texts "
+                    f"({batch_error!r}); retrying one text at a time"
+                )
+
+            embeddings = []
+            for text in texts:
+                try:
+                    embeddings.append((await self._encode([text]))[0])
+                except Exception as item_error:
+                    self.logger.error(f"Error embedding text: {item_error}")
+                    embeddings.append(None)
+            return embeddings
 
     async def _process_sub_batch(
-        self, sub_batch: List[ExtractedPaper]
-    ) -> List[StoredPaper]:
-        """Process a sub-batch of papers to avoid rate limits"""
-        if not sub_batch:
-            return []
+        self, paper_texts: List[str], lengths: List[int]
+    ) -> np.ndarray:
+        """Embed a sub-batch of texts, consulting the cache before inference.
+
+        Returns one row per text; rows that could not be embedded are zeros.
+        """
+        vectors = np.zeros((len(paper_texts), VECTOR_SIZE), dtype=np.float32)
+        if not paper_texts:
+            return vectors
 
         try:
-            valid_papers = []
-            paper_texts = []
+            if self.cache:
+                embeddings = self.cache.get_many(paper_texts)
+            else:
+                embeddings = [None] * len(paper_texts)
 
-            for paper in sub_batch:
-                combined_text = f"{paper.title} {paper.abstract}".strip()
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            if self.cache:
+                CACHE_LOOKUPS.inc(len(embeddings) - len(missing), result="hit")
+                CACHE_LOOKUPS.inc(len(missing), result="miss")
+            if missing:
+                if self.truncator.tokenizer is not None:
+                    longest = max(lengths[i] for i in missing)
+                    real = sum(lengths[i] for i in missing)
+                    INFERENCE_TOKENS.inc(real, kind="real")
+                    INFERENCE_TOKENS.inc(longest * len(missing) - real, kind="padding")
+                computed = await self._encode_texts([paper_texts[i] for i in missing])
+                for i, embedding in zip(missing, computed):
+                    embeddings[i] = embedding
 
-                if not combined_text:
-                    self.logger.warning(
-                        f"Skipping paper {paper.id} with empty title and abstract"
+                if self.cache:
+                    fresh = [
+                        i
+                        for i in missing
+                        if embeddings[i] is not None and len(embeddings[i]) > 0
+                    ]
+                    self.cache.put_many(
+                        [paper_texts[i] for i in fresh], [embeddings[i] for i in fresh]
                     )
-                    continue
 
-                if len(combined_text) > 1500:
-                    combined_text = combined_text[:1500]
-                    self.logger.warning(f"Truncated long text for paper {paper.id}")
-
-                valid_papers.append(paper)
-                paper_texts.append(combined_text)
-
-            if not valid_papers:
-                self.logger.warning("No valid papers to embed in sub-batch")
-                return []
-
-            async with self.semaphore:
-                loop = asyncio.get_event_loop()
-                papers_to_store = []
-
-                for i, paper in enumerate(valid_papers):
-                    try:
-                        combined_text = paper_texts[i]
-
-                        embedding_future = loop.run_in_executor(
-                            None,  # Use default executor
-                            lambda text=combined_text: self.embedder.encode([text])[0],
-                        )
-
-                        embedding = await asyncio.wait_for(
-                            embedding_future, timeout=10.0
-                        )
-
-                        if embedding is None or len(embedding) == 0:
-                            self.logger.warning(
-                                f"Empty embedding for paper {paper.id}, skipping"
-                            )
-                            continue
-
-                        papers_to_store.append(
-                            StoredPaper(
-                                paper_id=paper.id,
-                                embedding=embedding,
-                                categories=paper.categories,
-                                authors=paper.authors,
-                                title=paper.title,
-                                date_updated=paper.date_updated,
-                            )
-                        )
-                    except Exception as item_error:
-                        self.logger.error(
-                            f"Error processing paper {paper.id}: {item_error}"
-                        )
-                        continue
+            embedded = 0
+            for i, embedding in enumerate(embeddings):
+                if embedding is None or len(embedding) == 0:
+                    continue
+                try:
+                    vectors[i] = embedding
+                    embedded += 1
+                except ValueError as item_error:
+                    self.logger.error(f"Unusable embedding: {item_error}")
 
-                self.logger.info(
-                    f"Successfully embedded {len(papers_to_store)} out of {len(valid_papers)} papers"
-                )
-                return papers_to_store
+            self.logger.info(
+                f"Successfully embedded {embedded} out of {len(paper_texts)} papers "
+                f"({len(paper_texts) - len(missing)} from cache)"
+            )
+            return vectors
         except Exception as e:
             self.logger.error(f"Error embedding sub-batch: {e}")
-            return []
+            return vectors
 
-    async def embed_batch(self, batch: List[ExtractedPaper]) -> List[StoredPaper]:
+    async def embed_batch(self, batch: PaperBatch) -> PaperBatch:
+        """Embed the batch; papers that could not be embedded are left out"""
         if not batch:
             self.logger.warning("Received empty batch for embedding")
-            return []
+            return batch.with_embeddings(np.empty((0, VECTOR_SIZE), dtype=np.float32))
 
+        BATCH_SIZES.observe(len(batch), stage="embed")
+        STAGE_IN_FLIGHT.inc(stage="embed")
         try:
-            valid_batch = []
-            for paper in batch:
-                if not paper.id:
-                    self.logger.warning("Skipping paper with missing ID")
-                    continue
-                if not (paper.title or paper.abstract):
-                    self.logger.warning(
-                        f"Skipping paper {paper.id} with missing both title and abstract"
-                    )
-                    continue
-                valid_batch.append(paper)
+            with STAGE_SECONDS.time(stage="embed"):
+                embedded = await self._embed_valid(batch)
+            STAGE_PAPERS.inc(len(embedded), stage="embed")
+            return embedded
+        finally:
+            STAGE_IN_FLIGHT.dec(stage="embed")
 
-            if not valid_batch:
-                self.logger.warning("No valid papers in batch after validation")
-                return []
+    async def _embed_valid(self, batch: PaperBatch) -> PaperBatch:
+        embeddings = np.zeros((len(batch), VECTOR_SIZE), dtype=np.float32)
+        try:
+            loop = asyncio.get_running_loop()
+            texts, lengths = await loop.run_in_executor(
+                self.executor, self._truncate, batch
+            )
 
-            sub_batch_size = 50
+            # Sub-batches of similar token length, so short texts aren't padded
+            # out to the longest abstract; rows are written back in paper order
+            by_length = sorted(range(len(batch)), key=lengths.__getitem__)
+            sub_batch_size = self.inference_batch_size
             sub_batches = [
-                valid_batch[i : i + sub_batch_size]
-                for i in range(0, len(valid_batch), sub_batch_size)
+                by_length[i : i + sub_batch_size]
+                for i in range(0, len(by_length), sub_batch_size)
             ]
 
             self.logger.info(f"Processing {len(sub_batches)} sub-batches of papers")
-            tasks = [self._process_sub_batch(sub_batch) for sub_batch in sub_batches]
-
-            try:
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                papers_to_store = []
-                for i, result in enumerate(results):
-                    if isinstance(result, Exception):
-                        self.logger.error(f"Sub-batch {i} failed: {str(result)}")
-                    else:
-                        papers_to_store.extend(result)
-
-                success_rate = (
-                    len(papers_to_store) / len(valid_batch) if valid_batch else 0
-                )
-                self.logger.info(
-                    f"Embedded {len(papers_to_store)} out of {len(valid_batch)} papers "
-                    f"({success_rate:.1%} success rate)"
-                )
-                return papers_to_store
-            except Exception as gather_error:
-                self.logger.error(f"Error gathering embedding results: {gather_error}")
-                papers_to_store = []
-                for i, task in enumerate(tasks):
-                    try:
-                        if task.done() and not task.exception():
-                            papers_to_store.extend(task.result())
-                    except Exception:
-                        pass
-
-                self.logger.info(f"Salvaged {len(papers_to_store)} papers after error")
-                return papers_to_store
+            results = await asyncio.gather(
+                *(
+                    self._process_sub_batch(
+                        [texts[i] for i in indices], [lengths[i] for i in indices]
+                    )
+                    for indices in sub_batches
+                ),
+                return_exceptions=True,
+            )
+            for i, (indices, result) in enumerate(zip(sub_batches, results)):
+                if isinstance(result, Exception):
+                    STAGE_ERRORS.inc(stage="embed")
+                    self.logger.error(f"Sub-batch {i} failed: {str(result)}")
+                else:
+                    embeddings[indices] = result
         except Exception as e:
+            STAGE_ERRORS.inc(stage="embed")
             self.logger.error(f"Error in batch embedding process: {e}")
-            return []
+
+        # Rows left as zeros failed to embed; validated() drops them
+        embedded = batch.with_embeddings(embeddings).validated()
+        success_rate = len(embedded) / len(batch)
+        self.logger.info(
+            f"Embedded {len(embedded)} out of {len(batch)} papers "
+            f"({success_rate:.1%} success rate)"
+        )
+        return embedded
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import logging.config
+from typing import List
+
+import numpy as np
+
+from config import (
+    LOG_CONFIG,
+    EMB_MODEL,
+    EMB_MODEL_VARIANTS,
+    EMB_GATE_FILE,
+    EMB_GATE_TOP_K,
+    EMB_GATE_MIN_COSINE,
+    EMB_GATE_MIN_OVERLAP,
+)
+from services.batch import PaperBatch
+from services.embed import MODELS, TokenTruncator
+
+logging.config.dictConfig(LOG_CONFIG)
+
+
+def _normalized(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def _overlap(expected: np.ndarray, actual: np.ndarray) -> float:
+    k = expected.shape[1]
+    return float(
+        np.mean([len(set(e) & set(a)) / k for e, a in zip(expected, actual)])
+    )
+
+
+class AccuracyGate:
+    """Checks a quantized model variant against fp32 on a sample of papers.
+
+    Papers are embedded the way ingestion embeds them and titles serve as
+    queries. The variant passes if its paper embeddings agree with fp32 by
+    cosine similarity and if its top-k neighbours match fp32's: when the
+    whole collection uses the variant, and in both mixes seen while moving
+    over to it, variant queries against fp32 documents and fp32 queries
+    against variant documents.
+    """
+
+    def __init__(self, variant: str, top_k: int = EMB_GATE_TOP_K):
+        self.logger = logging.getLogger(__name__)
+        if variant not in EMB_MODEL_VARIANTS or variant == "fp32":
+            raise ValueError(f"'{variant}' is not a quantized variant of {EMB_MODEL}")
+        self.variant = variant
+        self.top_k = top_k
+
+    def _encode(self, model, texts: List[str]) -> np.ndarray:
+        start = time.perf_counter()
+        vectors = _normalized(model.encode(texts))
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"Encoded {len(texts)} texts in {elapsed:.2f}s")
+        return vectors
+
+    def measure(self, papers: PaperBatch, queries: int) -> dict:
+        documents = papers.texts()
+        titles = papers.titles[:queries]
+        k = min(self.top_k, len(documents))
+
+        results = {}
+        timings = {}
+        for name in ("fp32", self.variant):
+            model = MODELS.get(name)
+            truncated, _ = TokenTruncator(model)(documents)
+            start = time.perf_counter()
+            results[name] = (
+                self._encode(model, truncated),
+                self._encode(model, titles),
+            )
+            timings[name] = time.perf_counter() - start
+
+        reference_docs, reference_queries = results["fp32"]
+        candidate_docs, candidate_queries = results[self.variant]
+
+        cosine = np.sum(reference_docs * candidate_docs, axis=1)
+        expected = _top_k(reference_queries, reference_docs, k)
+
+        return {
+            "papers": len(documents),
+            "queries": len(titles),
+            "top_k": k,
+            "cosine_mean": float(cosine.mean()),
+            "cosine_min": float(cosine.min()),
+            "cosine_p01": float(np.percentile(cosine, 1)),
+            "overlap": _overlap(
+                expected, _top_k(candidate_queries, candidate_docs, k)
+            ),
+            "overlap_mixed": _overlap(
+                expected, _top_k(candidate_queries, reference_docs, k)
+            ),
+            "overlap_mixed_docs": _overlap(
+                expected, _top_k(reference_queries, candidate_docs, k)
+            ),
+            "seconds": timings,
+        }
+
+    def evaluate(self, metrics: dict) -> bool:
+        return (
+            metrics["cosine_mean"] >= EMB_GATE_MIN_COSINE
+            and metrics["overlap"] >= EMB_GATE_MIN_OVERLAP
+            and metrics["overlap_mixed"] >= EMB_GATE_MIN_OVERLAP
+            and metrics["overlap_mixed_docs"] >= EMB_GATE_MIN_OVERLAP
+        )
+
+    def run(self, papers: PaperBatch, queries: int) -> dict:
+        """Measure, decide and record the result in EMB_GATE_FILE"""
+        metrics = self.measure(papers, queries)
+        passed = self.evaluate(metrics)
+        gate = {
+            "model": EMB_MODEL,
+            "variant": self.variant,
+            "model_config": EMB_MODEL_VARIANTS[self.variant],
+            "passed": passed,
+            "thresholds": {
+                "cosine_mean": EMB_GATE_MIN_COSINE,
+                "overlap": EMB_GATE_MIN_OVERLAP,
+            },
+            "metrics": metrics,
+            "checked_at": time.time(),
+        }
+
+        os.makedirs(os.path.dirname(EMB_GATE_FILE) or ".", exist_ok=True)
+        tmp_file = f"{EMB_GATE_FILE}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(gate, f, indent=2)
+        os.replace(tmp_file, EMB_GATE_FILE)
+
+        verdict = "PASSED" if passed else "FAILED"
+        self.logger.info(
+            f"Accuracy gate for {self.variant}: {verdict} | "
+            f"cosine mean {metrics['cosine_mean']:.4f} "
+            f"(min {metrics['cosine_min']:.4f}) | "
+            f"top-{metrics['top_k']} overlap {metrics['overlap']:.3f}, "
+            f"mixed {metrics['overlap_mixed']:.3f} / "
+            f"{metrics['overlap_mixed_docs']:.3f} | "
+            f"fp32 {metrics['seconds']['fp32']:.1f}s vs "
+            f"{self.variant} {metrics['seconds'][self.variant]:.1f}s"
+        )
+        return gate
@@ -0,0 +1,129 @@
+import time
+import asyncio
+import logging.config
+from typing import Optional
+
+from qdrant_client import AsyncQdrantClient
+
+from config import LOG_CONFIG
+
+logging.config.dictConfig(LOG_CONFIG)
+
+
+class CircuitBreaker:
+    """Fails fast while Qdrant is down instead of letting every call time out.
+
+    Opens after `failure_threshold` consecutive failures. Once `reset_timeout`
+    seconds have passed it half-opens and lets one trial call through; that
+    call's outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.logger = logging.getLogger(__name__)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+        # Half-open: a trial call is already in flight
+        return False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            self.logger.info("Qdrant circuit closed")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.logger.warning(
+                    f"Qdrant circuit opened after {self.failures} failures"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class HealthMonitor:
+    """Background task tracking Qdrant reachability and round-trip latency"""
+
+    def __init__(
+        self,
+        client: AsyncQdrantClient,
+        breaker: CircuitBreaker,
+        interval: float,
+        timeout: float,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.client = client
+        self.breaker = breaker
+        self.interval = interval
+        self.timeout = timeout
+        self.is_healthy = False
+        self.latency_ms: Optional[float] = None
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def check(self) -> bool:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.client.get_collections(), timeout=self.timeout)
+            self.latency_ms = (time.perf_counter() - start) * 1000
+            self.last_error = None
+            if not self.is_healthy:
+                self.logger.info(f"Qdrant reachable ({self.latency_ms:.1f} ms)")
+            self.is_healthy = True
+            self.breaker.record_success()
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            if self.is_healthy or self.last_checked is None:
+                self.logger.warning(f"Qdrant not reachable: {self.last_error}")
+            self.is_healthy = False
+            self.breaker.record_failure()
+        finally:
+            self.last_checked = time.time()
+        return self.is_healthy
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    async def start(self) -> None:
+        """Probe once, then keep probing in the background"""
+        if self.task is None:
+            await self.check()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def status(self) -> dict:
+        return {
+            "healthy": self.is_healthy,
+            "latency_ms": self.latency_ms,
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+            "circuit": self.breaker.state,
+        }
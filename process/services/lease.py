@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import logging.config
+from typing import Dict, List, Optional, Tuple
+
+from config import LOG_CONFIG, DIST_LEASE_TTL
+
+logging.config.dictConfig(LOG_CONFIG)
+
+PLAN_FILE = "units.json"
+LEASES_DIR = "leases"
+DONE_DIR = "done"
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp_file = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_file, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_file, path)
+
+
+class LeaseQueue:
+    """Work units in a shared directory, claimed through lease files.
+
+    The coordinator writes the plan (units.json). A worker claims a unit by
+    creating leases/<unit>.lease exclusively and keeps it alive by touching
+    it; a lease not touched for ttl seconds is abandoned and may be taken
+    over. A finished unit gets done/<unit>.json. Only atomic exclusive create
+    and rename are needed, so any shared filesystem (NFS included) will do.
+
+    Keep ttl well above the heartbeat interval plus clock skew between nodes.
+    A stalled worker can lose its lease and still finish the unit; that is
+    harmless because upserts are keyed by paper id.
+    """
+
+    def __init__(self, directory: str, worker_id: str, ttl: float = DIST_LEASE_TTL):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.leases_dir = os.path.join(directory, LEASES_DIR)
+        self.done_dir = os.path.join(directory, DONE_DIR)
+
+    def _lease_path(self, unit_id: str) -> str:
+        return os.path.join(self.leases_dir, f"{unit_id}.lease")
+
+    def _done_path(self, unit_id: str) -> str:
+        return os.path.join(self.done_dir, f"{unit_id}.json")
+
+    def plan(self, ranges: List[Tuple[int, int]], fingerprint: dict) -> dict:
+        """Write the unit plan, keeping an existing one for the same snapshot"""
+        os.makedirs(self.leases_dir, exist_ok=True)
+        os.makedirs(self.done_dir, exist_ok=True)
+
+        existing = self.load_plan()
+        if existing and existing.get("fingerprint") == fingerprint:
+            self.logger.info(
+                f"Resuming plan of {len(existing['units'])} units in {self.directory}"
+            )
+            return existing
+
+        if existing:
+            self.logger.info("Snapshot changed; discarding the previous plan")
+            for name in os.listdir(self.done_dir):
+                os.remove(os.path.join(self.done_dir, name))
+
+        plan = {
+            "fingerprint": fingerprint,
+            "units": [
+                {"id": f"{index:05d}", "start": start, "end": end}
+                for index, (start, end) in enumerate(ranges)
+            ],
+            "created_at": time.time(),
+        }
+        _write_json(os.path.join(self.directory, PLAN_FILE), plan)
+        self.logger.info(f"Planned {len(ranges)} units in {self.directory}")
+        return plan
+
+    def load_plan(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.directory, PLAN_FILE), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.error(f"Error reading unit plan: {e}")
+            return None
+
+    def _owner(self, unit_id: str) -> Optional[str]:
+        try:
+            with open(self._lease_path(unit_id), "r") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _try_create(self, unit_id: str) -> bool:
+        try:
+            fd = os.open(
+                self._lease_path(unit_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY
+            )
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(self.worker_id)
+        return True
+
+    def _try_steal(self, unit_id: str) -> bool:
+        """Take over a lease whose holder stopped heartbeating"""
+        lease_path = self._lease_path(unit_id)
+        try:
+            age = time.time() - os.path.getmtime(lease_path)
+        except FileNotFoundError:
+            return self._try_create(unit_id)
+        if age < self.ttl:
+            return False
+
+        # Renaming is atomic, so only one of several contenders gets the file
+        stale_path = f"{lease_path}.stale-{self.worker_id}"
+        try:
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            return False
+        if time.time() - os.path.getmtime(stale_path) < self.ttl:
+            # Another contender re-leased it in between; hand the fresh lease back
+            try:
+                os.link(stale_path, lease_path)
+            except FileExistsError:
+                pass
+            os.remove(stale_path)
+            return False
+        os.remove(stale_path)
+        self.logger.warning(f"Lease on unit {unit_id} expired {age:.0f}s ago")
+        return self._try_create(unit_id)
+
+    def claim(self) -> Optional[dict]:
+        """Lease the first unit that is neither done nor held by a live worker"""
+        plan = self.load_plan()
+        if not plan:
+            return None
+
+        for unit in plan["units"]:
+            unit_id = unit["id"]
+            if os.path.exists(self._done_path(unit_id)):
+                continue
+            try:
+                if self._try_create(unit_id) or self._try_steal(unit_id):
+                    # The unit may have finished between the check and the claim
+                    if os.path.exists(self._done_path(unit_id)):
+                        self.release(unit_id)
+                        continue
+                    self.logger.info(
+                        f"Claimed unit {unit_id} "
+                        f"(bytes {unit['start']}-{unit['end']})"
+                    )
+                    return unit
+            except OSError as e:
+                self.logger.error(f"Error claiming unit {unit_id}: {e}")
+        return None
+
+    def heartbeat(self, unit_id: str) -> bool:
+        """Extend the lease; False if it was lost to another worker"""
+        try:
+            if self._owner(unit_id) != self.worker_id:
+                self.logger.warning(f"Lost the lease on unit {unit_id}")
+                return False
+            os.utime(self._lease_path(unit_id))
+            return True
+        except OSError as e:
+            self.logger.error(f"Error renewing lease on unit {unit_id}: {e}")
+            return False
+
+    def complete(self, unit_id: str, stats: Dict) -> None:
+        _write_json(
+            self._done_path(unit_id),
+            {"worker": self.worker_id, "finished_at": time.time(), **stats},
+        )
+        self.release(unit_id)
+        self.logger.info(f"Completed unit {unit_id}")
+
+    def release(self, unit_id: str) -> None:
+        """Give the unit back, unless the lease now belongs to someone else"""
+        try:
+            if self._owner(unit_id) == self.worker_id:
+                os.remove(self._lease_path(unit_id))
+        except OSError as e:
+            self.logger.error(f"Error releasing unit {unit_id}: {e}")
+
+    def progress(self) -> Dict[str, int]:
+        plan = self.load_plan()
+        if not plan:
+            return {"total": 0, "done": 0, "leased": 0, "pending": 0}
+
+        now = time.time()
+        done = leased = 0
+        for unit in plan["units"]:
+            if os.path.exists(self._done_path(unit["id"])):
+                done += 1
+                continue
+            try:
+                if now - os.path.getmtime(self._lease_path(unit["id"])) < self.ttl:
+                    leased += 1
+            except FileNotFoundError:
+                pass
+
+        total = len(plan["units"])
+        return {
+            "total": total,
+            "done": done,
+            "leased": leased,
+            "pending": total - done - leased,
+        }
@@ -0,0 +1,278 @@
+import os
+import time
+import asyncio
+import bisect
+import logging.config
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import LOG_CONFIG
+
+logging.config.dictConfig(LOG_CONFIG)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, **extra: str) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {value:g}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self.counts: Dict[LabelValues, List[int]] = {}
+        self.sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[key] = self.sums.get(key, 0.0) + value
+
+    def time(self, **labels: str) -> "_Timer":
+        """Context manager observing the wall time of its body"""
+        return _Timer(self, labels)
+
+    def samples(self) -> Iterator[str]:
+        for key, counts in sorted(self.counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, le=f"{bound:g}")
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            cumulative += counts[-1]
+            labels = _format_labels(self.label_names, key, le="+Inf")
+            yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {self.sums[key]:g}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.start_time = time.time()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Stages: parse (decode + filter a byte range), sanitize (LaTeX stripping
+# within parse), embed (a whole embed_batch), inference (one model call)
+# and upsert (one Qdrant write).
+STAGE_SECONDS = REGISTRY.histogram(
+    "xivvy_stage_seconds", "Wall time of one unit of work per stage", ["stage"]
+)
+STAGE_PAPERS = REGISTRY.counter(
+    "xivvy_stage_papers_total", "Papers that completed each stage", ["stage"]
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "xivvy_stage_errors_total", "Failed units of work per stage", ["stage"]
+)
+STAGE_IN_FLIGHT = REGISTRY.gauge(
+    "xivvy_stage_in_flight", "Batches currently being worked on per stage", ["stage"]
+)
+BATCH_SIZES = REGISTRY.histogram(
+    "xivvy_batch_size", "Papers per batch entering each stage", ["stage"], SIZE_BUCKETS
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "xivvy_queue_depth", "Batches waiting in each pipeline queue", ["queue"]
+)
+INFERENCE_TOKENS = REGISTRY.counter(
+    "xivvy_inference_tokens_total",
+    "Tokens sent to the model: real ones and padding",
+    ["kind"],
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "xivvy_embedding_cache_lookups_total", "Embedding cache lookups", ["result"]
+)
+
+
+def stage_rates() -> Dict[str, float]:
+    """Average papers/sec per stage since the process started"""
+    elapsed = time.time() - REGISTRY.start_time
+    if elapsed <= 0:
+        return {}
+    return {key[0]: value / elapsed for key, value in STAGE_PAPERS.values.items()}
+
+
+class MetricsExporter:
+    """Publishes the registry as a periodically rewritten file and/or over HTTP"""
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        metrics_file: Optional[str],
+        interval: float,
+        port: Optional[int] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.registry = registry
+        self.metrics_file = metrics_file
+        self.interval = interval
+        self.port = port
+        self.task: Optional[asyncio.Task] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    def write(self) -> None:
+        if not self.metrics_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.metrics_file) or ".", exist_ok=True)
+            tmp_file = f"{self.metrics_file}.tmp"
+            with open(tmp_file, "w") as f:
+                f.write(self.registry.render())
+            os.replace(tmp_file, self.metrics_file)
+        except Exception as e:
+            self.logger.error(f"Error writing metrics file: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.write()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = self.registry.render().encode("utf-8")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                b"Connection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        except Exception as e:
+            self.logger.debug(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        if self.metrics_file and self.task is None:
+            self.task = asyncio.create_task(self._run())
+        if self.port and self.server is None:
+            try:
+                self.server = await asyncio.start_server(self._handle, port=self.port)
+                self.logger.info(f"Serving metrics on port {self.port}")
+            except OSError as e:
+                self.logger.error(f"Cannot serve metrics on port {self.port}: {e}")
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        self.write()
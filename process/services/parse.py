@@ -1,167 +1,179 @@
 import re
 import os
-import json
-import aiofiles
+import time
 import orjson
 import logging.config
 import asyncio
-from functools import lru_cache
-from typing import List, AsyncIterator, Dict, Optional
-
-from models import ExtractedPaper
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, AsyncIterator, Dict, Iterator, Optional, Tuple
+
+from services.batch import PaperBatch
+from services.checkpoint import Checkpoint
+from services.delta import DeltaIndex
+from services.metrics import BATCH_SIZES, STAGE_PAPERS, STAGE_SECONDS
+from services.reader import ArchiveReader, BufferReader, SnapshotReader
+from services.utils import CATEGORY_BITS
 from config import (
     LOG_CONFIG,
     DATASET_PATH,
+    DATASET_FORMAT,
+    DATASET_SOURCE,
     BATCH_SIZE,
     VALID_CATEGORIES,
     CHECKPOINT_FILE,
+    DELTA_MODE,
+    DELTA_INDEX_FILE,
+    DELTA_SKIP_UNCHANGED_DATES,
+    PARSE_WORKERS,
+    PARSE_CHUNK_BYTES,
 )
 
 logging.config.dictConfig(LOG_CONFIG)
 
+LEGACY_CATEGORY_MAPPING = {
+    "acc-phys": "physics",
+    "adap-org": "nlin",
+    "alg-geom": "math",
+    "ao-sci": "physics",
+    "atom-ph": "physics",
+    "bayes-an": "stat",
+    "chao-dyn": "nlin",
+    "chem-ph": "physics",
+    "cmp-lg": "cs",
+    "comp-gas": "physics",
+    "dg-ga": "math",
+    "funct-an": "math",
+    "mtrl-th": "cond-mat",
+    "patt-sol": "nlin",
+    "plasm-ph": "physics",
+    "q-alg": "quant-ph",
+    "solv-int": "nlin",
+    "supr-con": "cond-mat",
+}
+
+# Raw category -> domain, precomputed for every domain and legacy name.
+# Subject classes ("cs.LG", "hep-th") are resolved once and added on first use;
+# there are only a couple of hundred of them.
+CATEGORY_TABLE: Dict[str, str] = {
+    **{category: category for category in VALID_CATEGORIES},
+    **LEGACY_CATEGORY_MAPPING,
+}
+
+# Domain -> its bit in the category mask stored in Qdrant
+DOMAIN_BITS: Dict[str, int] = {
+    domain.value: bit for domain, bit in CATEGORY_BITS.items()
+}
+
+# One parsed paper: (id, title, abstract, authors, category mask, update date)
+PaperRow = Tuple[str, str, str, List[str], int, str]
+# What a parse job returns: the papers, the end byte offset of each paper's
+# line, lines read, records skipped as unchanged, seconds for the job and
+# seconds spent sanitizing within it
+ParseResult = Tuple[PaperBatch, List[int], int, int, float, float]
+
+
+def normalize_category(category: str) -> str:
+    domain = CATEGORY_TABLE.get(category)
+    if domain is not None:
+        return domain
+
+    domain = category
+    for prefix in (category.split(".", 1)[0], category.rsplit("-", 1)[0]):
+        if prefix in VALID_CATEGORIES:
+            domain = prefix
+            break
+
+    CATEGORY_TABLE[category] = domain
+    return domain
+
 
 class Parser:
-    def __init__(self):
-        self.file_path = DATASET_PATH
+    def __init__(
+        self,
+        load_checkpoint: bool = True,
+        skip_unchanged: bool = True,
+        byte_range: Optional[Tuple[int, int]] = None,
+    ):
+        self.file_path = DATASET_SOURCE
+        # In zip mode file_path is the archive and offsets are into the snapshot
+        # member, exactly as they would be in the extracted file
+        self.archive_member = (
+            os.path.basename(DATASET_PATH) if DATASET_FORMAT == "zip" else None
+        )
+        # Restricts parsing to one newline-aligned [start, end) slice of the file
+        self.byte_range = byte_range
         self.logger = logging.getLogger(__name__)
         self.batch_size = BATCH_SIZE
-        self.valid_categories = VALID_CATEGORIES
-
-        # Legacy category mapping
-        self.legacy_to_current_mapping = {
-            "acc-phys": "physics",
-            "adap-org": "nlin",
-            "alg-geom": "math",
-            "ao-sci": "physics",
-            "atom-ph": "physics",
-            "bayes-an": "stat",
-            "chao-dyn": "nlin",
-            "chem-ph": "physics",
-            "cmp-lg": "cs",
-            "comp-gas": "physics",
-            "dg-ga": "math",
-            "funct-an": "math",
-            "mtrl-th": "cond-mat",
-            "patt-sol": "nlin",
-            "plasm-ph": "physics",
-            "q-alg": "quant-ph",
-            "solv-int": "nlin",
-            "supr-con": "cond-mat",
-        }
-
-        self.checkpoint_file = CHECKPOINT_FILE
-        self.last_processed_id = self._load_checkpoint()
-        self.logger.info(
-            f"Starting from checkpoint ID: {self.last_processed_id or 'Beginning'}"
-        )
-
-        self.latex_patterns = {
-            "math_inline": re.compile(r"\$.*?\$"),
-            "math_inline2": re.compile(r"\\\((.*?)\\\)"),
-            "math_block": re.compile(r"\\\[(.*?)\\\]"),
-            "cite": re.compile(r"\\cite\{.*?\}"),
-            "references": re.compile(
-                r"(Figure|Fig\.|Eq\.|Equation|Section|Table)\s+\d+(\.\d+)?",
-                re.IGNORECASE,
-            ),
-            "references2": re.compile(
-                r"(Eq\.|Equation|Fig\.|Figure|Table|Section)\s*\(\d+\)", re.IGNORECASE
-            ),
-            "latex_commands": re.compile(r"\\[a-zA-Z]+"),
-        }
-
-        self.category_cache: Dict[str, str] = {}
-
-    def _load_checkpoint(self) -> Optional[str]:
-        """Load the last processed paper ID from checkpoint file"""
-        try:
-            if os.path.exists(self.checkpoint_file):
-                with open(self.checkpoint_file, "r") as f:
-                    checkpoint_data = json.load(f)
-                    return checkpoint_data.get("last_processed_id")
-            return None
-        except Exception as e:
-            self.logger.error(f"Error loading checkpoint: {e}")
-            return None
-
-    async def save_checkpoint(self, paper_id: str) -> bool:
-        """Save the last processed paper ID to checkpoint file"""
-        try:
-            checkpoint_data = {
-                "last_processed_id": paper_id,
-                "timestamp": asyncio.get_event_loop().time(),
-                "batch_size": self.batch_size,
-            }
-
-            async with aiofiles.open(self.checkpoint_file, "w") as f:
-                await f.write(json.dumps(checkpoint_data, indent=2))
-
-            self.last_processed_id = paper_id
-            self.logger.info(f"Checkpoint saved: {paper_id}")
-            return True
-        except Exception as e:
-            self.logger.error(f"Error saving checkpoint: {e}")
-            return False
-
-    @lru_cache(maxsize=1000)
-    def normalize_category(self, category: str) -> str:
-        """Normalize category with caching for better performance"""
+        self.parse_workers = PARSE_WORKERS
+        self.chunk_bytes = PARSE_CHUNK_BYTES
+
+        self.checkpoint: Optional[Checkpoint] = None
+        if load_checkpoint:
+            self.checkpoint = Checkpoint(CHECKPOINT_FILE, self.file_path)
+            self.logger.info(
+                f"Starting from checkpoint byte offset: {self.checkpoint.offset}"
+            )
 
-        if category in self.category_cache:
-            return self.category_cache[category]
+        self.delta_index: Optional[DeltaIndex] = None
+        if (
+            skip_unchanged
+            and DELTA_MODE
+            and DELTA_SKIP_UNCHANGED_DATES
+            and os.path.exists(DELTA_INDEX_FILE)
+        ):
+            self.delta_index = DeltaIndex(DELTA_INDEX_FILE, read_only=True)
+
+        # All LaTeX noise in one alternation so sanitizing is a single scan:
+        # inline/display math, citations, bare commands (grouped under their
+        # shared backslash prefix) and figure/equation/section references.
+        self.latex_pattern = re.compile(
+            r"\$.*?\$"
+            r"|\\(?:\(.*?\\\)|\[.*?\\\]|cite\{.*?\}|[a-zA-Z]+)"
+            r"|(?:Fig(?:ure|\.)|Eq(?:uation|\.)|Section|Table)"
+            r"(?:\s+\d+(?:\.\d+)?|\s*\(\d+\))",
+            re.IGNORECASE | re.DOTALL,
+        )
+        self.date_pattern = re.compile(r"^\d{4}-\d{2}-\d{2}")
+        # Time spent in sanitize_arxiv_text during the current extract_range
+        self.sanitize_seconds = 0.0
 
-        if category in self.legacy_to_current_mapping:
-            mapped_category = self.legacy_to_current_mapping[category]
-            self.category_cache[category] = mapped_category
-            self.logger.debug(
-                f"Mapped legacy category '{category}' to '{mapped_category}'"
-            )
-            return mapped_category
+    @property
+    def start_offset(self) -> int:
+        return self.checkpoint.offset if self.checkpoint else 0
 
-        if category in self.valid_categories:
-            self.category_cache[category] = category
-            return category
+    def acknowledge(self, end_offset: int) -> None:
+        """Called once a batch ending at end_offset has been stored"""
+        if self.checkpoint:
+            self.checkpoint.acknowledge(end_offset)
 
-        for valid_cat in self.valid_categories:
-            if category.startswith(valid_cat + ".") or category.startswith(
-                valid_cat + "-"
-            ):
-                self.category_cache[category] = valid_cat
-                return valid_cat
+    def _register_batch(self, end_offset: int) -> None:
+        if self.checkpoint:
+            self.checkpoint.register(end_offset)
 
-        self.category_cache[category] = category
-        return category
+    def normalize_category(self, category: str) -> str:
+        """Map a raw arXiv category (e.g. "hep-th", "cs.LG", "cmp-lg") to its domain"""
+        return normalize_category(category)
 
     def _is_valid_date_format(self, date_str: str) -> bool:
         """Check if a string is in a valid date format (YYYY-MM-DD or similar)"""
-        import re
-
-        return bool(re.match(r"^\d{4}-\d{2}-\d{2}", date_str))
+        return bool(self.date_pattern.match(date_str))
 
     def sanitize_arxiv_text(self, text: str, max_chars: int = 1500) -> str:
-        """Sanitize arXiv text using precompiled regex patterns for better performance"""
+        """Strip LaTeX math, citations, references and commands in a single pass"""
         if not text or not isinstance(text, str):
             return ""
 
         try:
-            text = " ".join(text.split())
-
-            for name, pattern in self.latex_patterns.items():
-                try:
-                    text = pattern.sub("", text)
-                except Exception as e:
-                    self.logger.warning(f"Error applying {name} pattern: {e}")
-
-            text = " ".join(text.split())
-
+            text = " ".join(self.latex_pattern.sub("", text).split())
             return text[:max_chars]
         except Exception as e:
             self.logger.error(f"Error in sanitize_arxiv_text: {e}")
             return text[:max_chars] if text else ""
 
-    async def _process_line(self, line: str) -> ExtractedPaper | None:
-        """Process a single line of JSON data"""
-        if not line or not isinstance(line, str):
+    def _extract_paper(self, line: str | bytes) -> PaperRow | None:
+        """Decode and clean a single JSON line; pure CPU work, safe to run in a worker process"""
+        if not line or not isinstance(line, (str, bytes)):
             self.logger.warning("Received invalid line (empty or not a string)")
             return None
 
@@ -187,8 +199,6 @@ class Parser:
                     if isinstance(obj.get("title"), str)
                     else ""
                 )
-                if title:
-                    title = " ".join(title.split())
                 abstract = (
                     (obj.get("abstract") or "").strip()
                     if isinstance(obj.get("abstract"), str)
@@ -250,39 +260,15 @@ class Parser:
                 )
                 return None
 
-            categories = []
-            try:
-                if categories_raw:
-                    category_set = set()
-                    for cat in categories_raw.split():
-                        if cat:
-                            try:
-                                normalized = self.normalize_category(cat.strip())
-                                category_set.add(normalized)
-                            except Exception as cat_error:
-                                self.logger.warning(
-                                    f"Error normalizing category '{cat}': {cat_error}"
-                                )
-                    categories = sorted(category_set)
-            except Exception as cat_error:
-                self.logger.error(
-                    f"Error processing categories for {paper_id}: {cat_error}"
-                )
-
+            category_mask = 0
             try:
-                combined_text_raw = f"{title} {abstract}"
-                combined_text = self.sanitize_arxiv_text(combined_text_raw)
-
-                if not combined_text.strip():
-                    self.logger.warning(
-                        f"Paper {paper_id} has empty content after sanitization"
-                    )
-                    combined_text = title or abstract  # Use unsanitized as fallback
-            except Exception as text_error:
-                self.logger.error(f"Error sanitizing text for {paper_id}: {text_error}")
-                combined_text = (
-                    combined_text_raw[:1500] if combined_text_raw else title or abstract
-                )
+                for cat in categories_raw.split():
+                    category_mask |= DOMAIN_BITS[
+                        CATEGORY_TABLE.get(cat) or normalize_category(cat)
+                    ]
+            except KeyError as cat_error:
+                self.logger.error(f"Unknown category for paper {paper_id}: {cat_error}")
+                return None
 
             if update_date and not self._is_valid_date_format(update_date):
                 self.logger.warning(
@@ -291,22 +277,30 @@ class Parser:
                 update_date = ""
 
             try:
-                sanitized_abstract = (
-                    self.sanitize_arxiv_text(abstract) if abstract else ""
-                )
-                sanitized_title = self.sanitize_arxiv_text(title) if title else ""
-
-                return ExtractedPaper(
-                    id=paper_id,
-                    abstract=sanitized_abstract,
-                    title=sanitized_title,
-                    authors=authors,
-                    categories=categories,
-                    date_updated=update_date,
+                sanitize_start = time.perf_counter()
+                sanitized_title = self.sanitize_arxiv_text(title)
+                sanitized_abstract = self.sanitize_arxiv_text(abstract)
+                self.sanitize_seconds += time.perf_counter() - sanitize_start
+
+                if not (sanitized_title or sanitized_abstract):
+                    self.logger.warning(
+                        f"Paper {paper_id} has empty content after sanitization"
+                    )
+                if not sanitized_title:
+                    # Titles that are entirely math would otherwise be dropped
+                    sanitized_title = " ".join(title.split())[:1500]
+
+                return (
+                    paper_id,
+                    sanitized_title,
+                    sanitized_abstract,
+                    authors,
+                    category_mask,
+                    update_date,
                 )
-            except Exception as model_error:
+            except Exception as sanitize_error:
                 self.logger.error(
-                    f"Error creating ExtractedPaper for {paper_id}: {model_error}"
+                    f"Error sanitizing paper {paper_id}: {sanitize_error}"
                 )
                 return None
 
@@ -314,137 +308,286 @@ class Parser:
             self.logger.error(f"Unexpected parsing error: {e} — Line: {line[:100]}...")
             return None
 
-    async def parse_yield_batches(self) -> AsyncIterator[List[ExtractedPaper]]:
-        """Parse the dataset file and yield batches of papers"""
-        batch = []
-        line_buffer = []
-        buffer_size = min(1000, self.batch_size * 2)
+    def split_byte_ranges(
+        self, start: int = 0, stop: Optional[int] = None, chunk_bytes: int = 0
+    ) -> List[Tuple[int, int]]:
+        """Split [start, stop) of the dataset into newline-aligned byte ranges"""
+        ranges = []
+        chunk_bytes = chunk_bytes or self.chunk_bytes
+        file_size = os.path.getsize(self.file_path)
+        if stop is not None:
+            file_size = min(stop, file_size)
+
+        with open(self.file_path, "rb") as f:
+            while start < file_size:
+                end = min(start + chunk_bytes, file_size)
+                if end < file_size:
+                    f.seek(end)
+                    f.readline()
+                    end = f.tell()
+                ranges.append((start, end))
+                start = end
+
+        return ranges
+
+    def extract_range(
+        self, reader: SnapshotReader, start: int, end: int
+    ) -> ParseResult:
+        """Extract papers from the lines in [start, end) of the mapped snapshot.
+
+        Returns the papers as one PaperBatch, validated in bulk, along with
+        the end byte offset of each paper's line, the number of lines read,
+        the number of records skipped as unchanged, and the seconds spent on
+        the whole range and on sanitizing within it.
+        """
+        range_start = time.perf_counter()
+        self.sanitize_seconds = 0.0
+        spans = [(s, e) for s, e in reader.iter_spans(start, end) if e > s]
+
+        peeked = []
+        known_dates = {}
+        if self.delta_index:
+            peeked = [reader.peek_id_and_date(s, e) for s, e in spans]
+            known_dates = self.delta_index.known_dates(
+                [paper_id for paper_id, _ in peeked if paper_id]
+            )
+
+        papers = PaperBatch()
+        ends = []
+        skipped = 0
+        for i, (line_start, line_end) in enumerate(spans):
+            if known_dates:
+                paper_id, update_date = peeked[i]
+                if paper_id in known_dates and known_dates[paper_id] == update_date:
+                    skipped += 1
+                    continue
+
+            row = self._extract_paper(reader.line(line_start, line_end))
+            if row:
+                papers.append(*row)
+                ends.append(min(line_end + 1, end))
+
+        valid = papers.valid_rows()
+        if not valid.all():
+            self.logger.warning(
+                f"Skipping {len(papers) - int(valid.sum())} papers without a title "
+                "or a valid date"
+            )
+            keep = valid.nonzero()[0]
+            papers = papers.take(keep)
+            ends = [ends[i] for i in keep]
+
+        return (
+            papers,
+            ends,
+            len(spans),
+            skipped,
+            time.perf_counter() - range_start,
+            self.sanitize_seconds,
+        )
+
+    def extract_chunk(self, data: bytes, base: int) -> ParseResult:
+        """extract_range over decompressed lines that start at byte offset base"""
+        papers, ends, *counts = self.extract_range(BufferReader(data), 0, len(data))
+        return (papers, [base + end for end in ends], *counts)
+
+    def _range_jobs(self, ranges: List[Tuple[int, int]], in_process: bool) -> Iterator:
+        if in_process:
+            with SnapshotReader(self.file_path) as reader:
+                for start, end in ranges:
+                    yield self.extract_range, reader, start, end
+        else:
+            for start, end in ranges:
+                yield _parse_byte_range, self.file_path, start, end
+
+    def _archive_jobs(self, start: int, stop: int, in_process: bool) -> Iterator:
+        parse_chunk = self.extract_chunk if in_process else _parse_chunk
+        with ArchiveReader(self.file_path, self.archive_member) as reader:
+            for base, data in reader.iter_chunks(start, stop, self.chunk_bytes):
+                yield parse_chunk, data, base
+
+    async def parse_yield_batches(
+        self,
+    ) -> AsyncIterator[Tuple[PaperBatch, int]]:
+        """Parse the dataset file and yield (batch, end byte offset) pairs.
+
+        Call acknowledge(end_offset) once a batch is stored so the checkpoint
+        can move past it. A byte range that fails to parse raises, after the
+        batches wholly before it, so the checkpoint never passes it.
+        """
+        if not os.path.exists(self.file_path):
+            self.logger.error(f"Dataset file not found: {self.file_path}")
+            return
+
+        start, stop = self.byte_range or (self.start_offset, None)
+        in_process = self.parse_workers <= 1
+
+        if self.archive_member:
+            with ArchiveReader(self.file_path, self.archive_member) as reader:
+                stop = len(reader) if stop is None else min(stop, len(reader))
+            if start >= stop:
+                self.logger.info("Nothing left to parse")
+                return
+            self.logger.info(
+                f"Streaming {stop - start} bytes of {self.archive_member} "
+                f"from {self.file_path}"
+            )
+            jobs = self._archive_jobs(start, stop, in_process)
+        else:
+            ranges = self.split_byte_ranges(start, stop)
+            if not ranges:
+                self.logger.info("Nothing left to parse")
+                return
+            self.logger.info(f"Parsing {len(ranges)} byte ranges")
+            stop = ranges[-1][1]
+            jobs = self._range_jobs(ranges, in_process)
+
+        if in_process:
+            results = self._extract_sequential(jobs)
+        else:
+            self.logger.info(f"Parsing with {self.parse_workers} worker processes")
+            results = self._extract_parallel(jobs)
+
+        pending = PaperBatch()
+        pending_ends: List[int] = []
         lines_processed = 0
         papers_extracted = 0
-        skip_until_id = self.last_processed_id
-        resume_mode = skip_until_id is not None
+        papers_skipped = 0
 
         try:
-            if not os.path.exists(self.file_path):
-                self.logger.error(f"Dataset file not found: {self.file_path}")
-                return
-
-            try:
-                async with aiofiles.open(self.file_path) as f:
-                    async for line in f:
-                        lines_processed += 1
-
-                        if resume_mode:
-                            try:
-                                obj = orjson.loads(line)
-                                current_id = obj.get("id", "").strip()
-
-                                if current_id == skip_until_id:
-                                    self.logger.info(
-                                        f"Found checkpoint ID: {skip_until_id}. Resuming from next paper."
-                                    )
-                                    resume_mode = False
-                                    continue
-                                elif skip_until_id and current_id:
-                                    continue
-                            except Exception as e:
-                                self.logger.warning(
-                                    f"Error checking paper ID during resume: {e}"
-                                )
-                                resume_mode = False
-
-                        if not resume_mode:
-                            line_buffer.append(line)
-
-                        if len(line_buffer) >= buffer_size:
-                            try:
-                                tasks = [
-                                    self._process_line(line) for line in line_buffer
-                                ]
-                                results = await asyncio.gather(
-                                    *tasks, return_exceptions=True
-                                )
-
-                                last_id = None
-                                for result in results:
-                                    if isinstance(result, Exception):
-                                        self.logger.error(
-                                            f"Error processing line: {result}"
-                                        )
-                                        continue
-
-                                    if result:
-                                        papers_extracted += 1
-                                        batch.append(result)
-                                        last_id = result.id
-                                        if len(batch) >= self.batch_size:
-                                            self.logger.info(
-                                                f"Yielding batch of {len(batch)} papers"
-                                            )
-                                            yield batch
-
-                                            if last_id:
-                                                await self.save_checkpoint(last_id)
-                                            batch = []
-                            except Exception as batch_error:
-                                self.logger.error(
-                                    f"Error processing batch: {batch_error}"
-                                )
-
-                            line_buffer = []
-                            if lines_processed % 10000 == 0:
-                                self.logger.info(
-                                    f"Progress: {lines_processed} lines processed, "
-                                    f"{papers_extracted} papers extracted"
-                                )
-
-                if line_buffer:
-                    try:
-                        tasks = [self._process_line(line) for line in line_buffer]
-                        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                        last_id = None
-                        for result in results:
-                            if isinstance(result, Exception):
-                                self.logger.error(f"Error processing line: {result}")
-                                continue
-
-                            if result:
-                                papers_extracted += 1
-                                batch.append(result)
-                                last_id = result.id
-                                if len(batch) >= self.batch_size:
-                                    self.logger.info(
-                                        f"Yielding batch of {len(batch)} papers"
-                                    )
-                                    yield batch
-                                    # Save checkpoint with the last ID in the batch
-                                    if last_id:
-                                        await self.save_checkpoint(last_id)
-                                    batch = []
-                    except Exception as final_batch_error:
-                        self.logger.error(
-                            f"Error processing final batch: {final_batch_error}"
-                        )
-                if batch:
-                    self.logger.info(f"Yielding final batch of {len(batch)} papers")
-                    yield batch
-                    if batch and hasattr(batch[-1], "id"):
-                        await self.save_checkpoint(batch[-1].id)
+            async for (
+                papers,
+                ends,
+                line_count,
+                skipped_count,
+                range_seconds,
+                sanitize_seconds,
+            ) in results:
+                if line_count:
+                    STAGE_SECONDS.observe(range_seconds, stage="parse")
+                    STAGE_SECONDS.observe(sanitize_seconds, stage="sanitize")
+                    STAGE_PAPERS.inc(len(papers), stage="parse")
+
+                lines_processed += line_count
+                papers_skipped += skipped_count
+                papers_extracted += len(papers)
+
+                pending.extend(papers)
+                pending_ends.extend(ends)
+                row = 0
+                while len(pending) - row >= self.batch_size:
+                    batch = pending.slice(row, row + self.batch_size)
+                    row += self.batch_size
+                    end_offset = pending_ends[row - 1]
+                    self.logger.info(f"Yielding batch of {len(batch)} papers")
+                    BATCH_SIZES.observe(len(batch), stage="parse")
+                    self._register_batch(end_offset)
+                    yield batch, end_offset
+                if row:
+                    pending, pending_ends = pending.slice(row), pending_ends[row:]
 
                 self.logger.info(
-                    f"Parsing complete: {lines_processed} lines processed, "
-                    f"{papers_extracted} papers extracted"
+                    f"Progress: {lines_processed} lines processed, "
+                    f"{papers_extracted} papers extracted, "
+                    f"{papers_skipped} skipped as unchanged"
                 )
 
-            except (IOError, PermissionError) as file_error:
-                self.logger.error(f"Error opening dataset file: {file_error}")
-        except Exception as e:
-            self.logger.error(f"Unexpected error in parse_yield_batches: {e}")
-            if batch:
-                self.logger.info(
-                    f"Yielding emergency batch of {len(batch)} papers after error"
-                )
-                yield batch
-                if batch and hasattr(batch[-1], "id"):
-                    await self.save_checkpoint(batch[-1].id)
+            if pending:
+                end_offset = stop
+                self.logger.info(f"Yielding final batch of {len(pending)} papers")
+                BATCH_SIZES.observe(len(pending), stage="parse")
+                self._register_batch(end_offset)
+                yield pending, end_offset
+
+            self.logger.info(
+                f"Parsing complete: {lines_processed} lines processed, "
+                f"{papers_extracted} papers extracted, "
+                f"{papers_skipped} skipped as unchanged"
+            )
+        finally:
+            await results.aclose()
+
+    def _range_failed(self, error: Exception) -> None:
+        # Nothing from the failed range or after it is yielded, so the
+        # checkpoint (and the delta index) stay before it for the next run
+        self.logger.error(
+            f"Error parsing byte range: {error}; stopping before it so the "
+            "next run parses it again"
+        )
+
+    async def _extract_parallel(self, jobs: Iterator):
+        """Run (function, *args) parse jobs in a process pool, in order.
+
+        Jobs are drawn on a helper thread, since producing one may mean
+        decompressing the next chunk of the archive.
+        """
+        loop = asyncio.get_running_loop()
+        pool = ProcessPoolExecutor(
+            max_workers=self.parse_workers, initializer=_init_parse_worker
+        )
+        pending = deque()
+
+        async def submit_next() -> None:
+            job = await loop.run_in_executor(None, next, jobs, None)
+            if job is not None:
+                pending.append(loop.run_in_executor(pool, *job))
+
+        try:
+            for _ in range(self.parse_workers * 2):
+                await submit_next()
+
+            while pending:
+                try:
+                    result = await pending.popleft()
+                except Exception as range_error:
+                    self._range_failed(range_error)
+                    raise
+                await submit_next()
+                yield result
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            _close_jobs(jobs)
+
+    async def _extract_sequential(self, jobs: Iterator):
+        """Run parse jobs one at a time on a helper thread"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                job = await loop.run_in_executor(None, next, jobs, None)
+                if job is None:
+                    break
+                try:
+                    result = await loop.run_in_executor(None, *job)
+                except Exception as range_error:
+                    self._range_failed(range_error)
+                    raise
+                yield result
+        finally:
+            _close_jobs(jobs)
+
+
+def _close_jobs(jobs: Iterator) -> None:
+    try:
+        jobs.close()
+    except ValueError:
+        # Still running on a helper thread; its file closes when it is collected
+        pass
+
+
+_worker_parser: Optional[Parser] = None
+
+
+def _init_parse_worker() -> None:
+    global _worker_parser
+    _worker_parser = Parser(load_checkpoint=False)
+
+
+def _parse_byte_range(file_path: str, start: int, end: int) -> ParseResult:
+    """Parse every line in [start, end) of the dataset inside a worker process"""
+    with SnapshotReader(file_path) as reader:
+        return _worker_parser.extract_range(reader, start, end)
+
+
+def _parse_chunk(data: bytes, base: int) -> ParseResult:
+    """Parse decompressed lines starting at byte offset base inside a worker process"""
+    return _worker_parser.extract_chunk(data, base)
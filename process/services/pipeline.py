@@ -1,85 +1,448 @@
+import os
 import asyncio
 import logging.config
 import time
+from typing import Optional
 
-from config import LOG_CONFIG
+from config import (
+    LOG_CONFIG,
+    PIPELINE_EMBED_WORKERS,
+    PIPELINE_STORE_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    DELTA_MODE,
+    DELTA_INDEX_FILE,
+    DATASET_SOURCE,
+    BATCH_SIZE,
+    INGEST_SOURCE,
+    PARSED_DIR,
+    PARSED_CHECKPOINT_FILE,
+    EMB_SHARDS_ENABLED,
+    EMB_SHARDS_DIR,
+    EMB_SHARDS_DTYPE,
+    EMB_SHARD_ROWS,
+    VECTOR_SIZE,
+    METRICS_FILE,
+    METRICS_INTERVAL,
+    METRICS_PORT,
+    ADAPTIVE_BATCHING,
+    TUNING_INTERVAL,
+    TUNING_MEMORY_LIMIT,
+    TUNING_MEMORY_FRACTION,
+    TUNING_UPSERT_LATENCY_TARGET,
+    TUNING_BATCH_LIMITS,
+    DEADLETTER_FILE,
+    HEALTH_CHECK_INTERVAL,
+)
+from services.batch import PaperBatch
+from services.columnar import ColumnarReader
 from services.database import Database
+from services.deadletter import EMBED, STORE, DeadLetterStore
+from services.delta import DeltaIndex
 from services.parse import Parser
 from services.embed import Embedder
+from services.metrics import (
+    QUEUE_DEPTH,
+    REGISTRY,
+    STAGE_ERRORS,
+    MetricsExporter,
+    stage_rates,
+)
+from services.shards import ShardWriter
+from services.tuning import (
+    AdaptiveBatchController,
+    BatchSizeKnob,
+    total_memory_bytes,
+)
 
 logging.config.dictConfig(LOG_CONFIG)
 logger = logging.getLogger(__name__)
 
+# Marks the end of a stage's input queue
+_DONE = None
+
+
+def _worker_path(path: str, worker_id: Optional[str]) -> str:
+    """data/x.ext -> data/x-<worker_id>.ext, so local workers don't share files"""
+    if not worker_id:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{worker_id}{ext}"
+
 
 class Pipeline:
-    def __init__(self, shutdown_event: asyncio.Event):
-        self.parser = Parser()
-        self.database = Database()
-        self.embedder = Embedder()
+    """Parse -> embed -> store, run as concurrent stages joined by bounded queues.
+
+    Each stage has its own worker count; the bounded queues give backpressure
+    so a slow stage throttles the ones before it instead of buffering without
+    limit. Setting shutdown_event stops parsing and drains what is in flight.
+
+    Batches that fail to embed or store are written to the dead-letter store
+    and acknowledged, so `main.py retry` can recover just those papers.
+    While Qdrant's circuit is open, the store stage holds its batch until the
+    health monitor closes the circuit, rather than dead-lettering the
+    snapshot.
+
+    In delta mode, papers whose content is unchanged since they were last
+    stored are dropped right after parsing. Distributed workers (worker_id
+    set) run without it: units move between workers, so no one worker's
+    index would cover the papers of the unit it is given. Stored embeddings
+    can also be appended to shards so the collection can be rebuilt without
+    the model.
+
+    In bulk mode (first-time population) HNSW indexing is deferred and
+    upserts don't wait for Qdrant to apply them; indexing is re-enabled at
+    the end.
+    """
+
+    def __init__(
+        self,
+        shutdown_event: asyncio.Event,
+        source: str = INGEST_SOURCE,
+        bulk: bool = False,
+        database: Optional[Database] = None,
+        embedder: Optional[Embedder] = None,
+        reader=None,
+        worker_id: Optional[str] = None,
+    ):
+        self.source = reader or self._select_source(source)
+        # Injected components outlive this run and are closed by their owner
+        self.owns_embedder = embedder is None
+        self.owns_database = database is None
+        self.embedder = embedder or Embedder()
+        self.database = database or Database()
         self.shutdown_event = shutdown_event
+        self.bulk = bulk
+        self.embed_workers = PIPELINE_EMBED_WORKERS
+        self.store_workers = PIPELINE_STORE_WORKERS
+        self.queue_size = PIPELINE_QUEUE_SIZE
+        self.dead_letters = DeadLetterStore(_worker_path(DEADLETTER_FILE, worker_id))
+        self.delta_index = None
+        if DELTA_MODE and not worker_id:
+            # The same file the Parser reads to skip unchanged dates
+            self.delta_index = DeltaIndex(DELTA_INDEX_FILE)
+        self.shard_writer = None
+        if EMB_SHARDS_ENABLED:
+            shards_dir = EMB_SHARDS_DIR
+            if worker_id:
+                shards_dir = os.path.join(EMB_SHARDS_DIR, f"worker-{worker_id}")
+            self.shard_writer = ShardWriter(
+                shards_dir,
+                model_name=self.embedder.model_key,
+                dim=VECTOR_SIZE,
+                dtype=EMB_SHARDS_DTYPE,
+                rows_per_shard=EMB_SHARD_ROWS,
+            )
+        self.metrics = MetricsExporter(
+            REGISTRY,
+            _worker_path(METRICS_FILE, worker_id),
+            METRICS_INTERVAL,
+            port=None if worker_id else METRICS_PORT,
+        )
+        self.tuner = self._build_tuner() if ADAPTIVE_BATCHING else None
         self.stats = {
             "papers_processed": 0,
+            "papers_unchanged": 0,
             "papers_embedded": 0,
             "papers_stored": 0,
             "batches_processed": 0,
             "errors": 0,
+            "dead_lettered": 0,
             "start_time": time.time(),
         }
 
+    def _select_source(self, source: str):
+        """Parse the JSON snapshot, or stream a columnar store built from it"""
+        if source in ("auto", "columnar"):
+            reader = ColumnarReader(PARSED_DIR, BATCH_SIZE, PARSED_CHECKPOINT_FILE)
+            if source == "columnar" or reader.is_current(DATASET_SOURCE):
+                logger.info(f"Reading parsed papers from columnar store {PARSED_DIR}")
+                return reader
+        logger.info(f"Parsing papers from {DATASET_SOURCE}")
+        return Parser()
+
+    def _build_tuner(self) -> AdaptiveBatchController:
+        memory_limit = TUNING_MEMORY_LIMIT
+        if memory_limit is None:
+            total = total_memory_bytes() or 8 * 1024**3
+            memory_limit = int(total * TUNING_MEMORY_FRACTION)
+
+        owners = {
+            "parse": (self.source, "batch_size"),
+            "inference": (self.embedder, "inference_batch_size"),
+            "upsert": (self.database, "upsert_batch_size"),
+        }
+        knobs = [
+            BatchSizeKnob(name, owner, attribute, *TUNING_BATCH_LIMITS[name])
+            for name, (owner, attribute) in owners.items()
+        ]
+        return AdaptiveBatchController(
+            knobs,
+            memory_limit=memory_limit,
+            upsert_latency_target=TUNING_UPSERT_LATENCY_TARGET,
+            interval=TUNING_INTERVAL,
+        )
+
     def log_progress(self):
         elapsed = time.time() - self.stats["start_time"]
-        rate = self.stats["papers_processed"] / elapsed if elapsed > 0 else 0
+        rate = self.stats["papers_stored"] / elapsed if elapsed > 0 else 0
         logger.info(
             f"Progress: {self.stats['batches_processed']} batches | "
             f"{self.stats['papers_processed']} papers processed | "
+            f"{self.stats['papers_unchanged']} unchanged | "
             f"{self.stats['papers_embedded']} embedded | "
             f"{self.stats['papers_stored']} stored | "
             f"{self.stats['errors']} errors | "
             f"Rate: {rate:.2f} papers/sec"
         )
+        rates = stage_rates()
+        if rates:
+            logger.info(
+                "Stage rates (papers/sec): "
+                + ", ".join(f"{stage} {value:.1f}" for stage, value in rates.items())
+            )
 
-    async def run(self):
-        logger.info("Starting pipeline...")
-        if not await self.database.create_collection_if_not_exists():
-            logger.error("Cannot access DB collection; aborting.")
-            return
+    def _dead_letter(
+        self,
+        stage: str,
+        reason: str,
+        papers: PaperBatch,
+        end_offset: Optional[int],
+        delta_entries,
+    ) -> None:
+        """Park failed papers; their offset is acknowledged once they are on disk.
+
+        Only a failed dead-letter write counts as an error: the papers are then
+        neither stored nor recoverable, and the offset stays unacknowledged.
+        """
+        if delta_entries:
+            ids = set(papers.ids)
+            delta_entries = {k: v for k, v in delta_entries.items() if k in ids}
+        if self.dead_letters.add(stage, reason, papers, delta_entries):
+            self.stats["dead_lettered"] += len(papers)
+            if end_offset is not None:
+                self.source.acknowledge(end_offset)
+        else:
+            self.stats["errors"] += 1
+
+    async def _insert(self, embedded: PaperBatch) -> Optional[bool]:
+        """Insert a batch, holding it while Qdrant's circuit is not closed.
+
+        Returns False only for a failure with the circuit closed, and None if
+        shutdown is set before Qdrant comes back.
+        """
+        breaker = self.database.breaker
+        while True:
+            if breaker.state != breaker.CLOSED:
+                logger.warning(
+                    f"Qdrant circuit is {breaker.state}; holding "
+                    f"{len(embedded)} papers until it closes"
+                )
+            while breaker.state != breaker.CLOSED:
+                try:
+                    await asyncio.wait_for(
+                        self.shutdown_event.wait(), timeout=HEALTH_CHECK_INTERVAL
+                    )
+                    return None
+                except asyncio.TimeoutError:
+                    pass
 
+            if await self.database.insert_batch(embedded, wait=not self.bulk):
+                return True
+            # A failure that opened the circuit is Qdrant's, not the batch's
+            if breaker.state == breaker.CLOSED:
+                return False
+
+    def _track_queues(self, embed_queue: asyncio.Queue, store_queue: asyncio.Queue):
+        QUEUE_DEPTH.set(embed_queue.qsize(), queue="embed")
+        QUEUE_DEPTH.set(store_queue.qsize(), queue="store")
+
+    async def _parse_stage(self, embed_queue: asyncio.Queue) -> None:
+        batches = self.source.parse_yield_batches()
         try:
-            async for batch in self.parser.parse_yield_batches():
+            async for batch, end_offset in batches:
                 if self.shutdown_event.is_set():
-                    logger.info("Shutdown requested; exiting batch loop.")
+                    logger.info("Shutdown requested; stopping parse stage.")
                     break
 
                 self.stats["batches_processed"] += 1
                 self.stats["papers_processed"] += len(batch)
 
-                try:
-                    embedded = await asyncio.wait_for(
-                        self.embedder.embed_batch(batch),
-                        timeout=300,
+                delta_entries = None
+                if self.delta_index:
+                    changed, delta_entries = self.delta_index.filter_changed(batch)
+                    self.stats["papers_unchanged"] += len(batch) - len(changed)
+                    if not changed:
+                        self.source.acknowledge(end_offset)
+                        continue
+                    batch = changed
+
+                await embed_queue.put((batch, end_offset, delta_entries))
+                QUEUE_DEPTH.set(embed_queue.qsize(), queue="embed")
+        except Exception as e:
+            self.stats["errors"] += 1
+            STAGE_ERRORS.inc(stage="parse")
+            logger.error(f"Error in parse stage: {e}")
+        finally:
+            await batches.aclose()
+
+    async def _embed_stage(
+        self, embed_queue: asyncio.Queue, store_queue: asyncio.Queue
+    ) -> None:
+        while (item := await embed_queue.get()) is not _DONE:
+            self._track_queues(embed_queue, store_queue)
+            batch, end_offset, delta_entries = item
+            try:
+                embedded = await asyncio.wait_for(
+                    self.embedder.embed_batch(batch),
+                    timeout=300,
+                )
+                self.stats["papers_embedded"] += len(embedded)
+
+                # embed_batch drops the papers of sub-batches that failed
+                embedded_ids = set(embedded.ids)
+                missing = batch.take(
+                    [
+                        row
+                        for row, paper_id in enumerate(batch.ids)
+                        if paper_id not in embedded_ids
+                    ]
+                )
+                if missing:
+                    reason = f"{len(missing)} of {len(batch)} papers failed to embed"
+                    if not embedded:
+                        self._dead_letter(
+                            EMBED, reason, missing, end_offset, delta_entries
+                        )
+                        continue
+                    # The offset is acknowledged when the embedded rest is stored
+                    self._dead_letter(EMBED, reason, missing, None, delta_entries)
+
+                await store_queue.put((embedded, end_offset, delta_entries))
+                self._track_queues(embed_queue, store_queue)
+
+            except asyncio.TimeoutError:
+                logger.error(f"Timeout embedding batch of size {len(batch)}")
+                self._dead_letter(
+                    EMBED, "embedding timed out", batch, end_offset, delta_entries
+                )
+
+            except Exception as e:
+                logger.error(f"Error embedding batch: {e}")
+                self._dead_letter(
+                    EMBED, f"embedding failed: {e}", batch, end_offset, delta_entries
+                )
+
+    async def _store_stage(self, store_queue: asyncio.Queue) -> None:
+        while (item := await store_queue.get()) is not _DONE:
+            QUEUE_DEPTH.set(store_queue.qsize(), queue="store")
+            embedded, end_offset, delta_entries = item
+            try:
+                stored = await self._insert(embedded)
+                if stored is None:
+                    # Unacknowledged, so the next run reads these papers again
+                    logger.warning(
+                        f"Stopped with Qdrant unavailable; {len(embedded)} "
+                        f"papers were not stored"
+                    )
+                elif stored:
+                    self.stats["papers_stored"] += len(embedded)
+                    # On disk before the checkpoint can move past the batch
+                    if self.shard_writer:
+                        self.shard_writer.write(embedded)
+                    self.source.acknowledge(end_offset)
+                    if self.delta_index:
+                        self.delta_index.record(
+                            {
+                                paper_id: delta_entries[paper_id]
+                                for paper_id in embedded.ids
+                                if paper_id in delta_entries
+                            }
+                        )
+                else:
+                    logger.warning(f"Insert failed for {len(embedded)} papers")
+                    self._dead_letter(
+                        STORE, "insert failed", embedded, end_offset, delta_entries
                     )
-                    self.stats["papers_embedded"] += len(embedded)
 
-                    if await self.database.insert_batch(embedded):
-                        self.stats["papers_stored"] += len(embedded)
-                    else:
-                        logger.warning(f"Insert failed for {len(embedded)} papers")
+            except Exception as e:
+                logger.error(f"Error storing batch: {e}")
+                self._dead_letter(
+                    STORE, f"store failed: {e}", embedded, end_offset, delta_entries
+                )
 
-                except asyncio.TimeoutError:
-                    self.stats["errors"] += 1
-                    logger.error(f"Timeout embedding batch of size {len(batch)}")
+            self.log_progress()
+
+    async def run(self) -> bool:
+        """Run to completion; True if every paper was stored or dead-lettered"""
+        logger.info("Starting pipeline...")
+        await self.database.start()
+        if self.bulk:
+            collection_ready = await self.database.start_bulk_load()
+        else:
+            collection_ready = await self.database.create_collection_if_not_exists()
+        if not collection_ready:
+            logger.error("Cannot access DB collection; aborting.")
+            if self.owns_database:
+                await self.database.close()
+            return False
 
-                except Exception as e:
-                    self.stats["errors"] += 1
-                    logger.error(f"Error in batch: {e}")
+        await self.metrics.start()
+        if self.tuner:
+            self.tuner.start()
+        embed_queue = asyncio.Queue(maxsize=self.queue_size)
+        store_queue = asyncio.Queue(maxsize=self.queue_size)
 
-                self.log_progress()
+        embed_tasks = [
+            asyncio.create_task(self._embed_stage(embed_queue, store_queue))
+            for _ in range(self.embed_workers)
+        ]
+        store_tasks = [
+            asyncio.create_task(self._store_stage(store_queue))
+            for _ in range(self.store_workers)
+        ]
+
+        try:
+            await self._parse_stage(embed_queue)
+
+            for _ in embed_tasks:
+                await embed_queue.put(_DONE)
+            await asyncio.gather(*embed_tasks)
+
+            for _ in store_tasks:
+                await store_queue.put(_DONE)
+            await asyncio.gather(*store_tasks)
+
+            return not self.shutdown_event.is_set() and self.stats["errors"] == 0
 
         finally:
+            for task in embed_tasks + store_tasks:
+                task.cancel()
+            # Even after a failure, or the collection is left unindexed
+            if self.bulk:
+                await self.database.finish_bulk_load()
+
             elapsed = time.time() - self.stats["start_time"]
             logger.info(f"Pipeline ended in {elapsed:.2f}s")
             logger.info(f"Papers processed: {self.stats['papers_processed']}")
+            logger.info(f"Papers unchanged: {self.stats['papers_unchanged']}")
             logger.info(f"Papers embedded: {self.stats['papers_embedded']}")
             logger.info(f"Papers stored: {self.stats['papers_stored']}")
             logger.info(f"Errors: {self.stats['errors']}")
+            if self.stats["dead_lettered"]:
+                logger.info(
+                    f"Papers dead-lettered: {self.stats['dead_lettered']} "
+                    f"(recover with `main.py retry`)"
+                )
             logger.info(f"Number of points: {await self.database.count_points()}")
+            if self.owns_database:
+                await self.database.close()
+            await self.metrics.stop()
+            if self.tuner:
+                await self.tuner.stop()
+                logger.info(f"Final batch sizes: {self.tuner.sizes()}")
+            if self.owns_embedder:
+                self.embedder.close()
+            if self.delta_index:
+                self.delta_index.close()
+            if self.shard_writer:
+                self.shard_writer.close()
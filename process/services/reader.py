@@ -0,0 +1,146 @@
+import mmap
+import zipfile
+from typing import Iterator, Optional, Tuple
+
+ID_PREFIX = b'{"id":"'
+UPDATE_DATE_KEY = b'"update_date":"'
+
+
+class SnapshotReader:
+    """Memory-mapped, line-oriented reader for the arXiv metadata snapshot.
+
+    Lines are split on the raw mapped buffer, so reading costs no syscalls
+    or thread hops per line, and the id/update_date of a record can be peeked
+    at before anything is decoded.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.file = None
+        self.mm: Optional[mmap.mmap] = None
+
+    def __enter__(self) -> "SnapshotReader":
+        self.file = open(self.file_path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mm.madvise(mmap.MADV_SEQUENTIAL)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.mm is not None:
+            self.mm.close()
+        if self.file is not None:
+            self.file.close()
+
+    def __len__(self) -> int:
+        return len(self.mm)
+
+    def iter_spans(
+        self, start: int = 0, end: Optional[int] = None
+    ) -> Iterator[Tuple[int, int]]:
+        """Yield (line start, line end) spans in [start, end), newline excluded"""
+        mm = self.mm
+        end = len(mm) if end is None else end
+        pos = start
+
+        while pos < end:
+            newline = mm.find(b"\n", pos, end)
+            line_end = end if newline == -1 else newline
+            yield pos, line_end
+            pos = line_end + 1
+
+    def line(self, start: int, end: int) -> bytes:
+        return self.mm[start:end]
+
+    def peek_id_and_date(self, start: int, end: int) -> Tuple[str, str]:
+        """Read id and update_date straight from the raw record, without decoding it.
+
+        Relies on the snapshot's fixed key order (id first). Returns empty
+        strings when a field can't be located cheaply.
+        """
+        mm = self.mm
+        paper_id = ""
+        update_date = ""
+
+        if mm[start : start + len(ID_PREFIX)] == ID_PREFIX:
+            id_start = start + len(ID_PREFIX)
+            id_end = mm.find(b'"', id_start, end)
+            if id_end != -1:
+                paper_id = mm[id_start:id_end].decode("utf-8", "replace").strip()
+
+        date_key = mm.rfind(UPDATE_DATE_KEY, start, end)
+        if date_key != -1:
+            date_start = date_key + len(UPDATE_DATE_KEY)
+            date_end = mm.find(b'"', date_start, end)
+            if date_end != -1:
+                update_date = mm[date_start:date_end].decode("ascii", "replace")
+
+        return paper_id, update_date
+
+
+class BufferReader(SnapshotReader):
+    """SnapshotReader over lines already in memory, e.g. a decompressed chunk"""
+
+    def __init__(self, data: bytes):
+        super().__init__("")
+        self.mm = data
+
+    def __enter__(self) -> "BufferReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class ArchiveReader:
+    """Streams the snapshot out of the Kaggle zip without extracting it.
+
+    Yields newline-aligned chunks tagged with their offset in the uncompressed
+    member, so checkpoints and byte ranges mean the same as for the extracted
+    file. Deflate can't seek, so starting past 0 decompresses up to the start.
+    """
+
+    def __init__(self, archive_path: str, member: str):
+        self.archive_path = archive_path
+        self.member = member
+        self.archive: Optional[zipfile.ZipFile] = None
+        self.stream = None
+
+    def __enter__(self) -> "ArchiveReader":
+        self.archive = zipfile.ZipFile(self.archive_path)
+        self.stream = self.archive.open(self.member)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.stream is not None:
+            self.stream.close()
+        if self.archive is not None:
+            self.archive.close()
+
+    def __len__(self) -> int:
+        return self.archive.getinfo(self.member).file_size
+
+    def iter_chunks(
+        self, start: int, stop: Optional[int], chunk_bytes: int
+    ) -> Iterator[Tuple[int, bytes]]:
+        """Yield (offset, lines) chunks of about chunk_bytes covering [start, stop)"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        self.stream.seek(start)
+        offset = start
+        carry = b""
+
+        while offset + len(carry) < stop:
+            data = self.stream.read(min(chunk_bytes, stop - offset - len(carry)))
+            if not data:
+                break
+            data = carry + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                # One line longer than a chunk; keep reading until it ends
+                carry = data
+                continue
+            yield offset, data[:cut]
+            offset += cut
+            carry = data[cut:]
+
+        if carry:
+            yield offset, carry
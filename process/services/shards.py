@@ -0,0 +1,309 @@
+import os
+import glob
+import json
+import struct
+import logging.config
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from config import LOG_CONFIG
+from services.batch import PaperBatch
+from services.utils import categories_to_mask
+
+logging.config.dictConfig(LOG_CONFIG)
+
+MANIFEST_FILE = "manifest.json"
+# Bumped when the on-disk shard layout changes; older shards are discarded
+SHARD_FORMAT = 3
+
+
+def _shrink_npy(path: str, rows: int) -> None:
+    """Cut a 2-d .npy file down to its first rows, rewriting the header in place.
+
+    The new shape is never longer than the old one, so the header is padded
+    back to its old length and the data doesn't move.
+    """
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        read_header = (
+            np.lib.format.read_array_header_1_0
+            if version == (1, 0)
+            else np.lib.format.read_array_header_2_0
+        )
+        shape, fortran_order, dtype = read_header(f)
+        data_offset = f.tell()
+
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": fortran_order,
+                "shape": (rows, *shape[1:]),
+            }
+        ).encode("latin1")
+        length_format = "<H" if version == (1, 0) else "<I"
+        prefix = np.lib.format.magic(*version)
+        text_length = data_offset - len(prefix) - struct.calcsize(length_format)
+        f.seek(0)
+        f.write(prefix)
+        f.write(struct.pack(length_format, text_length))
+        f.write(header.ljust(text_length - 1) + b"\n")
+        f.truncate(data_offset + rows * int(np.prod(shape[1:])) * dtype.itemsize)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class ShardWriter:
+    """Persists stored embeddings as .npy shards with aligned metadata.
+
+    Each shard is `shard-NNNNN.npy` (one row of dim dtype values per paper)
+    plus `shard-NNNNN.meta.jsonl` holding the paper id and payload for the
+    same rows. A shard is created at its full capacity and filled through a
+    memmap; write() flushes a batch to disk before the manifest counts it, so
+    call it once the batch is stored and before acknowledging it: the
+    checkpoint then never gets ahead of the shards.
+
+    close() shrinks a partly filled shard to the rows written, so every
+    closed shard loads with np.load as is. A shard left open by a crash is
+    shrunk by the next writer. Shards accumulate across runs; ShardReader
+    keeps the last row written for each paper id.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        model_name: str,
+        dim: int,
+        dtype: str = "float16",
+        rows_per_shard: int = 100_000,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.model_name = model_name
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.rows_per_shard = rows_per_shard
+        # Memmap of the open shard, kept between writes
+        self.vectors: Optional[np.memmap] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = self._load_manifest()
+        self._close_open_shard()
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def _shard_path(self, shard: dict, suffix: str) -> str:
+        return os.path.join(self.directory, f"{shard['name']}{suffix}")
+
+    def _load_manifest(self) -> dict:
+        fresh = {
+            "model": self.model_name,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "format": SHARD_FORMAT,
+            "shards": [],
+        }
+        try:
+            with open(self._manifest_path(), "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return fresh
+
+        if any(manifest.get(k) != fresh[k] for k in ("model", "dim", "dtype", "format")):
+            self.logger.warning(
+                "Embedding shards were written with a different model or layout; "
+                "discarding them"
+            )
+            for stale in glob.glob(os.path.join(self.directory, "shard-*")):
+                os.remove(stale)
+            return fresh
+        return manifest
+
+    def _save_manifest(self) -> None:
+        tmp_file = f"{self._manifest_path()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self._manifest_path())
+
+    def _truncate_metadata(self, shard: dict) -> None:
+        """Cut off whatever an interrupted write left past the counted rows"""
+        path = self._shard_path(shard, ".meta.jsonl")
+        if os.path.exists(path) and os.path.getsize(path) > shard["meta_bytes"]:
+            os.truncate(path, shard["meta_bytes"])
+
+    def _close_open_shard(self) -> None:
+        """Shrink the last shard to its counted rows; the next write starts a new one"""
+        self.vectors = None
+        if not self.manifest["shards"]:
+            return
+        shard = self.manifest["shards"][-1]
+        self._truncate_metadata(shard)
+        if shard["rows"] < shard["capacity"]:
+            _shrink_npy(self._shard_path(shard, ".npy"), shard["rows"])
+            shard["capacity"] = shard["rows"]
+            self._save_manifest()
+
+    def _open_shard(self) -> dict:
+        shards = self.manifest["shards"]
+        if shards and shards[-1]["rows"] < shards[-1]["capacity"]:
+            shard = shards[-1]
+            if self.vectors is None:
+                self.vectors = np.lib.format.open_memmap(
+                    self._shard_path(shard, ".npy"), mode="r+"
+                )
+            return shard
+
+        shard = {
+            "name": f"shard-{len(shards):05d}",
+            "rows": 0,
+            "capacity": self.rows_per_shard,
+            "meta_bytes": 0,
+        }
+        # Sparse until written, so only the rows stored take up disk
+        self.vectors = np.lib.format.open_memmap(
+            self._shard_path(shard, ".npy"),
+            mode="w+",
+            dtype=self.dtype,
+            shape=(shard["capacity"], self.dim),
+        )
+        shards.append(shard)
+        return shard
+
+    def _metadata(self, papers: PaperBatch, start: int, end: int) -> bytes:
+        return b"".join(
+            orjson.dumps(
+                {
+                    "id": papers.ids[row],
+                    "categories": list(papers.categories(row)),
+                    "authors": papers.authors[row],
+                    "title": papers.titles[row],
+                    "date_updated": papers.dates[row],
+                }
+            )
+            + b"\n"
+            for row in range(start, end)
+        )
+
+    def write(self, papers: PaperBatch) -> None:
+        """Append stored papers to the open shard, durably"""
+        start = 0
+        while start < len(papers):
+            try:
+                shard = self._open_shard()
+                end = min(len(papers), start + shard["capacity"] - shard["rows"])
+                self.vectors[shard["rows"] : shard["rows"] + end - start] = (
+                    papers.embeddings[start:end]
+                )
+                self.vectors.flush()
+                metadata = self._metadata(papers, start, end)
+                with open(self._shard_path(shard, ".meta.jsonl"), "ab") as f:
+                    f.write(metadata)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                shard["rows"] += end - start
+                shard["meta_bytes"] += len(metadata)
+                self._save_manifest()
+            except Exception as e:
+                self.logger.error(f"Error writing embedding shard: {e}")
+                try:
+                    self._close_open_shard()
+                except Exception:
+                    pass
+                return
+
+            if shard["rows"] >= shard["capacity"]:
+                self.vectors = None
+                self.logger.info(
+                    f"Wrote embedding shard {shard['name']} ({shard['rows']} rows)"
+                )
+            start = end
+
+    def close(self) -> None:
+        """Shrink the open shard to the rows written"""
+        try:
+            self._close_open_shard()
+        except Exception as e:
+            self.logger.error(f"Error closing embedding shard: {e}")
+
+
+class ShardReader:
+    """Reads embedding shards back as PaperBatches, without the model.
+
+    A paper written more than once (e.g. re-embedded by a later run) is read
+    back only from its last row, so the batches hold each id once and the
+    order in which they are upserted doesn't matter.
+    """
+
+    def __init__(self, directory: str):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+
+    def load_manifest(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.directory, MANIFEST_FILE), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_metadata(self, shard: dict) -> List[bytes]:
+        with open(
+            os.path.join(self.directory, f"{shard['name']}.meta.jsonl"), "rb"
+        ) as f:
+            return f.read(shard["meta_bytes"]).splitlines()
+
+    def iter_batches(self, batch_size: int) -> Iterator[PaperBatch]:
+        manifest = self.load_manifest()
+        if not manifest or manifest.get("format") != SHARD_FORMAT:
+            self.logger.error(f"No usable embedding shard manifest in {self.directory}")
+            return
+
+        # First pass: the shard and row holding the last copy of each paper
+        latest: Dict[str, Tuple[int, int]] = {}
+        for index, shard in enumerate(manifest["shards"]):
+            for row, line in enumerate(self._read_metadata(shard)):
+                latest[orjson.loads(line)["id"]] = (index, row)
+
+        for index, shard in enumerate(manifest["shards"]):
+            if not shard["rows"]:
+                continue
+            # A shard still open (or left open by a crash) has more rows than written
+            vectors = np.load(
+                os.path.join(self.directory, f"{shard['name']}.npy"), mmap_mode="r"
+            )[: shard["rows"]]
+            metadata = [orjson.loads(line) for line in self._read_metadata(shard)]
+            if len(metadata) != len(vectors):
+                self.logger.error(
+                    f"Shard {shard['name']} has {len(vectors)} vectors but "
+                    f"{len(metadata)} metadata rows; skipping"
+                )
+                continue
+
+            keep = [
+                row
+                for row, meta in enumerate(metadata)
+                if latest[meta["id"]] == (index, row)
+            ]
+            if len(keep) < len(metadata):
+                self.logger.info(
+                    f"Skipping {len(metadata) - len(keep)} rows of {shard['name']} "
+                    "superseded by later ones"
+                )
+            for start in range(0, len(keep), batch_size):
+                rows = keep[start : start + batch_size]
+                # Payloads were validated before they were written
+                yield PaperBatch(
+                    ids=[metadata[row]["id"] for row in rows],
+                    titles=[metadata[row]["title"] for row in rows],
+                    abstracts=[""] * len(rows),
+                    authors=[metadata[row]["authors"] for row in rows],
+                    category_masks=[
+                        categories_to_mask(metadata[row]["categories"]) for row in rows
+                    ],
+                    dates=[metadata[row]["date_updated"] for row in rows],
+                    embeddings=vectors[rows].astype(np.float32),
+                )
@@ -0,0 +1,219 @@
+import os
+import time
+import asyncio
+import resource
+import logging.config
+from typing import Dict, List, Optional, Tuple
+
+from config import LOG_CONFIG
+from services.metrics import STAGE_PAPERS, STAGE_SECONDS
+
+logging.config.dictConfig(LOG_CONFIG)
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Peak rather than current, but the best we have off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def total_memory_bytes() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class BatchSizeKnob:
+    """One tunable batch size, read and written through an attribute of its owner"""
+
+    def __init__(self, name: str, owner, attribute: str, minimum: int, maximum: int):
+        self.name = name
+        self.owner = owner
+        self.attribute = attribute
+        self.minimum = minimum
+        self.maximum = maximum
+        # Windows left before this knob may be grown again
+        self.hold = 0
+        self.value = min(max(self.value, minimum), maximum)
+
+    @property
+    def value(self) -> int:
+        return getattr(self.owner, self.attribute)
+
+    @value.setter
+    def value(self, size: int) -> None:
+        setattr(self.owner, self.attribute, int(size))
+
+    def grown(self, factor: float) -> int:
+        return min(self.maximum, max(self.value + 1, int(self.value * factor)))
+
+    def shrunk(self) -> int:
+        return max(self.minimum, self.value // 2)
+
+
+class AdaptiveBatchController:
+    """Tunes parse, inference and upsert batch sizes for throughput at runtime.
+
+    Every window it measures stored papers/sec, process RSS and mean upsert
+    latency. Memory over the ceiling halves the parse and inference batches;
+    upsert latency over the target halves the upsert batch. Otherwise it
+    grows one knob at a time and keeps the change only if throughput did not
+    drop, reverting and holding the knob for a few windows if it did.
+    """
+
+    def __init__(
+        self,
+        knobs: List[BatchSizeKnob],
+        memory_limit: int,
+        upsert_latency_target: float,
+        interval: float,
+        tolerance: float = 0.05,
+        growth: float = 1.5,
+        hold_windows: int = 4,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.knobs = {knob.name: knob for knob in knobs}
+        self.memory_limit = memory_limit
+        self.upsert_latency_target = upsert_latency_target
+        self.interval = interval
+        self.tolerance = tolerance
+        self.growth = growth
+        self.hold_windows = hold_windows
+        self.turn = 0
+        # (knob, previous size, throughput before the change)
+        self.trial: Optional[Tuple[BatchSizeKnob, int, float]] = None
+        self.task: Optional[asyncio.Task] = None
+        self.last_sample = self._sample_counters()
+
+    def _sample_counters(self) -> Tuple[float, float, float, int]:
+        counts = STAGE_SECONDS.counts.get(("upsert",))
+        return (
+            time.monotonic(),
+            STAGE_PAPERS.get(stage="upsert"),
+            STAGE_SECONDS.sums.get(("upsert",), 0.0),
+            sum(counts) if counts else 0,
+        )
+
+    def _measure(self) -> Tuple[float, Optional[float], int]:
+        """Papers/sec, mean upsert latency and RSS since the previous window"""
+        now, papers, latency_sum, upserts = self._sample_counters()
+        then, papers_before, latency_sum_before, upserts_before = self.last_sample
+        self.last_sample = (now, papers, latency_sum, upserts)
+
+        elapsed = now - then
+        throughput = (papers - papers_before) / elapsed if elapsed > 0 else 0.0
+        latency = None
+        if upserts > upserts_before:
+            latency = (latency_sum - latency_sum_before) / (upserts - upserts_before)
+        return throughput, latency, current_rss_bytes()
+
+    def _resize(self, knob: BatchSizeKnob, size: int, reason: str) -> None:
+        if size == knob.value:
+            return
+        self.logger.info(f"Batch size {knob.name}: {knob.value} -> {size} ({reason})")
+        knob.value = size
+
+    def step(self) -> None:
+        throughput, latency, rss = self._measure()
+        if throughput == 0:
+            # Idle or stalled window; nothing to learn from it
+            return
+
+        latency_text = f"{latency:.2f}s" if latency is not None else "n/a"
+        self.logger.info(
+            f"Tuning window: {throughput:.1f} papers/sec, "
+            f"upsert latency {latency_text}, RSS {rss / 1024**2:.0f} MiB | "
+            + ", ".join(f"{name}={knob.value}" for name, knob in self.knobs.items())
+        )
+
+        if rss > self.memory_limit:
+            self.trial = None
+            for name in ("parse", "inference"):
+                if name in self.knobs:
+                    knob = self.knobs[name]
+                    knob.hold = self.hold_windows
+                    self._resize(
+                        knob,
+                        knob.shrunk(),
+                        f"RSS {rss / 1024**2:.0f} MiB over "
+                        f"{self.memory_limit / 1024**2:.0f} MiB ceiling",
+                    )
+            return
+
+        latency_high = latency is not None and latency > self.upsert_latency_target
+        if latency_high and "upsert" in self.knobs:
+            knob = self.knobs["upsert"]
+            knob.hold = self.hold_windows
+            if self.trial and self.trial[0] is knob:
+                self.trial = None
+            self._resize(
+                knob,
+                knob.shrunk(),
+                f"upsert latency {latency:.2f}s over "
+                f"{self.upsert_latency_target:.2f}s target",
+            )
+
+        if self.trial:
+            knob, previous, baseline = self.trial
+            self.trial = None
+            if throughput < baseline * (1 - self.tolerance):
+                knob.hold = self.hold_windows
+                self._resize(
+                    knob,
+                    previous,
+                    f"throughput fell from {baseline:.1f} to {throughput:.1f} papers/sec",
+                )
+            else:
+                self.logger.info(
+                    f"Keeping {knob.name} batch size {knob.value} "
+                    f"({baseline:.1f} -> {throughput:.1f} papers/sec)"
+                )
+            return
+
+        for knob in self.knobs.values():
+            knob.hold = max(0, knob.hold - 1)
+
+        candidates = [
+            knob
+            for knob in self.knobs.values()
+            if knob.hold == 0
+            and knob.value < knob.maximum
+            and not (knob.name == "upsert" and latency_high)
+        ]
+        if not candidates:
+            return
+
+        knob = candidates[self.turn % len(candidates)]
+        self.turn += 1
+        self.trial = (knob, knob.value, throughput)
+        self._resize(knob, knob.grown(self.growth), "probing for more throughput")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.step()
+            except Exception as e:
+                self.logger.error(f"Error adjusting batch sizes: {e}")
+
+    def start(self) -> None:
+        if self.task is None:
+            self.last_sample = self._sample_counters()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def sizes(self) -> Dict[str, int]:
+        return {name: knob.value for name, knob in self.knobs.items()}
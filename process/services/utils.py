@@ -1,5 +1,10 @@
+import os
 import uuid
-from datetime import datetime
+import hashlib
+from datetime import datetime, tzinfo
+from typing import List, Optional
+
+from models import ArxivDomains
 
 
 def string_to_uuid(string_id: str):
@@ -7,5 +12,49 @@ def string_to_uuid(string_id: str):
     return str(uuid.uuid5(namespace, string_id))
 
 
-def iso_date_to_unix(iso_date_str: str):
-    return int(datetime.fromisoformat(iso_date_str).timestamp())
+def iso_date_to_unix(iso_date_str: str, tz: Optional[tzinfo] = None):
+    """Unix time of a date, read in tz (local time if None)"""
+    date = datetime.fromisoformat(iso_date_str)
+    if tz is not None:
+        date = date.replace(tzinfo=tz)
+    return int(date.timestamp())
+
+
+def is_iso_date(iso_date_str: str) -> bool:
+    """Whether iso_date_to_unix can convert the string"""
+    try:
+        datetime.fromisoformat(iso_date_str)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def unix_to_iso(unix_timestamp: int, tz: Optional[tzinfo] = None) -> str:
+    return datetime.fromtimestamp(unix_timestamp, tz=tz).strftime("%Y-%m-%d")
+
+
+def dataset_fingerprint(dataset_path: str) -> dict:
+    """Size and head hash of the dataset file; raises OSError if unreadable.
+
+    Unlike the mtime, this stays the same across machines that downloaded
+    the same snapshot separately.
+    """
+    with open(dataset_path, "rb") as f:
+        head = hashlib.blake2b(f.read(1024 * 1024), digest_size=16).hexdigest()
+    return {"dataset_size": os.path.getsize(dataset_path), "dataset_head": head}
+
+
+# One bit per domain, in ArxivDomains declaration order. Append new domains
+# at the end so existing masks keep their meaning.
+CATEGORY_BITS = {domain: 1 << bit for bit, domain in enumerate(ArxivDomains)}
+
+
+def categories_to_mask(categories) -> int:
+    mask = 0
+    for category in categories:
+        mask |= CATEGORY_BITS[ArxivDomains(category)]
+    return mask
+
+
+def mask_to_categories(mask: int) -> List[ArxivDomains]:
+    return [domain for domain, bit in CATEGORY_BITS.items() if mask & bit]
@@ -0,0 +1,141 @@
+import os
+import asyncio
+import logging.config
+
+from config import (
+    LOG_CONFIG,
+    DATASET_PATH,
+    DELTA_MODE,
+    EMB_CACHE_DIR,
+    DIST_HEARTBEAT_INTERVAL,
+    DIST_POLL_INTERVAL,
+)
+from services.database import Database
+from services.embed import Embedder
+from services.lease import LeaseQueue
+from services.parse import Parser
+from services.pipeline import Pipeline
+from services.utils import dataset_fingerprint
+
+logging.config.dictConfig(LOG_CONFIG)
+
+
+class IngestWorker:
+    """Claims snapshot units from a shared LeaseQueue and ingests them one by one.
+
+    The model and the Qdrant client are loaded once and reused for every
+    unit. The lease is heartbeated while a unit runs; if it is lost, the unit
+    is stopped and left to whoever took it over.
+    """
+
+    def __init__(self, directory: str, worker_id: str, shutdown_event: asyncio.Event):
+        self.logger = logging.getLogger(__name__)
+        self.worker_id = worker_id
+        self.shutdown_event = shutdown_event
+        self.queue = LeaseQueue(directory, worker_id)
+        self.heartbeat_interval = DIST_HEARTBEAT_INTERVAL
+        self.poll_interval = DIST_POLL_INTERVAL
+        self.units_completed = 0
+
+    async def _heartbeat(self, unit_id: str, unit_stop: asyncio.Event) -> None:
+        while not unit_stop.is_set():
+            try:
+                await asyncio.wait_for(
+                    self.shutdown_event.wait(), timeout=self.heartbeat_interval
+                )
+            except asyncio.TimeoutError:
+                if not self.queue.heartbeat(unit_id):
+                    unit_stop.set()
+                continue
+            unit_stop.set()
+
+    async def _wait(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self.shutdown_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _process(self, unit: dict, database: Database, embedder: Embedder) -> bool:
+        unit_stop = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(unit["id"], unit_stop))
+        completed = False
+        try:
+            pipeline = Pipeline(
+                unit_stop,
+                database=database,
+                embedder=embedder,
+                reader=Parser(
+                    load_checkpoint=False,
+                    skip_unchanged=False,
+                    byte_range=(unit["start"], unit["end"]),
+                ),
+                worker_id=self.worker_id,
+            )
+            completed = await pipeline.run()
+        except Exception as e:
+            self.logger.error(f"Error ingesting unit {unit['id']}: {e}")
+        finally:
+            heartbeat.cancel()
+
+        # Papers that failed into the dead-letter file count as done; only a unit
+        # whose failures couldn't be recorded is released and ingested again
+        if completed:
+            self.queue.complete(
+                unit["id"],
+                {
+                    "papers_processed": pipeline.stats["papers_processed"],
+                    "papers_stored": pipeline.stats["papers_stored"],
+                    "papers_dead_lettered": pipeline.stats["dead_lettered"],
+                },
+            )
+            self.units_completed += 1
+        else:
+            self.queue.release(unit["id"])
+        return completed
+
+    async def run(self) -> None:
+        plan = self.queue.load_plan()
+        if not plan:
+            self.logger.error(f"No unit plan in {self.queue.directory}")
+            return
+        if plan["fingerprint"] != dataset_fingerprint(DATASET_PATH):
+            self.logger.error(
+                f"{DATASET_PATH} is not the snapshot the units were planned on"
+            )
+            return
+
+        embedder = Embedder(
+            cache_dir=os.path.join(EMB_CACHE_DIR, f"worker-{self.worker_id}")
+        )
+        database = Database()
+        await database.start()
+        self.logger.info(f"Worker {self.worker_id} started")
+        if DELTA_MODE:
+            self.logger.info(
+                "Delta mode is off for workers: units move between workers, "
+                "so every paper of a unit is embedded and stored"
+            )
+
+        try:
+            while not self.shutdown_event.is_set():
+                unit = self.queue.claim()
+                if unit is not None:
+                    if not await self._process(unit, database, embedder):
+                        # Back off so a failing unit doesn't spin
+                        await self._wait(self.poll_interval)
+                    continue
+
+                progress = self.queue.progress()
+                if progress["done"] == progress["total"]:
+                    self.logger.info("All units are done")
+                    break
+                self.logger.info(
+                    f"Waiting on {progress['leased']} units leased by other workers"
+                )
+                await self._wait(self.poll_interval)
+        finally:
+            await database.close()
+            embedder.close()
+            self.logger.info(
+                f"Worker {self.worker_id} stopped after {self.units_completed} units"
+            )
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Modules import each other as top-level packages (`from config import ...`),
+# the way main.py runs them from process/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
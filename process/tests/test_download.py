@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import base64
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.download import ChunkedDownloader
+
+SIZE = 1_000_003
+CHUNK = 100_000
+CHUNKS = -(-SIZE // CHUNK)
+
+
+class RangeServer(ThreadingHTTPServer):
+    """Serves one file with byte ranges, ETag/If-Range and x-goog-hash"""
+
+    def __init__(self, data: bytes):
+        super().__init__(("127.0.0.1", 0), RangeHandler)
+        self.data = data
+        self.etag = '"v1"'
+        self.md5 = hashlib.md5(data).digest()
+        self.ranges = True
+        # Chunk requests starting at or past this offset get a 500
+        self.fail_from = None
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # The downloader hangs up on bodies it rejects, mid-write
+        pass
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/arxiv.zip"
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, headers: dict) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        requested = self.headers.get("Range")
+        with server.lock:
+            server.requests.append(requested)
+
+        data = server.data
+        headers = {
+            "ETag": server.etag,
+            "x-goog-hash": "crc32c=AAAAAA==,md5="
+            + base64.b64encode(server.md5).decode(),
+        }
+        match = re.match(r"bytes=(\d+)-(\d+)", requested or "")
+        if_range = self.headers.get("If-Range")
+        if not server.ranges or not match or (if_range and if_range != server.etag):
+            return self._send(200, data, headers)
+
+        start, end = int(match.group(1)), min(int(match.group(2)), len(data) - 1)
+        if server.fail_from is not None and 0 < start and start >= server.fail_from:
+            return self._send(500, b"", {})
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        self._send(206, data[start : end + 1], headers)
+
+
+@pytest.fixture
+def server():
+    server = RangeServer(os.urandom(SIZE))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _downloader(server, tmp_path, **kwargs) -> ChunkedDownloader:
+    return ChunkedDownloader(
+        server.url,
+        str(tmp_path / "arxiv.zip"),
+        chunk_bytes=CHUNK,
+        workers=4,
+        retries=2,
+        backoff=0.01,
+        timeout=5.0,
+        **kwargs,
+    )
+
+
+def _chunk_requests(server) -> int:
+    return sum(1 for r in server.requests if r and r != "bytes=0-0")
+
+
+def test_downloads_whole_file(server, tmp_path):
+    downloader = _downloader(server, tmp_path)
+    assert downloader.run()
+
+    assert (tmp_path / "arxiv.zip").read_bytes() == server.data
+    assert not os.path.exists(downloader.part_path)
+    assert not os.path.exists(downloader.manifest_path)
+    assert _chunk_requests(server) == CHUNKS
+
+
+def test_resumes_from_finished_chunks(server, tmp_path):
+    server.fail_from = SIZE // 2
+    downloader = _downloader(server, tmp_path)
+    assert not downloader.run()
+
+    with open(downloader.manifest_path) as f:
+        finished = len(json.load(f)["chunks"])
+    assert 0 < finished < CHUNKS
+    assert not (tmp_path / "arxiv.zip").exists()
+
+    # Corrupt one finished chunk; it must be fetched again
+    with open(downloader.part_path, "r+b") as f:
+        f.seek(10)
+        f.write(b"XXXX")
+
+    server.fail_from = None
+    server.requests.clear()
+    assert _downloader(server, tmp_path).run()
+    assert (tmp_path / "arxiv.zip").read_bytes() == server.data
+    assert _chunk_requests(server) == CHUNKS - finished + 1
+
+
+def test_server_without_ranges(server, tmp_path):
+    server.ranges = False
+    downloader = _downloader(server, tmp_path)
+
+    assert downloader.probe() is None
+    assert not downloader.run()
+    assert not (tmp_path / "arxiv.zip").exists()
+
+
+def test_full_response_to_a_chunk_is_rejected(server, tmp_path):
+    downloader = _downloader(server, tmp_path)
+    remote = downloader.probe()
+    # Ranges stop working after the probe: every chunk comes back as a 200
+    server.ranges = False
+
+    assert not downloader.run(remote)
+    assert not (tmp_path / "arxiv.zip").exists()
+    with open(downloader.manifest_path) as f:
+        assert json.load(f)["chunks"] == {}
+
+
+def test_changed_etag_restarts_download(server, tmp_path):
+    server.fail_from = SIZE // 2
+    assert not _downloader(server, tmp_path).run()
+
+    server.data = os.urandom(SIZE)
+    server.md5 = hashlib.md5(server.data).digest()
+    server.etag = '"v2"'
+    server.fail_from = None
+    server.requests.clear()
+
+    assert _downloader(server, tmp_path).run()
+    assert (tmp_path / "arxiv.zip").read_bytes() == server.data
+    assert _chunk_requests(server) == CHUNKS
+
+
+def test_etag_change_mid_download_is_not_mixed_in(server, tmp_path):
+    downloader = _downloader(server, tmp_path)
+    remote = downloader.probe()
+    # The file changes after the probe; If-Range makes the server answer 200
+    server.data = os.urandom(SIZE)
+    server.etag = '"v2"'
+
+    assert not downloader.run(remote)
+    assert not (tmp_path / "arxiv.zip").exists()
+
+
+def test_md5_mismatch_discards_download(server, tmp_path):
+    server.md5 = hashlib.md5(b"something else").digest()
+    downloader = _downloader(server, tmp_path)
+
+    assert not downloader.run()
+    assert not (tmp_path / "arxiv.zip").exists()
+    assert not os.path.exists(downloader.part_path)
+    assert not os.path.exists(downloader.manifest_path)
@@ -0,0 +1,142 @@
+import os
+import time
+import multiprocessing
+
+import pytest
+
+from services.lease import LeaseQueue
+
+# The queue only relies on the filesystem, so real processes are used
+mp = multiprocessing.get_context("fork")
+
+UNITS = 12
+FINGERPRINT = {"dataset_size": 1, "dataset_head": "x"}
+
+
+def _plan(directory: str, units: int = UNITS) -> None:
+    ranges = [(i * 100, (i + 1) * 100) for i in range(units)]
+    LeaseQueue(directory, "coordinator").plan(ranges, FINGERPRINT)
+
+
+def _drain(directory: str, worker_id: str, ttl: float, log_path: str) -> None:
+    """Claim, work on and complete units until none is left to claim"""
+    queue = LeaseQueue(directory, worker_id, ttl=ttl)
+    while (unit := queue.claim()) is not None:
+        time.sleep(0.01)
+        if not queue.heartbeat(unit["id"]):
+            raise AssertionError(f"{worker_id} lost the lease on {unit['id']}")
+        with open(log_path, "a") as f:
+            f.write(f"{unit['id']} {worker_id}\n")
+        queue.complete(unit["id"], {"papers_stored": 1})
+
+
+def _claim_once(directory: str, worker_id: str, barrier, results) -> None:
+    queue = LeaseQueue(directory, worker_id, ttl=5.0)
+    barrier.wait()
+    unit = queue.claim()
+    results.put((worker_id, unit["id"] if unit else None))
+
+
+def _run(target, args_list):
+    processes = [mp.Process(target=target, args=args) for args in args_list]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    return processes
+
+
+def _processed(log_path: str):
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as f:
+        return [line.split() for line in f if line.strip()]
+
+
+def _expire(queue: LeaseQueue, unit_id: str, seconds: float) -> None:
+    lease = queue._lease_path(unit_id)
+    past = time.time() - seconds
+    os.utime(lease, (past, past))
+
+
+def test_workers_process_every_unit_once(tmp_path):
+    directory = str(tmp_path)
+    _plan(directory)
+    log_path = os.path.join(directory, "log")
+
+    _run(_drain, [(directory, f"w{i}", 5.0, log_path) for i in range(4)])
+
+    processed = _processed(log_path)
+    assert sorted(unit for unit, _ in processed) == [f"{i:05d}" for i in range(UNITS)]
+    assert LeaseQueue(directory, "check").progress() == {
+        "total": UNITS,
+        "done": UNITS,
+        "leased": 0,
+        "pending": 0,
+    }
+    assert os.listdir(os.path.join(directory, "leases")) == []
+
+
+def test_expired_lease_is_stolen(tmp_path):
+    directory = str(tmp_path)
+    _plan(directory)
+    log_path = os.path.join(directory, "log")
+
+    # A worker that claimed a unit and died without heartbeating
+    dead = LeaseQueue(directory, "dead", ttl=5.0)
+    unit = dead.claim()
+    _expire(dead, unit["id"], 60)
+
+    _run(_drain, [(directory, f"w{i}", 5.0, log_path) for i in range(3)])
+
+    processed = dict(_processed(log_path))
+    assert len(processed) == UNITS
+    assert processed[unit["id"]] != "dead"
+    assert not dead.heartbeat(unit["id"])
+    assert LeaseQueue(directory, "check").progress()["done"] == UNITS
+
+
+def test_live_lease_is_not_stolen(tmp_path):
+    directory = str(tmp_path)
+    _plan(directory)
+    log_path = os.path.join(directory, "log")
+
+    alive = LeaseQueue(directory, "alive", ttl=5.0)
+    unit = alive.claim()
+
+    _run(_drain, [(directory, f"w{i}", 5.0, log_path) for i in range(3)])
+
+    processed = dict(_processed(log_path))
+    assert unit["id"] not in processed
+    assert len(processed) == UNITS - 1
+    assert alive.heartbeat(unit["id"])
+    assert LeaseQueue(directory, "check").progress()["leased"] == 1
+
+    alive.complete(unit["id"], {})
+    assert LeaseQueue(directory, "check").progress()["done"] == UNITS
+
+
+@pytest.mark.parametrize("attempt", range(5))
+def test_one_contender_wins_an_expired_lease(tmp_path, attempt):
+    directory = str(tmp_path)
+    _plan(directory, units=1)
+
+    dead = LeaseQueue(directory, "dead", ttl=5.0)
+    unit = dead.claim()
+    _expire(dead, unit["id"], 60)
+
+    contenders = 6
+    barrier = mp.Barrier(contenders)
+    results = mp.Queue()
+    _run(
+        _claim_once,
+        [(directory, f"w{i}", barrier, results) for i in range(contenders)],
+    )
+
+    claims = [results.get(timeout=5) for _ in range(contenders)]
+    winners = [worker for worker, unit_id in claims if unit_id == unit["id"]]
+    assert len(winners) == 1
+    with open(dead._lease_path(unit["id"])) as f:
+        assert f.read() == winners[0]
+    assert [name for name in os.listdir(dead.leases_dir) if ".stale-" in name] == []